@@ -1,8 +1,18 @@
+from collections.abc import Iterable, Iterator
 from datetime import datetime, timedelta , timezone
-from jose import jwt, JWTError
+from jose import JWTError, ExpiredSignatureError
 from fastapi import HTTPException, status
 from dotenv import load_dotenv
+from token_cache import TokenCache
+from claims import TokenClaims
+from token_guard import RejectedTokenCache, precheck
+from metrics import metrics
+from jwt_backend import create_jwt_backend
+from scopes import scope_registry
+from token_profile import TOKEN_PROFILE, COMPACT_HEADERS, compact_claims, expand_claims
+from revocation import create_revocation_list
 import os
+import secrets
 
 load_dotenv()
 
@@ -10,6 +20,40 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS"))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+REJECTED_TOKEN_CACHE_TTL = float(os.getenv("REJECTED_TOKEN_CACHE_TTL", "30"))
+# 1: access tokens carry their scopes as an integer `scope_mask` instead of a `scopes` list
+SCOPE_MASK_CLAIM = os.getenv("SCOPE_MASK_CLAIM", "0") == "1"
+
+# compact: short claim names, numeric types, scope masks and no `typ` header (see token_profile.py)
+COMPACT_TOKENS = TOKEN_PROFILE == "compact"
+
+# Signs and verifies every token. The library is chosen with JWT_BACKEND (see jwt_backend.py),
+# built once so the key and JWT header are prepared here.
+jwt_backend = create_jwt_backend(SECRET_KEY, ALGORITHM, headers=COMPACT_HEADERS if COMPACT_TOKENS else None)
+
+# Verified access tokens (TokenClaims, see claims.py), shared by all requests of this worker
+token_cache = TokenCache(max_size=TOKEN_CACHE_SIZE)
+
+# Recently rejected tokens and rejection counters (see token_guard.py)
+rejected_tokens = RejectedTokenCache(ttl=REJECTED_TOKEN_CACHE_TTL, max_size=TOKEN_CACHE_SIZE)
+
+# Revoked token ids (jti) until their exp, behind a Bloom filter (see revocation.py).
+# Use a sqlite:// REVOCATION_STORE when running several workers.
+revocation_list = create_revocation_list()
+
+def forget_verified_tokens(ring=None) -> None:
+    """
+    Empties both token caches. Called when JWT_BACKEND=keyring loads new keys:
+    tokens of a retired or removed key must stop verifying at once, and tokens
+    of a key this worker did not know yet must get a second chance.
+    Only entries go: the hit, miss and rejection counters keep counting.
+    """
+    token_cache.clear()
+    rejected_tokens.clear()
+
+if jwt_backend.name == "keyring":
+    jwt_backend.reload_listeners.append(forget_verified_tokens)
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     """
@@ -19,11 +63,50 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     - Are sent on every authenticated request
     - Expire quickly to reduce attack surface
     - Contain user identity and scopes
+    - Carry a unique id (`jti`) so they can be revoked
     """
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire, "type": "access"}) 
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    to_encode.update({"exp": expire, "type": "access", "jti": new_token_id()}) 
+    if SCOPE_MASK_CLAIM and "scopes" in to_encode:
+        to_encode["scope_mask"] = scope_registry.token_mask({"scopes": to_encode.pop("scopes")})
+    if COMPACT_TOKENS:
+        to_encode = compact_claims(to_encode)
+    return jwt_backend.encode(to_encode)
+
+def access_token_expiry(expires_delta: timedelta | None = None) -> int:
+    """`exp` of an access token issued now, as the integer timestamp stored in the token."""
+    expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    return int(expire.timestamp())
+
+def create_access_tokens(items: Iterable[dict], expires_at: int | None = None) -> Iterator[str]:
+    """
+    Creates many access tokens (service accounts, load tests), yielding them in order.
+
+    Same claims as `create_access_token`, with the per-token setup done once:
+    - One shared `exp` (`expires_at`, default `access_token_expiry()`), so no clock read per token
+    - Scope lists are compiled to a mask once per distinct list (with
+      SCOPE_MASK_CLAIM or the compact profile); unknown scopes raise ValueError
+    - The JWT header is already prepared by the backend
+
+    Each token still gets its own `jti`, so each can be revoked.
+    """
+    if expires_at is None:
+        expires_at = access_token_expiry()
+    encode = jwt_backend.encode
+    use_mask = SCOPE_MASK_CLAIM or COMPACT_TOKENS
+    masks: dict[tuple[str, ...], int] = {}
+    for data in items:
+        to_encode = {**data, "exp": expires_at, "type": "access", "jti": new_token_id()}
+        if use_mask and "scopes" in to_encode:
+            scopes = tuple(to_encode.pop("scopes"))
+            mask = masks.get(scopes)
+            if mask is None:
+                mask = masks[scopes] = scope_registry.mask(scopes)
+            to_encode["scope_mask"] = mask
+        if COMPACT_TOKENS:
+            to_encode = compact_claims(to_encode)
+        yield encode(to_encode)
 
 def create_refresh_token(data: dict):
     """
@@ -35,33 +118,189 @@ def create_refresh_token(data: dict):
     - Are rotated on every refresh request
     """
     expire = datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-    to_encode = {**data, "exp": expire, "type": "refresh"}
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    to_encode = {**data, "exp": expire, "type": "refresh", "jti": new_token_id()}
+    if COMPACT_TOKENS:
+        to_encode = compact_claims(to_encode)
+    return jwt_backend.encode(to_encode)
+
+def new_token_id() -> str:
+    """Random `jti`: 96 bits, 16 characters in the token."""
+    return secrets.token_urlsafe(12)
+
+def revoke_token(claims: TokenClaims) -> bool:
+    """
+    Revokes a verified token until it expires (logout, stolen token).
+    Returns False for tokens issued without `jti`, which cannot be revoked.
+    """
+    if claims.jti is None:
+        return False
+    revocation_list.revoke(claims.jti, claims.exp)
+    return True
 
-def verify_access_token(token: str, required_scopes: list[str]):
+def decode_claims(token: str) -> dict:
     """
-    Validates and authorizes a JWT access token.
+    Verifies a token and returns its claims with standard names,
+    whether it was issued with the standard or the compact profile.
+
+    Raises JWTError (or ExpiredSignatureError) if the token is not valid.
+    """
+    return expand_claims(jwt_backend.decode(token))
+
+def compile_scopes(scopes: list[str]) -> int:
+    """Compiles the scopes required by a route into a mask, once at startup (see scopes.py)."""
+    return scope_registry.mask(scopes)
+
+def token_scopes(payload: dict) -> list[str]:
+    """Scope names of a verified payload, whichever way the token carries them."""
+    if "scope_mask" in payload:
+        return scope_registry.names(payload["scope_mask"])
+    return payload.get("scopes", [])
+
+# Why `check_access_token` refused a token: HTTP status, error detail, and whether
+# the client should authenticate again (`WWW-Authenticate` header)
+REJECTIONS = {
+    "too_large": (status.HTTP_401_UNAUTHORIZED, "Invalid token", True),
+    "malformed": (status.HTTP_401_UNAUTHORIZED, "Invalid token", True),
+    "invalid": (status.HTTP_401_UNAUTHORIZED, "Invalid token", True),
+    "expired": (status.HTTP_401_UNAUTHORIZED, "Token expired", True),
+    "revoked": (status.HTTP_401_UNAUTHORIZED, "Token revoked", True),
+    "wrong_type": (status.HTTP_401_UNAUTHORIZED, "Invalid token type", False),
+    "forbidden": (status.HTTP_403_FORBIDDEN, "Not enough permissions", False),
+}
+
+def check_access_token(token: str, required_scopes: int) -> tuple[TokenClaims | None, str]:
+    """
+    Validates and authorizes a JWT access token without raising.
 
     Validation steps:
     1. Decode and verify JWT signature
-    2. Ensure token type is 'access'
-    3. Check expiration (`exp`)
-    4. Enforce required scopes (authorization)
+    2. Check expiration (`exp`)
+    3. Reject revoked tokens (`jti` in the revocation list)
+    4. Ensure token type is 'access'
+    5. Enforce required scopes (authorization), a mask from `compile_scopes`
+
+    Returns `(claims, "ok")`, or `(None, reason)` with a key of `REJECTIONS`.
+    """
+    # Repeated requests with the same token skip the decode work entirely,
+    # and get the same TokenClaims: it is immutable for the lifetime of the token.
+    with metrics.time("cache_lookup"):
+        claims = token_cache.get(token)
+    if claims is None:
+        payload, reason = decode_or_reject(token)
+        if payload is None:
+            return None, reason
+        claims = TokenClaims(payload)
+        token_cache.put(token, claims, claims.exp)
+    # Checked on cache hits too: a token can be revoked after it was cached.
+    # Tokens never revoked are answered by the Bloom filter, without a lock.
+    if claims.jti is not None and revocation_list.is_revoked(claims.jti):
+        rejected_tokens.count("revoked")
+        return None, "revoked"
+    if claims.type != "access":
+        rejected_tokens.count("wrong_type")
+        return None, "wrong_type"
+    with metrics.time("scope_check"):
+        allowed = claims.allows(required_scopes)
+    if not allowed:
+        return None, "forbidden"
+    return claims, "ok"
+
+def verify_access_token(token: str, required_scopes: list[str] | int) -> TokenClaims:
+    """
+    Validates and authorizes a JWT access token (see `check_access_token`).
+    Returns its claims as a `TokenClaims` (see claims.py).
+
+    `required_scopes` is a list of names or a mask from `compile_scopes`;
+    routes compile theirs at startup so the check is a single AND.
 
     Raises:
-    - 401 if token is invalid or expired
+    - 401 if token is invalid, expired or revoked
     - 403 if token lacks required permissions
     """
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        if payload.get("type") != "access":
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid token type")
-        token_scopes = payload.get("scopes", [])
-        if not set(required_scopes).issubset(set(token_scopes)):
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
-                detail="Not enough permissions")
-        return payload
-    except JWTError:
-        raise Exception("Invalid token")
-    
+    if not isinstance(required_scopes, int):
+        required_scopes = scope_registry.mask(required_scopes)
+    claims, reason = check_access_token(token, required_scopes)
+    if claims is None:
+        status_code, detail, challenge = REJECTIONS[reason]
+        metrics.count("auth_token_checks_total", status=str(status_code), reason=reason)
+        raise HTTPException(status_code=status_code, detail=detail,
+            headers={"WWW-Authenticate": "Bearer"} if challenge else None)
+    metrics.count("auth_token_checks_total", status="200", reason="ok")
+    return claims
+
+async def verify_access_token_async(token: str, required_scopes: list[str] | int) -> TokenClaims:
+    """
+    `verify_access_token` for `async def` routes and dependencies.
+
+    Runs on the event loop, without a thread hop: verification is a cache
+    lookup or one signature check, and the revocation list is read from
+    memory (its database is synced in the background), so nothing here waits on I/O.
+    """
+    return verify_access_token(token, required_scopes)
+
+def introspect_tokens(tokens: Iterable[str], required_scopes: list[str] | int = 0) -> Iterator[dict]:
+    """
+    Verifies a batch of access tokens (API gateways), yielding one result per token, in order:
+    - `{"active": True, "claims": {...}, "scopes": [...]}`
+    - `{"active": False, "error": reason}`, a key of `REJECTIONS`
+
+    Setup is shared by the whole batch: the required scopes are compiled
+    once, and a token repeated in the batch is verified once (repeats get
+    the same result object).
+    """
+    if not isinstance(required_scopes, int):
+        required_scopes = scope_registry.mask(required_scopes)
+    results: dict[str, dict] = {}
+    for token in tokens:
+        result = results.get(token)
+        if result is None:
+            claims, reason = check_access_token(token, required_scopes)
+            if claims is None:
+                status_code = REJECTIONS[reason][0]
+                result = {"active": False, "error": reason}
+            else:
+                status_code = status.HTTP_200_OK
+                result = {"active": True, "claims": claims.payload, "scopes": list(claims.scopes)}
+            metrics.count("auth_token_checks_total", status=str(status_code), reason=reason)
+            results[token] = result
+        yield result
+
+def decode_or_reject(token: str) -> tuple[dict | None, str | None]:
+    """
+    Verifies a JWT, rejecting bad tokens as cheaply as possible:
+    1. Tokens rejected in the last `REJECTED_TOKEN_CACHE_TTL` seconds are refused from memory
+    2. Tokens without the shape of a JWT are refused before any decoding
+    3. Otherwise the token is decoded; if that fails, it is remembered as rejected
+
+    Returns `(payload, None)` or `(None, reason)`.
+    """
+    reason = rejected_tokens.get(token)
+    if reason is None:
+        reason = precheck(token)
+        if reason is not None:
+            rejected_tokens.count(reason)
+    if reason is None:
+        try:
+            # Includes the signature check, done inside the JWT library
+            with metrics.time("decode"):
+                return decode_claims(token), None
+        except ExpiredSignatureError:
+            reason = "expired"
+        except JWTError:
+            reason = "invalid"
+        rejected_tokens.put(token, reason)
+    return None, reason
+
+def decode_token(token: str) -> dict:
+    """
+    Verifies a JWT and returns its payload (see `decode_or_reject`).
+
+    Raises:
+    - 401 if token is invalid or expired
+    """
+    payload, reason = decode_or_reject(token)
+    if payload is None:
+        status_code, detail, _ = REJECTIONS[reason]
+        metrics.count("auth_token_checks_total", status=str(status_code), reason=reason)
+        raise HTTPException(status_code=status_code, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+    return payload
@@ -0,0 +1,72 @@
+import json
+import os
+
+from fastapi import HTTPException, status
+
+from auth import compile_scopes, verify_access_token
+
+# 1: authenticate protected routes in BearerAuthMiddleware instead of Depends(security)
+AUTH_MIDDLEWARE = os.getenv("AUTH_MIDDLEWARE", "0") == "1"
+
+
+def bearer_token(headers: list[tuple[bytes, bytes]]) -> str | None:
+    """Returns the token of an `Authorization: Bearer <token>` header, straight from the raw ASGI headers."""
+    for name, value in headers:
+        if name == b"authorization":
+            scheme, _, token = value.partition(b" ")
+            if scheme.lower() == b"bearer" and token:
+                return token.strip().decode("latin-1")
+            return None
+    return None
+
+
+class BearerAuthMiddleware:
+    """
+    Pure ASGI middleware that authenticates requests before they reach FastAPI.
+
+    `routes` maps a path to the scopes it requires, e.g. `{"/admin": ["admin"]}`;
+    they are compiled into scope masks once, when the middleware is created.
+    For those paths the middleware:
+    1. Reads the bearer token from the raw `Authorization` header
+    2. Runs `verify_access_token` (signature, type, scopes)
+    3. Stores the claims in `request.state.claims`, or answers 401/403 itself
+
+    Other paths are passed through untouched.
+    Verification runs on the event loop: with the verified-token cache it
+    costs microseconds, so it is cheaper than a trip through the threadpool.
+    """
+
+    def __init__(self, app, routes: dict[str, list[str]], verify=verify_access_token):
+        self.app = app
+        self.routes = {path: compile_scopes(scopes) for path, scopes in routes.items()}
+        self.verify = verify
+
+    async def __call__(self, scope, receive, send):
+        required_scopes = self.routes.get(scope["path"]) if scope["type"] == "http" else None
+        if required_scopes is None:
+            await self.app(scope, receive, send)
+            return
+
+        token = bearer_token(scope["headers"])
+        if token is None:
+            await self._send_error(send, status.HTTP_401_UNAUTHORIZED, "Not authenticated",
+                                   {"WWW-Authenticate": "Bearer"})
+            return
+        try:
+            claims = self.verify(token, required_scopes)
+        except HTTPException as e:
+            await self._send_error(send, e.status_code, e.detail, e.headers)
+            return
+
+        scope.setdefault("state", {})["claims"] = claims
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    async def _send_error(send, status_code: int, detail, headers: dict | None) -> None:
+        # Same body as FastAPI's HTTPException handler
+        body = json.dumps({"detail": detail}).encode()
+        raw_headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        raw_headers += [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                        for name, value in (headers or {}).items()]
+        await send({"type": "http.response.start", "status": status_code, "headers": raw_headers})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,84 @@
+"""
+Helpers shared by the benchmarks: start an app under a local uvicorn
+process and wait until it answers.
+"""
+import os
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import httpx
+
+APP_DIR = Path(__file__).resolve().parent.parent
+
+# Default settings so the benchmarks run without a .env file
+BENCH_ENV = {
+    "SECRET_KEY": "benchmark-secret",
+    "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "15",
+    "REFRESH_TOKEN_EXPIRE_DAYS": "7",
+    # Load tests log in from one IP as one user: no login rate limit unless a benchmark sets one
+    "LOGIN_RATE_PER_IP": "0",
+    "LOGIN_RATE_PER_USER": "0",
+}
+
+
+def bench_env(**overrides) -> dict:
+    env = {**BENCH_ENV, **os.environ}
+    env.update({key: str(value) for key, value in overrides.items()})
+    return env
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def run_server(app: str = "main:app", cwd: Path = APP_DIR, env: dict | None = None,
+               workers: int = 1, timeout: float = 30.0, quiet: bool = False):
+    """
+    Starts `uvicorn <app>` in a subprocess and yields its base URL.
+    The server is stopped when the block exits.
+    With `quiet`, whatever the app prints is discarded.
+    """
+    port = free_port()
+    cmd = [sys.executable, "-m", "uvicorn", app, "--port", str(port),
+           "--log-level", "warning", "--workers", str(workers)]
+    process = subprocess.Popen(cmd, cwd=cwd, env=env or bench_env(),
+                               stdout=subprocess.DEVNULL if quiet else None)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_ready(base_url, timeout)
+        yield base_url
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def wait_until_ready(base_url: str, timeout: float = 30.0) -> float:
+    """Polls `/` until it answers. Returns the seconds it took."""
+    start = time.perf_counter()
+    while True:
+        try:
+            httpx.get(base_url + "/", timeout=1.0)
+            return time.perf_counter() - start
+        except httpx.TransportError:
+            if time.perf_counter() - start > timeout:
+                raise RuntimeError(f"server at {base_url} did not start")
+            time.sleep(0.01)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return ordered[index]
@@ -0,0 +1,111 @@
+"""
+Sync and async builds of the app under many concurrent connections.
+
+The same server is started twice:
+- ASYNC_ROUTES=0: token-only routes and the auth dependency are plain `def`,
+  so every request waits for one of FastAPI's `THREADPOOL_SIZE` threads
+- ASYNC_ROUTES=1 (default): they run on the event loop
+
+`--connections` clients (each with its own keep-alive connection) hammer
+`--path` with one access token for `--duration` seconds; requests per
+second, p50 and p99 are printed for each build and threadpool size.
+The clients are spread over `--processes` processes, so that one Python
+client does not become the bottleneck.
+
+Usage (from 07_jwt_all_included):
+    python benchmarks/bench_async_routes.py --connections 1000 --duration 10
+    python benchmarks/bench_async_routes.py --connections 1000 --threadpool 40 200 --path /me
+"""
+import argparse
+import asyncio
+import os
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import httpx
+
+from _server import bench_env, percentile, run_server
+
+LOGIN = {"username": "alejandro", "password": "password123"}
+
+
+async def client_loop(client: httpx.AsyncClient, path: str, headers: dict, stop: asyncio.Event,
+                      latencies: list[float], errors: list[int]) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            response = await client.get(path, headers=headers)
+        except httpx.TransportError:
+            errors[0] += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            errors[0] += 1
+
+
+async def measure(base_url: str, path: str, headers: dict, duration: float,
+                  connections: int) -> tuple[list[float], int]:
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        # Open every connection before measuring: only steady-state requests are timed
+        await asyncio.gather(*(client.get(path, headers=headers) for _ in range(connections)))
+        stop = asyncio.Event()
+        latencies: list[float] = []
+        errors = [0]
+        tasks = [asyncio.create_task(client_loop(client, path, headers, stop, latencies, errors))
+                 for _ in range(connections)]
+        await asyncio.sleep(duration)
+        stop.set()
+        await asyncio.gather(*tasks)
+        return latencies, errors[0]
+
+
+def run_clients(*args) -> tuple[list[float], int]:
+    raise_open_files_limit(args[-1])
+    return asyncio.run(measure(*args))
+
+
+def raise_open_files_limit(connections: int) -> None:
+    # Client and server sockets live in this host: leave room for both
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = min(hard, max(soft, 2 * connections + 256))
+    if wanted > soft:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--path", default="/protected")
+    parser.add_argument("--threadpool", type=int, nargs="+", default=[40])
+    parser.add_argument("--processes", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    args = parser.parse_args()
+    raise_open_files_limit(args.connections)
+    shares = [args.connections // args.processes + (i < args.connections % args.processes)
+              for i in range(args.processes)]
+
+    for threadpool in args.threadpool:
+        for async_routes in ("0", "1"):
+            env = bench_env(ASYNC_ROUTES=async_routes, THREADPOOL_SIZE=threadpool, PASSWORD_HASH_POOL=0)
+            with run_server(env=env) as base_url:
+                token = httpx.post(base_url + "/login", params=LOGIN).json()["access_token"]
+                jobs = [(base_url, args.path, {"Authorization": f"Bearer {token}"}, args.duration, share)
+                        for share in shares]
+                if args.processes == 1:
+                    results = [run_clients(*jobs[0])]
+                else:
+                    with ProcessPoolExecutor(args.processes) as pool:
+                        results = list(pool.map(run_clients, *zip(*jobs)))
+            latencies = [latency for result, _ in results for latency in result]
+            errors = sum(failed for _, failed in results)
+            label = "async" if async_routes == "1" else "sync"
+            print(f"{label:>5} (threadpool {threadpool:>3}, {args.connections} connections): "
+                  f"{len(latencies) / args.duration:8.0f} req/s  "
+                  f"p50={percentile(latencies, 50) * 1000:8.2f} ms  "
+                  f"p99={percentile(latencies, 99) * 1000:8.2f} ms  errors={errors}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Requests per second on /protected: authentication in BearerAuthMiddleware
+(AUTH_MIDDLEWARE=1) versus the per-route Depends(security) chain.
+
+Usage (from 07_jwt_all_included):
+    python benchmarks/bench_auth_middleware.py --duration 10 --concurrency 32
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from _server import bench_env, percentile, run_server
+
+LOGIN = {"username": "alejandro", "password": "password123"}
+
+
+async def client_loop(client: httpx.AsyncClient, headers: dict, stop: asyncio.Event,
+                      latencies: list[float]) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.get("/protected", headers=headers)
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+
+
+async def measure(base_url: str, duration: float, concurrency: int) -> list[float]:
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        token = (await client.post("/login", params=LOGIN)).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        stop = asyncio.Event()
+        latencies: list[float] = []
+        tasks = [asyncio.create_task(client_loop(client, headers, stop, latencies)) for _ in range(concurrency)]
+        await asyncio.sleep(duration)
+        stop.set()
+        await asyncio.gather(*tasks)
+        return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    for middleware in ("0", "1"):
+        with run_server(env=bench_env(AUTH_MIDDLEWARE=middleware, PASSWORD_HASH_POOL=0)) as base_url:
+            latencies = asyncio.run(measure(base_url, args.duration, args.concurrency))
+        label = "middleware" if middleware == "1" else "Depends(security)"
+        print(f"{label:>17}: {len(latencies) / args.duration:8.0f} req/s  "
+              f"p50={percentile(latencies, 50) * 1000:7.2f} ms  "
+              f"p99={percentile(latencies, 99) * 1000:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Access tokens issued per second: one `create_access_token` call per token
+vs `create_access_tokens` (shared expiry and setup) vs BulkTokenIssuer
+fanning chunks out to `--workers` processes (token_issuer.py).
+
+Run with TOKEN_PROFILE=compact or SCOPE_MASK_CLAIM=1 to include the
+per-token scope mask work that the batch path compiles once.
+
+Usage (from 07_jwt_all_included):
+    python benchmarks/bench_bulk_issue.py --tokens 100000 --workers 1 4
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from _server import bench_env  # noqa: E402
+
+os.environ.update(bench_env())
+
+import auth  # noqa: E402
+from token_issuer import BulkTokenIssuer  # noqa: E402
+
+
+def rate(func, count: int) -> float:
+    start = time.perf_counter()
+    issued = func()
+    elapsed = time.perf_counter() - start
+    assert issued == count
+    return count / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    args = parser.parse_args()
+
+    items = [{"sub": f"svc-{i}", "scopes": ["user"]} for i in range(args.tokens)]
+    single = rate(lambda: sum(1 for item in items if auth.create_access_token(item)), args.tokens)
+    print(f"create_access_token per token: {single:10,.0f} tokens/s")
+    batch = rate(lambda: sum(1 for _ in auth.create_access_tokens(items)), args.tokens)
+    print(f"create_access_tokens:          {batch:10,.0f} tokens/s   x{batch / single:.2f}")
+
+    for workers in dict.fromkeys(args.workers):
+        issuer = BulkTokenIssuer(workers=workers, parallel_min=0, chunk_size=args.chunk_size)
+        # Start the processes before timing: the pool lives as long as the app
+        list(issuer.issue(items[:workers * args.chunk_size]))
+        bulk = rate(lambda: sum(1 for _ in issuer.issue(items)), args.tokens)
+        issuer.shutdown()
+        label = f"{workers:>2} workers" if workers > 1 else "(inline)  "
+        print(f"BulkTokenIssuer {label}:    {bulk:10,.0f} tokens/s   x{bulk / single:.2f}")
+
+
+if __name__ == "__main__":
+    main()
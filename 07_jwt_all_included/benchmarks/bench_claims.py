@@ -0,0 +1,124 @@
+"""
+Memory allocated per request by the claims of a verified access token.
+
+Compares, for the work of `/me` on a cached token (verify, then read sub,
+scopes, type and exp):
+
+- dict payload: the decoded dict and its scope mask kept in the token
+  cache, claims read with `payload.get(...)` and scope names rebuilt with
+  `auth.token_scopes` on every request (how routes used to read them)
+- TokenClaims: what `verify_access_token` returns now (claims.py), built
+  once per token with `__slots__` fields and scope names computed once
+
+then measures whole `GET /me` requests through the app. tracemalloc
+reports, averaged per request, the peak bytes allocated while it runs and
+the bytes its result still holds; the time per call is measured without
+tracing.
+
+Run with TOKEN_PROFILE=compact or SCOPE_MASK_CLAIM=1: scope names then
+come from a mask, which is where the dict payload allocates most.
+
+Usage (from 07_jwt_all_included):
+    python benchmarks/bench_claims.py --requests 10000
+    TOKEN_PROFILE=compact python benchmarks/bench_claims.py
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from _server import bench_env  # noqa: E402
+
+os.environ.update(bench_env(PASSWORD_HASH_POOL="0"))
+
+import auth  # noqa: E402
+from metrics import metrics  # noqa: E402
+from scopes import scope_registry  # noqa: E402
+from token_cache import TokenCache  # noqa: E402
+
+
+def allocated_per_call(func, calls: int) -> tuple[float, float]:
+    """
+    Bytes allocated by one call, traced by tracemalloc and averaged:
+    (peak while it runs, still held by its result when it returns).
+    """
+    func()  # warm caches outside of the measure
+    tracemalloc.start()
+    peaks = held = 0
+    for _ in range(calls):
+        base, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = func()
+        current, peak = tracemalloc.get_traced_memory()
+        peaks += peak - base
+        held += current - base
+        del result
+    tracemalloc.stop()
+    return peaks / calls, held / calls
+
+
+def time_per_call(func, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) / calls
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=10_000)
+    args = parser.parse_args()
+
+    token = auth.create_access_token({"sub": "alejandro", "scopes": ["user", "admin"]})
+    required = auth.compile_scopes(["user"])
+    payloads = TokenCache()
+
+    def dict_payload() -> dict:
+        # verify_access_token and /me as they were with dict payloads
+        with metrics.time("cache_lookup"):
+            cached = payloads.get(token)
+        if cached is None:
+            payload = auth.decode_claims(token)
+            cached = (payload, scope_registry.token_mask(payload))
+            payloads.put(token, cached, payload.get("exp"))
+        payload, granted = cached
+        jti = payload.get("jti")
+        if jti is not None and auth.revocation_list.is_revoked(jti):
+            raise AssertionError("revoked")
+        if payload.get("type") != "access":
+            raise AssertionError("wrong type")
+        with metrics.time("scope_check"):
+            allowed = granted & required == required
+        assert allowed
+        metrics.count("auth_token_checks_total", status="200", reason="ok")
+        return {"username": payload.get("sub"), "scopes": auth.token_scopes(payload),
+                "token_type": payload.get("type"), "expires": payload.get("exp")}
+
+    def token_claims() -> dict:
+        claims = auth.verify_access_token(token, required)
+        return {"username": claims.sub, "scopes": claims.scopes, "token_type": claims.type,
+                "expires": claims.exp}
+
+    print(f"TOKEN_PROFILE={auth.TOKEN_PROFILE} SCOPE_MASK_CLAIM={int(auth.SCOPE_MASK_CLAIM)}, cached token")
+    for name, func in (("dict payload", dict_payload), ("TokenClaims", token_claims)):
+        peak, held = allocated_per_call(func, args.requests)
+        seconds = time_per_call(func, args.requests)
+        print(f"  {name:<13} peak {peak:6,.0f} bytes   held {held:6,.0f} bytes   {seconds * 1e6:6.2f} us/request")
+
+    from fastapi.testclient import TestClient
+    import main as app_module
+
+    with TestClient(app_module.app) as client:
+        headers = {"Authorization": f"Bearer {token}"}
+        request = lambda: client.get("/me", headers=headers)  # noqa: E731
+        assert request().status_code == 200
+        peak, _ = allocated_per_call(request, args.requests // 10)
+    print(f"  GET /me (whole app, TestClient): peak {peak:8,.0f} bytes/request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Tokens per second introspected one at a time vs in batches.
+
+1. In process: `verify_access_token` called per token vs
+   `auth.introspect_tokens` on the whole list, with an empty token cache
+   (first sight of every token) and a warm one
+2. Over HTTP, as a gateway would: one `GET /me` per token (`--concurrency`
+   at once) vs `POST /introspect/batch` with `--batch` tokens per call
+
+The token list holds `--tokens` distinct tokens, each repeated `--repeat`
+times (a gateway batch often carries the same token several times).
+
+Usage (from 07_jwt_all_included):
+    python benchmarks/bench_introspection.py --tokens 2000 --repeat 2 --batch 500
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from _server import bench_env, run_server  # noqa: E402
+
+os.environ.update(bench_env())
+
+from fastapi import HTTPException  # noqa: E402
+
+import auth  # noqa: E402
+
+LOGIN = {"username": "alejandro", "password": "password123"}
+
+
+def one_by_one(tokens: list[str], required: int) -> None:
+    for token in tokens:
+        try:
+            auth.verify_access_token(token, required)
+        except HTTPException:
+            pass
+
+
+def in_process(tokens: list[str]) -> None:
+    required = auth.compile_scopes(["user"])
+    for label, func in (("one by one", lambda: one_by_one(tokens, required)),
+                        ("batch", lambda: list(auth.introspect_tokens(tokens, required)))):
+        for cache in ("cold", "warm"):
+            if cache == "cold":
+                auth.token_cache.clear()
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            print(f"in process {label:>10} ({cache}): {len(tokens) / elapsed:12,.0f} tokens/s")
+
+
+async def single_calls(client: httpx.AsyncClient, tokens: list[str], concurrency: int) -> None:
+    async def worker(chunk):
+        for token in chunk:
+            await client.get("/me", headers={"Authorization": f"Bearer {token}"})
+    await asyncio.gather(*(worker(tokens[i::concurrency]) for i in range(concurrency)))
+
+
+async def batch_calls(client: httpx.AsyncClient, tokens: list[str], batch: int, headers: dict) -> None:
+    for offset in range(0, len(tokens), batch):
+        response = await client.post("/introspect/batch", json={"tokens": tokens[offset:offset + batch]},
+                                     headers=headers)
+        response.raise_for_status()
+
+
+async def over_http(base_url: str, tokens: list[str], batch: int, concurrency: int) -> None:
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        # The gateway account needs the `introspect` scope: grant it, then log in again
+        admin = (await client.post("/login", params=LOGIN)).json()["access_token"]
+        await client.put("/admin/scopes", json={"username": "alejandro", "scopes": ["user", "admin", "introspect"]},
+                         headers={"Authorization": f"Bearer {admin}"})
+        gateway = (await client.post("/login", params=LOGIN)).json()["access_token"]
+        headers = {"Authorization": f"Bearer {gateway}"}
+
+        for label, call in ((f"GET /me x{concurrency}", single_calls(client, tokens, concurrency)),
+                            (f"batch of {batch}", batch_calls(client, tokens, batch, headers))):
+            start = time.perf_counter()
+            await call
+            elapsed = time.perf_counter() - start
+            print(f"over HTTP {label:>14}: {len(tokens) / elapsed:12,.0f} tokens/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=2000, help="distinct tokens")
+    parser.add_argument("--repeat", type=int, default=2, help="times each token appears")
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    distinct = [auth.create_access_token({"sub": f"user{i}", "scopes": ["user"]}) for i in range(args.tokens)]
+    tokens = distinct * args.repeat
+    random.shuffle(tokens)
+
+    in_process(tokens)
+    with run_server(env=bench_env(PASSWORD_HASH_POOL=0)) as base_url:
+        asyncio.run(over_http(base_url, tokens, args.batch, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Compares the JWT backends of jwt_backend.py on identical payloads:
+- encodes and decodes per second
+- memory allocated per call (tracemalloc peak, in bytes)
+- import time of the library, in a fresh interpreter
+
+Backends whose library is not installed are skipped.
+
+Usage (from 07_jwt_all_included):
+    python benchmarks/bench_jwt_backends.py --iterations 20000
+    python benchmarks/bench_jwt_backends.py --backends codec pyjwt --json results.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from jwt_backend import JWT_BACKENDS, create_jwt_backend  # noqa: E402
+
+SECRET = "benchmark-secret"
+
+# Module each backend imports, timed in a fresh interpreter
+BACKEND_MODULES = {
+    "codec": "token_codec",
+    "jose": "jose.jwt",
+    "pyjwt": "jwt",
+    "authlib": "authlib.jose",
+}
+
+
+def claims(scopes: int) -> dict:
+    return {
+        "sub": "alejandro",
+        "scopes": ["user", "admin"] + [f"scope-{i}" for i in range(scopes)],
+        "exp": datetime.now(timezone.utc) + timedelta(minutes=15),
+        "type": "access",
+    }
+
+
+def rate(func, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return iterations / (time.perf_counter() - start)
+
+
+def allocated_bytes(func, calls: int = 100) -> int:
+    """Median peak of memory allocated by one call."""
+    func()  # warm up caches and lazy imports
+    peaks = []
+    tracemalloc.start()
+    for _ in range(calls):
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        func()
+        peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+    return sorted(peaks)[len(peaks) // 2]
+
+
+def import_ms(module: str) -> float:
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    cwd = os.path.join(os.path.dirname(__file__), "..")
+    out = subprocess.run([sys.executable, "-c", code], cwd=cwd, capture_output=True, text=True, check=True)
+    return float(out.stdout) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20_000)
+    parser.add_argument("--backends", nargs="+", default=list(JWT_BACKENDS), choices=list(JWT_BACKENDS))
+    parser.add_argument("--scopes", type=int, default=0, help="extra scopes in the payload")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    payload = claims(args.scopes)
+    results = {}
+    for name in args.backends:
+        try:
+            backend = create_jwt_backend(SECRET, "HS256", name=name)
+        except ImportError as e:
+            print(f"{name:>8}  skipped ({e})")
+            continue
+        token = backend.encode(payload)
+        results[name] = {
+            "encode_per_s": rate(lambda: backend.encode(payload), args.iterations),
+            "decode_per_s": rate(lambda: backend.decode(token), args.iterations),
+            "encode_alloc_bytes": allocated_bytes(lambda: backend.encode(payload)),
+            "decode_alloc_bytes": allocated_bytes(lambda: backend.decode(token)),
+            "import_ms": import_ms(BACKEND_MODULES[name]),
+        }
+
+    print(f"{'backend':>8}  {'encode/s':>10}  {'decode/s':>10}  {'enc bytes':>9}  {'dec bytes':>9}  {'import ms':>9}")
+    for name, r in results.items():
+        print(f"{name:>8}  {r['encode_per_s']:10,.0f}  {r['decode_per_s']:10,.0f}  "
+              f"{r['encode_alloc_bytes']:9,d}  {r['decode_alloc_bytes']:9,d}  {r['import_ms']:9.1f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
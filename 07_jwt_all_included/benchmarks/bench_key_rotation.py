@@ -0,0 +1,91 @@
+"""
+Verify cost of the key ring (key_ring.py) as rotated keys pile up.
+
+For each ring size, a key directory is filled with `N` old HS256 keys
+(replaced ones still verifying, plus retired ones that `load_key_ring`
+leaves out) and one active key. All keys are HS256, so the signature check
+is cheap and any per-key overhead would show. Tokens of the active key and of the
+oldest key still verifying are then decoded: the `kid` selects the key with
+one dict lookup, so the rate must not depend on `N`.
+
+Exits with status 1 if verification at the largest size is more than
+`--tolerance` slower than with no old keys.
+
+Usage (from 07_jwt_all_included):
+    python benchmarks/bench_key_rotation.py --keys 0 10 100 1000 --iterations 20000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from key_ring import KeyRing, generate_key, load_key_ring, write_key  # noqa: E402
+
+DAY = 86400
+RETIRE_AFTER = 7 * DAY
+
+
+def best_rate(func, iterations: int, repeats: int = 5) -> float:
+    best = 0.0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        best = max(best, iterations / (time.perf_counter() - start))
+    return best
+
+
+def build_directory(directory: str, old_keys: int) -> None:
+    """One key replaced per hour, oldest first: the first ones are past RETIRE_AFTER."""
+    now = time.time()
+    for i in range(old_keys):
+        path = write_key(directory, generate_key(f"hs-{i:05d}", "HS256"))
+        created = now - (old_keys - i + 1) * 3600
+        os.utime(path, (created, created))
+    path = write_key(directory, generate_key("active", "HS256"))
+    os.utime(path, (now - 3600, now - 3600))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, nargs="+", default=[0, 10, 100, 1000],
+                        help="number of old keys in the directory")
+    parser.add_argument("--iterations", type=int, default=20_000)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    claims = {"sub": "alejandro", "scopes": ["user"], "exp": datetime.now(timezone.utc) + timedelta(minutes=15),
+              "type": "access"}
+    rates = []
+    for old_keys in args.keys:
+        with tempfile.TemporaryDirectory() as directory:
+            build_directory(directory, old_keys)
+            start = time.perf_counter()
+            ring = load_key_ring(directory, retire_after=RETIRE_AFTER)
+            load_ms = (time.perf_counter() - start) * 1000
+
+        active_token = ring.encode(claims)
+        active_rate = best_rate(lambda: ring.decode(active_token), args.iterations)
+        line = (f"{old_keys:>6} old keys ({len(ring.keys) - 1:>4} verifying, {len(ring.retires_at):>4} retiring): "
+                f"load {load_ms:8.1f} ms   active {active_rate:10,.0f}/s")
+        if ring.retires_at:
+            oldest = ring.keys[min(ring.retires_at, key=ring.retires_at.get)]
+            old_token = KeyRing([oldest], oldest.kid).encode(claims)
+            old_rate = best_rate(lambda: ring.decode(old_token), args.iterations)
+            line += f"   oldest {old_rate:10,.0f}/s"
+        print(line)
+        rates.append(active_rate)
+
+    slowdown = 1 - rates[-1] / rates[0]
+    print(f"verify rate with {args.keys[-1]} old keys vs {args.keys[0]}: {-slowdown:+.1%}")
+    if slowdown > args.tolerance:
+        print(f"FAIL: verification slowed down by more than {args.tolerance:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Cost of the login rate limiter (rate_limiter.py) and the bcrypt CPU it saves
+under a flood of bad credentials.
+
+1. Overhead: attempts per second through the in-memory and SQLite limiters,
+   on one hot key and on `--keys` distinct keys (LRU eviction past
+   LOGIN_RATE_LIMIT_KEYS)
+2. Attack: the app is started with and without the limiter while
+   `--attackers` clients post wrong passwords for one user and `--probes`
+   clients call /protected. Reported: attempts refused with 429, bcrypt
+   checks actually run, the CPU time they cost (bcrypt calls x the measured
+   cost of one check) and /protected latency
+
+Usage (from 07_jwt_all_included):
+    python benchmarks/bench_login_rate_limit.py --duration 10 --attackers 32
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import httpx
+
+from _server import bench_env, percentile, run_server
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fake_db import fake_users_db  # noqa: E402
+from password_hasher import check_password  # noqa: E402
+from rate_limiter import InMemoryRateLimiter, SQLiteRateLimiter  # noqa: E402
+
+LOGIN = {"username": "alejandro", "password": "password123"}
+BAD_LOGIN = {"username": "alejandro", "password": "wrong-password"}
+
+
+def rate(func, keys: list) -> float:
+    start = time.perf_counter()
+    for key in keys:
+        func(key)
+    return len(keys) / (time.perf_counter() - start)
+
+
+def bcrypt_cost(samples: int = 3) -> float:
+    hashed = fake_users_db["alejandro"]["hashed_password"]
+    start = time.process_time()
+    for _ in range(samples):
+        check_password(BAD_LOGIN["password"], hashed)
+    return (time.process_time() - start) / samples
+
+
+async def attacker(client: httpx.AsyncClient, stop: asyncio.Event, statuses: Counter) -> None:
+    while not stop.is_set():
+        response = await client.post("/login", params=BAD_LOGIN)
+        statuses[response.status_code] += 1
+
+
+async def probe(client: httpx.AsyncClient, token: str, stop: asyncio.Event, latencies: list[float]) -> None:
+    headers = {"Authorization": f"Bearer {token}"}
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.get("/protected", headers=headers)
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+
+
+async def attack(base_url: str, duration: float, attackers: int, probes: int) -> tuple[Counter, list[float]]:
+    limits = httpx.Limits(max_connections=attackers + probes)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        token = (await client.post("/login", params=LOGIN)).json()["access_token"]
+        stop = asyncio.Event()
+        statuses: Counter = Counter()
+        latencies: list[float] = []
+        tasks = [asyncio.create_task(attacker(client, stop, statuses)) for _ in range(attackers)]
+        tasks += [asyncio.create_task(probe(client, token, stop, latencies)) for _ in range(probes)]
+        await asyncio.sleep(duration)
+        stop.set()
+        await asyncio.gather(*tasks)
+        return statuses, latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200_000)
+    parser.add_argument("--keys", type=int, default=200_000, help="distinct keys for the eviction run")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--attackers", type=int, default=32, help="concurrent clients posting bad passwords")
+    parser.add_argument("--probes", type=int, default=4, help="concurrent /protected clients")
+    parser.add_argument("--rate", default="10/60", help="LOGIN_RATE_PER_USER for the attack run")
+    args = parser.parse_args()
+
+    hot = ["203.0.113.7"] * args.iterations
+    distinct = [f"user{i}" for i in range(args.keys)]
+    memory = InMemoryRateLimiter(10, 60, max_keys=args.keys // 2)
+    print(f"memory: hot key {rate(memory.acquire, hot):12,.0f} attempts/s   "
+          f"{args.keys:,} keys (LRU {args.keys // 2:,}) {rate(memory.acquire, distinct):12,.0f} attempts/s")
+    with tempfile.TemporaryDirectory() as directory:
+        sqlite = SQLiteRateLimiter(os.path.join(directory, "ratelimit.db"), 10, 60)
+        sample = args.iterations // 10
+        print(f"sqlite: hot key {rate(sqlite.acquire, hot[:sample]):12,.0f} attempts/s   "
+              f"{sample:,} keys {rate(sqlite.acquire, distinct[:sample]):21,.0f} attempts/s")
+        sqlite.close()
+
+    cost = bcrypt_cost()
+    print(f"one bcrypt check: {cost * 1000:.0f} ms of CPU")
+    for limited in (False, True):
+        env = bench_env(LOGIN_RATE_PER_USER=args.rate if limited else "0")
+        with run_server(env=env) as base_url:
+            statuses, latencies = asyncio.run(attack(base_url, args.duration, args.attackers, args.probes))
+        attempts = sum(statuses.values())
+        bcrypt_calls = statuses[400]
+        label = f"limit {args.rate}" if limited else "no limit"
+        print(f"{label:>12}: {attempts:6,} attempts  {statuses[429]:6,} refused (429)  "
+              f"{bcrypt_calls:5,} bcrypt checks = {bcrypt_calls * cost:6.1f} s CPU  "
+              f"{statuses[503]:5,} busy (503)   /protected p50={percentile(latencies, 50) * 1000:7.2f} ms  "
+              f"p99={percentile(latencies, 99) * 1000:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Latency of /protected while the same worker is flooded with logins.
+
+Runs the app twice, with bcrypt inline (PASSWORD_HASH_POOL=0) and with
+the password hashing process pool (PASSWORD_HASH_POOL=1), and prints
+p50/p99 latency of /protected for each.
+
+Usage (from 07_jwt_all_included):
+    python benchmarks/bench_login_storm.py --duration 10 --logins 64
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from _server import bench_env, percentile, run_server
+
+LOGIN = {"username": "alejandro", "password": "password123"}
+
+
+async def login_storm(client: httpx.AsyncClient, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        await client.post("/login", params=LOGIN)
+
+
+async def probe(client: httpx.AsyncClient, token: str, stop: asyncio.Event,
+                latencies: list[float]) -> None:
+    headers = {"Authorization": f"Bearer {token}"}
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.get("/protected", headers=headers)
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+
+
+async def measure(base_url: str, duration: float, logins: int, probes: int) -> list[float]:
+    limits = httpx.Limits(max_connections=logins + probes)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        token = (await client.post("/login", params=LOGIN)).json()["access_token"]
+        stop = asyncio.Event()
+        latencies: list[float] = []
+        tasks = [asyncio.create_task(login_storm(client, stop)) for _ in range(logins)]
+        tasks += [asyncio.create_task(probe(client, token, stop, latencies)) for _ in range(probes)]
+        await asyncio.sleep(duration)
+        stop.set()
+        await asyncio.gather(*tasks)
+        return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--logins", type=int, default=64, help="concurrent login clients")
+    parser.add_argument("--probes", type=int, default=4, help="concurrent /protected clients")
+    args = parser.parse_args()
+
+    for use_pool in ("0", "1"):
+        with run_server(env=bench_env(PASSWORD_HASH_POOL=use_pool)) as base_url:
+            latencies = asyncio.run(measure(base_url, args.duration, args.logins, args.probes))
+        label = "process pool" if use_pool == "1" else "inline bcrypt"
+        print(f"{label:>14}: {len(latencies):6d} requests  "
+              f"p50={percentile(latencies, 50) * 1000:8.2f} ms  "
+              f"p99={percentile(latencies, 99) * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
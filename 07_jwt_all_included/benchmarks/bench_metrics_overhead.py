@@ -0,0 +1,75 @@
+"""
+Overhead of the auth instrumentation (metrics.py) per request.
+
+Times verify_access_token on a cached token (the hot path of /protected)
+with METRICS disabled and enabled, and the disabled instrumentation calls
+on their own. Exits with status 1 if either overhead exceeds its budget,
+so it can run as a check in CI.
+
+Usage (from 07_jwt_all_included):
+    python benchmarks/bench_metrics_overhead.py --budget-enabled-us 5 --budget-disabled-us 2
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from _server import bench_env  # noqa: E402
+
+os.environ.update(bench_env())
+
+import auth  # noqa: E402
+from metrics import metrics  # noqa: E402
+
+
+def us_per_call(func, iterations: int, repeats: int = 5) -> float:
+    """Best of `repeats` runs, in microseconds per call."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        best = min(best, (time.perf_counter() - start) / iterations)
+    return best * 1e6
+
+
+def disabled_instrumentation() -> None:
+    # What the /protected hot path runs when metrics are disabled
+    with metrics.time("cache_lookup"):
+        pass
+    with metrics.time("scope_check"):
+        pass
+    metrics.count("auth_token_checks_total", status="200", reason="ok")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50_000)
+    parser.add_argument("--budget-enabled-us", type=float, default=5.0)
+    parser.add_argument("--budget-disabled-us", type=float, default=2.0)
+    args = parser.parse_args()
+
+    token = auth.create_access_token({"sub": "alejandro", "scopes": ["user"]})
+    verify = lambda: auth.verify_access_token(token, ["user"])  # noqa: E731
+    verify()  # cache the token
+
+    metrics.enabled = False
+    disabled = us_per_call(verify, args.iterations)
+    disabled_only = us_per_call(disabled_instrumentation, args.iterations)
+    metrics.enabled = True
+    enabled = us_per_call(verify, args.iterations)
+    metrics.enabled = False
+
+    enabled_overhead = enabled - disabled
+    print(f"verify_access_token (cache hit): disabled {disabled:6.2f} us   enabled {enabled:6.2f} us")
+    print(f"overhead when enabled:  {enabled_overhead:6.2f} us/request (budget {args.budget_enabled_us} us)")
+    print(f"overhead when disabled: {disabled_only:6.2f} us/request (budget {args.budget_disabled_us} us)")
+    ok = enabled_overhead <= args.budget_enabled_us and disabled_only <= args.budget_disabled_us
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
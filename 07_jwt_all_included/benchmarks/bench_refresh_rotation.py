@@ -0,0 +1,96 @@
+"""
+Cost and contention of single-flight refresh rotation (refresh_rotation.py).
+
+The store's rotation is simulated by a coroutine that waits `--store-ms`
+(a SQLite or socket round trip off the event loop). Two workloads:
+
+- distinct users: `--users` users refresh at once, one call each. With
+  the default stripes they rotate in parallel; with one stripe (a single
+  global lock) they queue behind each other
+- same token: bursts of `--parallel` calls with one token. Every burst
+  must cost one rotation and every call must get its result; a call made
+  once the burst is over must not get it (it rotates again, and the real
+  store refuses the consumed token)
+
+Usage (from 07_jwt_all_included):
+    python benchmarks/bench_refresh_rotation.py --users 1000 --stripes 1 16 256
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from _server import bench_env, percentile  # noqa: E402
+
+os.environ.update(bench_env())
+
+from refresh_rotation import RefreshRotations  # noqa: E402
+
+
+def store_rotation(store_ms: float):
+    async def rotate() -> dict:
+        await asyncio.sleep(store_ms / 1000)
+        return {"refresh_token": object()}
+    return rotate
+
+
+async def timed(rotations: RefreshRotations, username: str, token: str, rotate, latencies: list[float]) -> dict:
+    start = time.perf_counter()
+    result = await rotations.rotate(username, token, rotate)
+    latencies.append(time.perf_counter() - start)
+    return result
+
+
+async def distinct_users(stripes: int, users: int, store_ms: float) -> tuple[float, list[float]]:
+    rotations = RefreshRotations(stripes=stripes)
+    rotate = store_rotation(store_ms)
+    latencies: list[float] = []
+    start = time.perf_counter()
+    await asyncio.gather(*(timed(rotations, f"user-{i}", f"token-{i}", rotate, latencies) for i in range(users)))
+    return time.perf_counter() - start, latencies
+
+
+async def same_token(bursts: int, parallel: int, store_ms: float) -> RefreshRotations:
+    rotations = RefreshRotations(reuse_seconds=0)
+    rotate = store_rotation(store_ms)
+    latencies: list[float] = []
+    for i in range(bursts):
+        results = await asyncio.gather(*(timed(rotations, f"user-{i}", f"token-{i}", rotate, latencies)
+                                         for _ in range(parallel)))
+        assert all(result is results[0] for result in results)
+        replay = await rotations.rotate(f"user-{i}", f"token-{i}", rotate)
+        assert replay is not results[0], "a finished rotation was handed out again"
+    assert rotations.rotations == 2 * bursts and len(rotations) == 0
+    return rotations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--stripes", type=int, nargs="+", default=[1, 16, 256])
+    parser.add_argument("--parallel", type=int, default=8)
+    parser.add_argument("--bursts", type=int, default=1000)
+    parser.add_argument("--store-ms", type=float, default=1.0)
+    args = parser.parse_args()
+
+    print(f"{args.users} users refreshing at once, {args.store_ms} ms per rotation:")
+    for stripes in dict.fromkeys(args.stripes):
+        elapsed, latencies = asyncio.run(distinct_users(stripes, args.users, args.store_ms))
+        print(f"  {stripes:>5} stripes: {elapsed * 1000:8.1f} ms total   "
+              f"p50 {percentile(latencies, 50) * 1000:7.2f} ms   p99 {percentile(latencies, 99) * 1000:7.2f} ms")
+
+    start = time.perf_counter()
+    rotations = asyncio.run(same_token(args.bursts, args.parallel, args.store_ms))
+    elapsed = time.perf_counter() - start
+    calls = args.bursts * (args.parallel + 1)
+    print(f"{args.bursts} bursts of {args.parallel} calls with one token, then a replay: "
+          f"{rotations.rotations} rotations (one per burst, one per replay), "
+          f"{rotations.shared} shared results ({calls / elapsed:,.0f} calls/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Refresh token rotations per second for each RefreshTokenStore backend.
+
+Each thread logs in its own users once and then rotates their refresh
+token in a loop (compare-and-swap), like a stream of /refresh calls.
+
+Usage (from 07_jwt_all_included):
+    python benchmarks/bench_refresh_store.py --rotations 20000 --threads 1 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from refresh_store import (  # noqa: E402
+    InMemoryRefreshTokenStore,
+    SQLiteRefreshTokenStore,
+    UnixSocketRefreshTokenStore,
+    make_server,
+)
+
+TOKEN = "x" * 200  # about the size of a real refresh token
+
+
+def rotate_loop(store, worker: int, rotations: int, users: int) -> None:
+    names = [f"user-{worker}-{i}" for i in range(users)]
+    current = {}
+    for name in names:
+        current[name] = f"{TOKEN}-0"
+        store.set(name, current[name], time.time() + 3600)
+    for i in range(1, rotations + 1):
+        name = names[i % users]
+        new_token = f"{TOKEN}-{i}"
+        if not store.rotate(name, current[name], new_token, time.time() + 3600):
+            raise RuntimeError("rotation lost")
+        current[name] = new_token
+
+
+def run(store, threads: int, rotations: int, users: int) -> float:
+    per_thread = rotations // threads
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        for future in [pool.submit(rotate_loop, store, t, per_thread, users) for t in range(threads)]:
+            future.result()
+    return per_thread * threads / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rotations", type=int, default=20_000)
+    parser.add_argument("--users", type=int, default=100, help="users per thread")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server = make_server(os.path.join(tmp, "store.sock"))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        backends = {
+            "memory": lambda: InMemoryRefreshTokenStore(),
+            "sqlite": lambda: SQLiteRefreshTokenStore(os.path.join(tmp, "tokens.db")),
+            "unix": lambda: UnixSocketRefreshTokenStore(server.server_address),
+        }
+        for name, factory in backends.items():
+            for threads in args.threads:
+                store = factory()
+                rate = run(store, threads, args.rotations, args.users)
+                store.close()
+                print(f"{name:>7}  threads={threads:<3d} {rate:12,.0f} rotations/s")
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Cost of rejecting bad access tokens in verify_access_token.
+
+Measures microseconds per call for a forged token (bad signature), an
+expired token and a malformed one, with and without the negative cache
+of recently rejected tokens.
+
+Usage (from 07_jwt_all_included):
+    python benchmarks/bench_rejections.py --iterations 20000
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from _server import bench_env  # noqa: E402
+
+os.environ.update(bench_env())
+
+from fastapi import HTTPException  # noqa: E402
+
+import auth  # noqa: E402
+
+
+def us_per_call(token: str, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        try:
+            auth.verify_access_token(token, ["user"])
+        except HTTPException:
+            pass
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20_000)
+    args = parser.parse_args()
+
+    valid = auth.create_access_token({"sub": "alejandro", "scopes": ["user"]})
+    tokens = {
+        "forged": valid[:-4] + ("AAAA" if not valid.endswith("AAAA") else "BBBB"),
+        "expired": auth.create_access_token({"sub": "alejandro", "scopes": ["user"]}, timedelta(seconds=-60)),
+        "malformed": "not-a-jwt" * 20,
+    }
+    ttl = auth.rejected_tokens.ttl
+    for name, token in tokens.items():
+        auth.rejected_tokens.ttl = 0
+        auth.rejected_tokens.clear()
+        uncached = us_per_call(token, args.iterations)
+        auth.rejected_tokens.ttl = ttl
+        cached = us_per_call(token, args.iterations)
+        print(f"{name:>9}:  no negative cache {uncached:7.2f} us/call   negative cache {cached:7.2f} us/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Cost of the revocation check (revocation.py) on the request path.
+
+For each size, `N` token ids are revoked, then ids that were never revoked
+(the common case) and revoked ones are checked against:
+- the RevocationList (Bloom filter in front of a dict)
+- a naive per-request SQLite lookup on the shared revocation table
+
+Also reports the measured false positive rate of the filter and how long
+a new worker takes to start from a snapshot vs replaying the SQLite table.
+
+Usage (from 07_jwt_all_included):
+    python benchmarks/bench_revocation.py --revoked 1000 100000 --iterations 100000
+"""
+import argparse
+import os
+import secrets
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from revocation import RevocationList, SQLiteRevocationLog  # noqa: E402
+
+
+def rate(func, items: list) -> float:
+    start = time.perf_counter()
+    for item in items:
+        func(item)
+    return len(items) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--revoked", type=int, nargs="+", default=[1_000, 100_000])
+    parser.add_argument("--iterations", type=int, default=100_000)
+    args = parser.parse_args()
+
+    for size in args.revoked:
+        with tempfile.TemporaryDirectory() as directory:
+            db = os.path.join(directory, "revoked.db")
+            snapshot = os.path.join(directory, "revoked.snapshot")
+            expires_at = time.time() + 3600
+            revoked = [secrets.token_urlsafe(12) for _ in range(size)]
+            fresh = [secrets.token_urlsafe(12) for _ in range(args.iterations)]
+
+            revocations = RevocationList(SQLiteRevocationLog(db), snapshot_path=snapshot, capacity=size)
+            for jti in revoked:
+                revocations.revoke(jti, expires_at)
+            revocations.close()
+
+            start = time.perf_counter()
+            from_log = RevocationList(SQLiteRevocationLog(db), capacity=size)
+            replay_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            from_snapshot = RevocationList(snapshot_path=snapshot)
+            snapshot_ms = (time.perf_counter() - start) * 1000
+            assert len(from_snapshot) == len(from_log) == size
+
+            sample = (revoked * (args.iterations // max(size, 1) + 1))[:args.iterations]
+            bloom_fresh = rate(from_snapshot.is_revoked, fresh)
+            bloom_revoked = rate(from_snapshot.is_revoked, sample)
+            false_positives = from_snapshot.filter_hits - len(sample)
+
+            conn = SQLiteRevocationLog(db)._conn
+            query = "SELECT 1 FROM revoked_tokens WHERE jti = ? AND expires_at > ?"
+            now = time.time()
+            sqlite_fresh = rate(lambda jti: conn.execute(query, (jti, now)).fetchone(), fresh)
+            conn.close()
+            from_log.close()
+
+        print(f"{size:>8,} revoked:")
+        print(f"    not revoked: bloom {bloom_fresh:12,.0f} checks/s   sqlite {sqlite_fresh:10,.0f} checks/s")
+        print(f"    revoked:     bloom {bloom_revoked:12,.0f} checks/s")
+        print(f"    false positives {false_positives / len(fresh):.3%}, filter {len(from_snapshot._bloom):,} bytes")
+        print(f"    worker startup: snapshot {snapshot_ms:7.1f} ms   replay from sqlite {replay_ms:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Cost of the scope check per request: the previous set-based check
+(`set(required).issubset(set(token_scopes))`) versus a precompiled scope
+mask (a single AND), for growing numbers of scopes.
+
+Usage (from 07_jwt_all_included):
+    python benchmarks/bench_scopes.py --scopes 2 16 128 1024
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from scopes import ScopeRegistry  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scopes", type=int, nargs="+", default=[2, 16, 128, 1024],
+                        help="scopes granted by the token")
+    parser.add_argument("--required", type=int, default=2, help="scopes required by the route")
+    parser.add_argument("--iterations", type=int, default=200_000)
+    args = parser.parse_args()
+
+    for count in args.scopes:
+        names = [f"scope-{i}" for i in range(count)]
+        registry = ScopeRegistry(names)
+        token_scopes = names  # the token is granted every scope
+        required_scopes = names[-args.required:]  # worst case for a linear search
+
+        granted = registry.token_mask({"scopes": token_scopes})
+        required = registry.mask(required_scopes)
+
+        sets = timeit.timeit(lambda: set(required_scopes).issubset(set(token_scopes)), number=args.iterations)
+        masks = timeit.timeit(lambda: granted & required == required, number=args.iterations)
+        to_mask = timeit.timeit(lambda: registry.token_mask({"scopes": token_scopes}), number=args.iterations // 10)
+        print(f"scopes={count:>5}:  sets {sets / args.iterations * 1e9:9.0f} ns/check   "
+              f"mask {masks / args.iterations * 1e9:6.0f} ns/check   "
+              f"(token -> mask once per token: {to_mask / (args.iterations // 10) * 1e9:9.0f} ns)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Sign and verify throughput of the key ring (key_ring.py) for each
+algorithm: HS256, RS256, ES256 and EdDSA, with the same access-token claims.
+
+Keys are generated in memory and parsed once, as in the app.
+
+Usage (from 07_jwt_all_included):
+    python benchmarks/bench_signing_algorithms.py --iterations 5000
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from key_ring import KeyRing, generate_key  # noqa: E402
+
+ALGORITHMS = ["HS256", "RS256", "ES256", "EdDSA"]
+
+
+def rate(func, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return iterations / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=5_000)
+    parser.add_argument("--algorithms", nargs="+", default=ALGORITHMS, choices=ALGORITHMS)
+    args = parser.parse_args()
+
+    claims = {
+        "sub": "alejandro",
+        "scopes": ["user", "admin"],
+        "exp": datetime.now(timezone.utc) + timedelta(minutes=15),
+        "type": "access",
+    }
+    for algorithm in args.algorithms:
+        ring = KeyRing([generate_key(algorithm.lower(), algorithm)], algorithm.lower())
+        token = ring.encode(claims)
+        sign = rate(lambda: ring.encode(claims), args.iterations)
+        verify = rate(lambda: ring.decode(token), args.iterations)
+        print(f"{algorithm:>6}:  sign {sign:10,.0f}/s   verify {verify:10,.0f}/s   token {len(token)} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Startup cost of main.py, to track across releases.
+
+Measures:
+- `python -X importtime -c "import main"`: total import time of main
+  and the slowest modules (cumulative)
+- time-to-first-request: from launching uvicorn to the first answer on `/`
+
+Usage (from 07_jwt_all_included):
+    python benchmarks/bench_startup.py --runs 5 --json startup.json
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from _server import APP_DIR, bench_env, run_server
+
+
+def import_times(module: str = "main") -> dict[str, int]:
+    """Returns {module: cumulative microseconds} from one `-X importtime` run."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=APP_DIR, env=bench_env(), capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def time_to_first_request() -> float:
+    start = time.perf_counter()
+    with run_server():
+        return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="slowest modules to list")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    runs = [import_times() for _ in range(args.runs)]
+    import_main = statistics.median(run["main"] for run in runs) / 1000
+    slowest = sorted(runs[-1].items(), key=lambda item: item[1], reverse=True)[:args.top]
+    first_request = statistics.median(time_to_first_request() for _ in range(args.runs))
+
+    print(f"import main (median of {args.runs}): {import_main:8.1f} ms")
+    print(f"time to first request (median):   {first_request * 1000:8.1f} ms")
+    print("slowest imports (cumulative):")
+    for name, micros in slowest:
+        print(f"  {micros / 1000:8.1f} ms  {name}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "import_main_ms": import_main,
+                "time_to_first_request_ms": first_request * 1000,
+                "slowest_imports_ms": {name: micros / 1000 for name, micros in slowest},
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
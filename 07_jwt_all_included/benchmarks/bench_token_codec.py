@@ -0,0 +1,73 @@
+"""
+Encodes and decodes per second: python-jose (`jwt.encode`/`jwt.decode`)
+versus the pre-keyed TokenCodec used by auth.py.
+
+Both sides sign the same access-token claims with the same secret, and the
+script first checks that their tokens are byte-for-byte identical.
+
+Usage (from 07_jwt_all_included):
+    python benchmarks/bench_token_codec.py --iterations 50000
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from jose import jwt  # noqa: E402
+
+from token_codec import TokenCodec  # noqa: E402
+
+SECRET = "benchmark-secret"
+
+
+def claims(scopes: int) -> dict:
+    return {
+        "sub": "alejandro",
+        "scopes": ["user", "admin"] + [f"scope-{i}" for i in range(scopes)],
+        "exp": datetime.now(timezone.utc) + timedelta(minutes=15),
+        "type": "access",
+    }
+
+
+def rate(func, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return iterations / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50_000)
+    parser.add_argument("--algorithm", default="HS256", choices=["HS256", "HS384", "HS512"])
+    parser.add_argument("--scopes", type=int, default=0, help="extra scopes in the payload")
+    args = parser.parse_args()
+
+    codec = TokenCodec(SECRET, args.algorithm)
+    payload = claims(args.scopes)
+    jose_token = jwt.encode(payload, SECRET, algorithm=args.algorithm)
+    codec_token = codec.encode(payload)
+    if jose_token != codec_token:
+        sys.exit("TokenCodec output differs from python-jose")
+    print(f"token: {len(codec_token)} bytes, identical for both implementations")
+
+    results = {
+        "encode": (
+            rate(lambda: jwt.encode(payload, SECRET, algorithm=args.algorithm), args.iterations),
+            rate(lambda: codec.encode(payload), args.iterations),
+        ),
+        "decode": (
+            rate(lambda: jwt.decode(jose_token, SECRET, algorithms=[args.algorithm]), args.iterations),
+            rate(lambda: codec.decode(codec_token), args.iterations),
+        ),
+    }
+    for operation, (jose_rate, codec_rate) in results.items():
+        print(f"{operation}:  python-jose {jose_rate:10,.0f}/s   TokenCodec {codec_rate:10,.0f}/s"
+              f"   x{codec_rate / jose_rate:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Access token size and decode time: standard profile versus the compact
+profile of token_profile.py (short claims, numeric type, scope mask, no
+`typ` header), for a typical user and for users with many scopes.
+
+Decode time includes turning compact claims back into standard names.
+
+Usage (from 07_jwt_all_included):
+    python benchmarks/bench_token_profile.py --scopes 2 32 256
+"""
+import argparse
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from scopes import SCOPES, ScopeRegistry  # noqa: E402
+from token_codec import TokenCodec  # noqa: E402
+from token_profile import COMPACT_HEADERS, compact_claims, expand_claims  # noqa: E402
+
+SECRET = "benchmark-secret"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scopes", type=int, nargs="+", default=[2, 32, 256], help="scopes of the user")
+    parser.add_argument("--iterations", type=int, default=50_000)
+    args = parser.parse_args()
+
+    standard_codec = TokenCodec(SECRET)
+    compact_codec = TokenCodec(SECRET, headers=COMPACT_HEADERS)
+    for count in args.scopes:
+        names = [*SCOPES, *(f"scope-{i}" for i in range(max(0, count - len(SCOPES))))][:count]
+        registry = ScopeRegistry(names)
+        claims = {
+            "sub": "alejandro",
+            "scopes": names,
+            "exp": datetime.now(timezone.utc) + timedelta(minutes=15),
+            "type": "access",
+        }
+        standard = standard_codec.encode(claims)
+        compact = compact_codec.encode(compact_claims(claims, registry))
+
+        standard_us = timeit.timeit(lambda: standard_codec.decode(standard), number=args.iterations)
+        compact_us = timeit.timeit(lambda: expand_claims(compact_codec.decode(compact)), number=args.iterations)
+        print(f"scopes={count:>4}:  standard {len(standard):5d} bytes {standard_us / args.iterations * 1e6:6.2f} us   "
+              f"compact {len(compact):4d} bytes {compact_us / args.iterations * 1e6:6.2f} us   "
+              f"({1 - len(compact) / len(standard):.0%} smaller)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+User lookups of login/refresh with and without the read-through user cache
+(user_cache.py), on a SQLite user store.
+
+- Skewed workload: `--lookups` lookups over `--users` users where a few
+  users make most requests (Zipf-like), as with refresh traffic
+- Burst: `--threads` threads refresh the same user at once, to show that
+  single-flight sends one query to the store instead of one per thread
+
+Usage (from 07_jwt_all_included):
+    python benchmarks/bench_user_cache.py --users 100000 --lookups 200000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from user_cache import CachedUserRepository  # noqa: E402
+from user_repository import SQLiteUserRepository  # noqa: E402
+
+FAKE_HASH = "$2b$12$" + "x" * 53
+
+
+class CountingRepository(SQLiteUserRepository):
+    """SQLite store that counts the lookups it really serves."""
+
+    queries = 0
+
+    def get(self, username):
+        self.queries += 1
+        return super().get(username)
+
+
+def skewed_names(users: int, lookups: int) -> list[str]:
+    weights = [1 / (rank + 1) for rank in range(users)]
+    return [f"user{i}" for i in random.choices(range(users), weights, k=lookups)]
+
+
+def burst(repository, threads: int) -> float:
+    barrier = threading.Barrier(threads)
+
+    def refresh():
+        barrier.wait()
+        repository.get("user0")
+
+    workers = [threading.Thread(target=refresh) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=200_000)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--ttl", type=float, default=60.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = CountingRepository(os.path.join(directory, "users.db"))
+        store.add_many((f"user{i}", FAKE_HASH, ["user"]) for i in range(args.users))
+        names = skewed_names(args.users, args.lookups)
+
+        for label, repository in (("no cache", store), ("cached", CachedUserRepository(store, ttl=args.ttl))):
+            store.queries = 0
+            start = time.perf_counter()
+            for name in names:
+                repository.get(name)
+            elapsed = time.perf_counter() - start
+            line = f"{label:>9}: {len(names) / elapsed:10,.0f} lookups/s   store queries {store.queries:>8,}"
+            if isinstance(repository, CachedUserRepository):
+                line += f"   hit ratio {repository.stats()['hit_ratio']:.1%}"
+            print(line)
+
+        for label, repository in (("no cache", store), ("cached", CachedUserRepository(store, ttl=args.ttl))):
+            store.queries = 0
+            elapsed = burst(repository, args.threads)
+            print(f"{label:>9}: burst of {args.threads} refreshes for one user in {elapsed * 1000:.1f} ms   "
+                  f"store queries {store.queries}")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
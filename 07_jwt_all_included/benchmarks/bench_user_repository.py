@@ -0,0 +1,97 @@
+"""
+Lookups and registrations per second of the SQLite user store
+(user_repository.py) as the number of users grows.
+
+For each size, a fresh database is filled with `N` users (bulk import),
+then measured:
+- lookups of existing and unknown users, from 1 and from `--threads` threads
+- lookups through AsyncUserRepository, `--threads` concurrent tasks
+- registrations (one autocommit INSERT each, as `POST /register` does)
+
+The in-memory repository is measured once for reference.
+
+Usage (from 07_jwt_all_included):
+    python benchmarks/bench_user_repository.py --users 10000 1000000
+    python benchmarks/bench_user_repository.py --users 10000 1000000 10000000 --operations 20000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from user_repository import AsyncUserRepository, InMemoryUserRepository, SQLiteUserRepository  # noqa: E402
+
+# Stands in for a bcrypt hash: same length, no hashing cost
+FAKE_HASH = "$2b$12$" + "x" * 53
+
+
+def rate(func, items: list, threads: int = 1) -> float:
+    start = time.perf_counter()
+    if threads == 1:
+        for item in items:
+            func(item)
+    else:
+        with ThreadPoolExecutor(threads) as executor:
+            list(executor.map(func, items, chunksize=256))
+    return len(items) / (time.perf_counter() - start)
+
+
+async def async_rate(repository: AsyncUserRepository, names: list, concurrency: int) -> float:
+    chunks = [names[i::concurrency] for i in range(concurrency)]
+
+    async def worker(chunk):
+        for name in chunk:
+            await repository.get(name)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(chunk) for chunk in chunks))
+    return len(names) / (time.perf_counter() - start)
+
+
+def seed(repository: SQLiteUserRepository, size: int, batch: int = 100_000) -> float:
+    start = time.perf_counter()
+    for offset in range(0, size, batch):
+        repository.add_many((f"user{i}", FAKE_HASH, ["user"]) for i in range(offset, min(offset + batch, size)))
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, nargs="+", default=[10_000, 1_000_000])
+    parser.add_argument("--operations", type=int, default=50_000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    memory = InMemoryUserRepository({f"user{i}": {"username": f"user{i}", "hashed_password": FAKE_HASH,
+                                                  "scopes": ["user"]} for i in range(10_000)})
+    names = [f"user{random.randrange(10_000)}" for _ in range(args.operations)]
+    print(f"memory:// (10,000 users): lookups {rate(memory.get, names):12,.0f}/s")
+
+    for size in args.users:
+        with tempfile.TemporaryDirectory() as directory:
+            repository = SQLiteUserRepository(os.path.join(directory, "users.db"), pool_size=args.threads)
+            seconds = seed(repository, size)
+            existing = [f"user{random.randrange(size)}" for _ in range(args.operations)]
+            unknown = [f"nobody{i}" for i in range(args.operations)]
+            new = [(f"new{i}", FAKE_HASH, ["user"]) for i in range(args.operations // 5)]
+
+            print(f"sqlite ({size:,} users, imported in {seconds:.1f} s, "
+                  f"{os.path.getsize(os.path.join(directory, 'users.db')) / 2**20:,.1f} MiB):")
+            print(f"    lookups  1 thread  {rate(repository.get, existing):10,.0f}/s"
+                  f"   unknown {rate(repository.get, unknown):10,.0f}/s")
+            print(f"    lookups {args.threads:>2} threads {rate(repository.get, existing, args.threads):10,.0f}/s")
+            async_users = AsyncUserRepository(repository)
+            async_lookups = asyncio.run(async_rate(async_users, existing, args.threads))
+            print(f"    lookups async x{args.threads:<3} {async_lookups:10,.0f}/s")
+            print(f"    registrations     {rate(lambda user: repository.add(*user), new):10,.0f}/s")
+            async_users.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Throughput and memory of the offline verification CLI (verify_tokens.py).
+
+Writes synthetic access logs of each `--lines` size (one token per line,
+mostly valid with some expired, forged and refresh tokens, drawn from
+`--distinct` tokens), then runs `verify_tokens.py` over each with every
+`--workers` count. Reported: tokens per second and the peak RSS of the
+CLI process, which should not grow with the input size.
+
+Usage (from 07_jwt_all_included):
+    python benchmarks/bench_verify_tokens.py --lines 100000 1000000 --workers 1 4
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from _server import APP_DIR, bench_env  # noqa: E402
+
+os.environ.update(bench_env())
+
+import auth  # noqa: E402
+
+
+def write_log(path: str, lines: int, distinct: int) -> None:
+    tokens = [auth.create_access_token({"sub": f"user{i}", "scopes": ["user"]}) for i in range(distinct)]
+    tokens.append(auth.create_access_token({"sub": "late", "scopes": ["user"]}, timedelta(seconds=-1)))
+    tokens.append(auth.create_refresh_token({"sub": "user0"}))
+    tokens.append(tokens[0][:-4] + "AAAA")
+    with open(path, "w") as log:
+        for _ in range(lines):
+            log.write(f'203.0.113.7 - - "GET /protected HTTP/1.1" 200 "Bearer {random.choice(tokens)}"\n')
+
+
+def run_cli(path: str, workers: int) -> tuple[float, float]:
+    """Returns (seconds, peak RSS in MiB) of one CLI run. The CLI is the only child waited for."""
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "verify_tokens.py", path, "--workers", str(workers)],
+                               cwd=APP_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    if status != 0:
+        raise RuntimeError(f"verify_tokens.py exited with status {status}")
+    # ru_maxrss is in KiB on Linux
+    return elapsed, usage.ru_maxrss / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--distinct", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for lines in args.lines:
+            path = os.path.join(directory, f"access-{lines}.log")
+            write_log(path, lines, args.distinct)
+            size = os.path.getsize(path) / 2**20
+            for workers in dict.fromkeys(args.workers):
+                seconds, rss = run_cli(path, workers)
+                print(f"{lines:>10,} tokens ({size:7,.1f} MiB) {workers:>2} workers: "
+                      f"{lines / seconds:10,.0f} tokens/s   peak RSS {rss:6.1f} MiB")
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+End-to-end load test of the tutorial apps (02-07).
+
+Each app is started under a local uvicorn and driven by `--concurrency`
+async clients for `--duration` seconds. Every client logs in once before
+the clock starts (on app 07, as a user of its own: the app keeps one
+active refresh token per user), then picks operations at random following
+`--mix` (operations an app does not have are skipped). Throughput,
+p50/p95/p99 latency and errors per operation are printed and written as
+JSON.
+
+The script exits with status 1 if any request failed: latencies of a run
+with errors mostly measure the error path. With `--baseline`, results are
+also compared with a previous JSON report, and throughput drops or p99
+growth of more than `--tolerance` fail the run.
+
+Usage (from 07_jwt_all_included):
+    python benchmarks/loadtest.py --apps 07 --duration 10 --concurrency 16 32
+    python benchmarks/loadtest.py --mix protected=8,refresh=1,login=1 --output results.json
+    python benchmarks/loadtest.py --baseline results.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import sys
+import time
+import weakref
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import httpx
+
+from _server import APP_DIR, bench_env, percentile, run_server
+
+REPO_DIR = APP_DIR.parent
+PASSWORD_07 = "loadtest-password"
+# Users registered on app 07, one per client: unique for the whole run, the server outlives each measure
+USER_IDS_07 = itertools.count()
+# Seed admin of app 07: grants the admin scope to the load-test users, so the `admin` op gets 200s
+ADMIN_07 = {"username": "alejandro", "password": "password123"}
+# Its login, once per HTTP client (one per measure): logins are rate limited per username
+ADMIN_LOGINS_07: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def bearer(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+# Operations of each app. A session dict holds the tokens of one client.
+
+async def login_get(client, session, path="/login"):
+    response = await client.get(path)
+    session["access"] = response.json().get("access_token")
+    return response
+
+
+async def get_protected(client, session, path="/protected"):
+    return await client.get(path, headers=bearer(session["access"]))
+
+
+async def login_06(client, session):
+    response = await client.post("/login", params={"username": "loadtest"})
+    session.update(access=response.json()["access_token"], refresh=response.json()["refresh_token"])
+    return response
+
+
+async def refresh_06(client, session):
+    response = await client.post("/refresh", headers=bearer(session["refresh"]))
+    if response.status_code == 200:
+        session.update(access=response.json()["access_token"], refresh=response.json()["refresh_token"])
+    return response
+
+
+async def admin_login_07(client):
+    if client not in ADMIN_LOGINS_07:
+        ADMIN_LOGINS_07[client] = asyncio.ensure_future(client.post("/login", params=ADMIN_07))
+    # Shared by the setups of all clients: one of them being cancelled must not cancel the others' login
+    return await asyncio.shield(ADMIN_LOGINS_07[client])
+
+
+async def setup_07(client, session):
+    session["credentials"] = {"username": f"loadtest-{next(USER_IDS_07)}", "password": PASSWORD_07}
+    response = await client.post("/register", json=session["credentials"])
+    if response.status_code != 200:
+        return response
+    admin = await admin_login_07(client)
+    if admin.status_code != 200:
+        return admin
+    response = await client.put("/admin/scopes", headers=bearer(admin.json()["access_token"]),
+                                json={"username": session["credentials"]["username"], "scopes": ["user", "admin"]})
+    if response.status_code != 200:
+        return response
+    return await login_07(client, session)
+
+
+async def login_07(client, session):
+    response = await client.post("/login", params=session["credentials"])
+    if response.status_code == 200:
+        session.update(access=response.json()["access_token"], refresh=response.json()["refresh_token"])
+    return response
+
+
+async def refresh_07(client, session):
+    response = await client.post("/refresh", params={"refresh_token": session["refresh"]})
+    if response.status_code == 200:
+        session.update(access=response.json()["access_token"], refresh=response.json()["refresh_token"])
+    return response
+
+
+@dataclass
+class App:
+    directory: str
+    module: str
+    ops: dict = field(default_factory=dict)
+    # Run once per client before measuring (default: the app's login)
+    setup: Callable | None = None
+
+
+APPS = {
+    "02": App("02_login_jwt_fastapi", "app:app", {"login": login_get}),
+    "03": App("03_manual_headers_jwt", "app:app", {"login": login_get, "protected": get_protected}),
+    "04": App("04_httpbearer_jwt", "app:app", {"login": login_get, "protected": get_protected}),
+    "05": App("05_jwt_scopes", "app:app", {
+        "login": lambda c, s: login_get(c, s, "/login_admin"),
+        "protected": lambda c, s: get_protected(c, s, "/data"),
+    }),
+    "06": App("06_jwt_access&refresh", "app:app", {
+        "login": login_06, "refresh": refresh_06, "protected": get_protected,
+    }),
+    "07": App("07_jwt_all_included", "main:app", {
+        "login": login_07, "refresh": refresh_07, "protected": get_protected,
+        "admin": lambda c, s: get_protected(c, s, "/admin"),
+    }, setup=setup_07),
+}
+
+
+def parse_mix(text: str) -> dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+async def start_session(client, app: App) -> dict:
+    session: dict = {}
+    response = await (app.setup or app.ops["login"])(client, session)
+    if response.status_code != 200:
+        raise RuntimeError(f"client setup failed: {response.status_code} {response.text}")
+    return session
+
+
+async def client_loop(client, app: App, session: dict, mix: dict[str, float], stop: asyncio.Event,
+                      samples: dict[str, list], errors: dict[str, int]) -> None:
+    names = [name for name in mix if name in app.ops]
+    weights = [mix[name] for name in names]
+    while names and not stop.is_set():
+        name = random.choices(names, weights)[0]
+        start = time.perf_counter()
+        response = await app.ops[name](client, session)
+        samples[name].append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            errors[name] += 1
+
+
+async def measure(base_url: str, app: App, mix: dict[str, float], duration: float, concurrency: int) -> dict:
+    samples = {name: [] for name in app.ops}
+    errors = {name: 0 for name in app.ops}
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        sessions = await asyncio.gather(*(start_session(client, app) for _ in range(concurrency)))
+        stop = asyncio.Event()
+        tasks = [asyncio.create_task(client_loop(client, app, session, mix, stop, samples, errors))
+                 for session in sessions]
+        await asyncio.sleep(duration)
+        stop.set()
+        await asyncio.gather(*tasks)
+
+    report = {}
+    for name, latencies in samples.items():
+        if not latencies:
+            continue
+        report[name] = {
+            "requests": len(latencies),
+            "errors": errors[name],
+            "rps": len(latencies) / duration,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+        }
+    return report
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Returns a description of every operation that regressed against the baseline."""
+    regressions = []
+    for run, ops in results.items():
+        for name, current in ops.items():
+            previous = baseline.get(run, {}).get(name)
+            if previous is None or current["errors"]:
+                # Runs with errors are reported as such: their latencies are mostly the error path
+                continue
+            if previous.get("errors"):
+                regressions.append(f"{run} {name}: baseline has {previous['errors']} errors, not comparable")
+                continue
+            if current["rps"] < previous["rps"] * (1 - tolerance):
+                regressions.append(f"{run} {name}: {previous['rps']:.0f} -> {current['rps']:.0f} req/s")
+            if current["p99_ms"] > previous["p99_ms"] * (1 + tolerance):
+                regressions.append(f"{run} {name}: p99 {previous['p99_ms']:.2f} -> {current['p99_ms']:.2f} ms")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apps", nargs="+", default=list(APPS), choices=list(APPS))
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("protected=8,admin=1,refresh=1,login=0.2"),
+                        help="operation weights, e.g. protected=8,refresh=1,login=1")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[16])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--output", default="loadtest.json")
+    parser.add_argument("--baseline", help="previous JSON report to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.20)
+    args = parser.parse_args()
+
+    results = {}
+    for key in args.apps:
+        app = APPS[key]
+        with run_server(app.module, cwd=REPO_DIR / app.directory, env=bench_env(), quiet=True) as base_url:
+            for concurrency in args.concurrency:
+                run = f"{key}@{concurrency}"
+                results[run] = asyncio.run(measure(base_url, app, args.mix, args.duration, concurrency))
+                for name, r in results[run].items():
+                    print(f"{run:>7} {name:>9}: {r['rps']:8.0f} req/s  p50={r['p50_ms']:7.2f} ms  "
+                          f"p95={r['p95_ms']:7.2f} ms  p99={r['p99_ms']:7.2f} ms  errors={r['errors']}")
+
+    Path(args.output).write_text(json.dumps(results, indent=2))
+    print(f"results written to {args.output}")
+
+    failed = [f"{run} {name}: {r['errors']} of {r['requests']} requests failed"
+              for run, ops in results.items() for name, r in ops.items() if r["errors"]]
+    for failure in failed:
+        print(f"ERRORS {failure}")
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        failed += regressions
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
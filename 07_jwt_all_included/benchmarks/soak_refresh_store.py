@@ -0,0 +1,74 @@
+"""
+Soak test: memory of the in-memory refresh token store stays flat.
+
+Simulates a stream of logins (one new user each, the worst case) with a
+fake clock, so that REFRESH_TOKEN_EXPIRE_DAYS pass many times during the
+run, plus rotations of recent sessions. Memory is sampled with tracemalloc
+and with the store's own gauge. Exits with status 1 if memory keeps growing
+after the first expiry window.
+
+Usage (from 07_jwt_all_included):
+    python benchmarks/soak_refresh_store.py --logins 1000000
+"""
+import argparse
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from refresh_store import InMemoryRefreshTokenStore  # noqa: E402
+
+DAY = 24 * 60 * 60
+TOKEN = "x" * 200  # about the size of a real refresh token
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=1_000_000)
+    parser.add_argument("--days", type=float, default=70.0, help="simulated time span")
+    parser.add_argument("--expire-days", type=float, default=7.0)
+    parser.add_argument("--samples", type=int, default=10)
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed growth after warm-up")
+    args = parser.parse_args()
+
+    clock = FakeClock()
+    store = InMemoryRefreshTokenStore(clock=clock)
+    step = args.days * DAY / args.logins
+    warm_up = int(args.expire_days * DAY / step) * 2  # two expiry windows
+    sample_every = max(1, (args.logins - warm_up) // args.samples)
+
+    tracemalloc.start()
+    samples = []
+    for i in range(args.logins):
+        clock.now += step
+        username = f"user-{i}"
+        token = f"{TOKEN}{i}"
+        store.set(username, token, clock.now + args.expire_days * DAY)
+        if i % 3 == 0:
+            store.rotate(username, token, token + "r", clock.now + args.expire_days * DAY)
+        if i >= warm_up and (i - warm_up) % sample_every == 0:
+            traced, _ = tracemalloc.get_traced_memory()
+            stats = store.stats()
+            samples.append(traced)
+            print(f"logins={i + 1:>9,}  day={clock.now / DAY:6.1f}  entries={stats['entries']:>8,}  "
+                  f"gauge={stats['approx_bytes'] / 2**20:7.1f} MiB  traced={traced / 2**20:7.1f} MiB")
+    tracemalloc.stop()
+
+    if not samples:
+        sys.exit("not enough logins to get past the warm-up, increase --logins")
+    growth = (max(samples) - samples[0]) / samples[0]
+    print(f"growth after warm-up: {growth:+.1%} (tolerance {args.tolerance:.0%})")
+    sys.exit(0 if growth <= args.tolerance else 1)
+
+
+if __name__ == "__main__":
+    main()
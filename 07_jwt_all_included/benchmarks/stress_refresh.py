@@ -0,0 +1,141 @@
+"""
+Stress test: parallel /refresh calls with the same refresh token.
+
+`--users` users log in, then for `--rounds` rounds every user fires
+`--parallel` refreshes with its current refresh token at once (all users
+at the same time), like a mobile app whose requests all woke up together.
+The requests of a burst are written back to back on connections opened
+beforehand. Each round checks that:
+
+- every successful call of a burst got the same new pair, and the others
+  were refused with a 400: never two pairs for one token
+- the server rotated the token exactly once (auth_refresh_rotations)
+- replaying the consumed token afterwards is refused with a 400
+
+and continues with the new token. Exits with status 1 on the first failure.
+
+Calls share a rotation only while it runs: a call the server reads after
+the rotation has finished gets a 400, like any replay. That happens when
+the server is idle (a rotation with the in-memory stores takes well under
+a millisecond), less under load; the counts of shared and refused calls
+are printed. With REFRESH_REUSE_SECONDS set,
+every call of a burst must succeed, and the replay check is skipped
+(the window hands the pair out again by design).
+
+Usage (from 07_jwt_all_included):
+    python benchmarks/stress_refresh.py --users 50 --parallel 8 --rounds 20
+    REFRESH_TOKEN_STORE=sqlite:////tmp/refresh.db python benchmarks/stress_refresh.py
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+from _server import bench_env, run_server
+
+PASSWORD = "stress-password"
+
+
+async def rotations(client: httpx.AsyncClient) -> int:
+    response = await client.get("/metrics")
+    return int(float(re.search(r"^auth_refresh_rotations (\S+)$", response.text, re.M).group(1)))
+
+
+async def read_response(reader: asyncio.StreamReader) -> tuple[int, bytes]:
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    length = int(re.search(rb"(?i)content-length: *(\d+)", head).group(1))
+    return status, await reader.readexactly(length)
+
+
+async def burst(connections: list, host: str, username: str, token: str, reuse: bool) -> tuple[str, int]:
+    """
+    Sends one refresh with `token` on every connection at once.
+    Returns the new refresh token and the number of calls refused.
+    """
+    request = (f"POST /refresh?refresh_token={token} HTTP/1.1\r\nHost: {host}\r\n"
+               f"Content-Length: 0\r\n\r\n").encode()
+    # No await between the writes: the requests leave back to back
+    for _, writer in connections:
+        writer.write(request)
+    await asyncio.gather(*(writer.drain() for _, writer in connections))
+    responses = await asyncio.gather(*(read_response(reader) for reader, _ in connections))
+    statuses = [status for status, _ in responses]
+    allowed = {200} if reuse else {200, 400}
+    if not set(statuses) <= allowed or 200 not in statuses:
+        raise AssertionError(f"{username}: statuses {statuses}")
+    pairs = {body for status, body in responses if status == 200}
+    if len(pairs) != 1:
+        raise AssertionError(f"{username}: {len(pairs)} different pairs for one refresh token")
+    return json.loads(pairs.pop())["refresh_token"], statuses.count(400)
+
+
+async def stress(base_url: str, users: int, parallel: int, rounds: int, reuse: bool) -> None:
+    url = urlsplit(base_url)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        names = [f"stress-{i}" for i in range(users)]
+        tokens = {}
+        for name in names:
+            response = await client.post("/register", json={"username": name, "password": PASSWORD})
+            assert response.status_code == 200, response.text
+            response = await client.post("/login", params={"username": name, "password": PASSWORD})
+            tokens[name] = response.json()["refresh_token"]
+        connections = {name: [await asyncio.open_connection(url.hostname, url.port) for _ in range(parallel)]
+                       for name in names}
+
+        calls = refused = 0
+        start = time.perf_counter()
+        try:
+            for round_number in range(1, rounds + 1):
+                before = await rotations(client)
+                results = await asyncio.gather(*(burst(connections[name], url.netloc, name, tokens[name], reuse)
+                                                 for name in names))
+                calls += users * parallel
+                refused += sum(count for _, count in results)
+                rotated = await rotations(client) - before
+                if rotated != users:
+                    raise AssertionError(f"round {round_number}: {rotated} rotations for {users} tokens")
+                if not reuse:
+                    replays = await asyncio.gather(*(client.post("/refresh", params={"refresh_token": tokens[name]})
+                                                     for name in names))
+                    accepted = [r.status_code for r in replays if r.status_code != 400]
+                    if accepted:
+                        raise AssertionError(f"round {round_number}: replayed tokens answered {accepted}")
+                tokens = {name: token for name, (token, _) in zip(names, results)}
+        finally:
+            for name in names:
+                for _, writer in connections[name]:
+                    writer.close()
+        elapsed = time.perf_counter() - start
+        rotated = rounds * users
+        print(f"{rounds} rounds x {users} users x {parallel} parallel refreshes: OK, one rotation and one pair "
+              f"per token ({calls / elapsed:,.0f} refreshes/s)")
+        print(f"    {rotated:,} rotations, {calls - rotated - refused:,} calls shared one, "
+              f"{refused:,} refused (400)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--parallel", type=int, default=8, help="refreshes per user and round")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    reuse = float(os.environ.get("REFRESH_REUSE_SECONDS", "0")) > 0
+    # One worker: single-flight is per process, /metrics too
+    with run_server(env=bench_env(METRICS="1"), quiet=True) as base_url:
+        try:
+            asyncio.run(stress(base_url, args.users, args.parallel, args.rounds, reuse))
+        except AssertionError as e:
+            print(f"FAILED: {e}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+from scopes import ScopeRegistry, scope_registry
+
+
+class TokenClaims:
+    """
+    Verified claims of an access token, as returned by the auth dependencies.
+
+    - Built once per token, when it is decoded, and kept in the verified-token
+      cache: requests with a cached token reuse the same object instead of
+      reading a dict and rebuilding lists on every call
+    - `__slots__` attributes for the claims routes use (`sub`, `type`, `exp`
+      as an int, `jti`) and the granted scope mask
+    - `scopes` (names) are only computed when a route asks for them, once
+    - Other claims are read with `claims["name"]` / `claims.get("name")`, and
+      `payload` is the decoded dict (standard claim names)
+
+    Instances are shared between requests: treat them as read-only.
+    """
+
+    __slots__ = ("sub", "type", "exp", "jti", "scope_mask", "payload", "_scopes", "_registry")
+
+    def __init__(self, payload: dict, registry: ScopeRegistry = scope_registry):
+        self.payload = payload
+        self.sub: str | None = payload.get("sub")
+        self.type: str | None = payload.get("type")
+        exp = payload.get("exp")
+        self.exp: int | None = int(exp) if exp is not None else None
+        self.jti: str | None = payload.get("jti")
+        self.scope_mask = registry.token_mask(payload)
+        self._scopes: tuple[str, ...] | None = None
+        self._registry = registry
+
+    @property
+    def scopes(self) -> tuple[str, ...]:
+        """Scope names granted by the token, whichever way it carries them."""
+        if self._scopes is None:
+            if "scope_mask" in self.payload:
+                self._scopes = tuple(self._registry.names(self.scope_mask))
+            else:
+                self._scopes = tuple(self.payload.get("scopes", ()))
+        return self._scopes
+
+    def allows(self, required: int) -> bool:
+        """True if the token grants every scope of `required`, a mask from `compile_scopes`."""
+        return self.scope_mask & required == required
+
+    def __getitem__(self, name: str):
+        return self.payload[name]
+
+    def get(self, name: str, default=None):
+        return self.payload.get(name, default)
+
+    def __repr__(self) -> str:
+        return f"TokenClaims(sub={self.sub!r}, type={self.type!r}, exp={self.exp!r})"
@@ -0,0 +1,42 @@
+import heapq
+import sys
+from collections.abc import Iterable
+
+
+class ExpiryIndex:
+    """
+    Min-heap of (expires_at, key) used to drop entries when they expire.
+
+    Finding what expired costs O(log n) per expired entry instead of
+    scanning the whole map.
+
+    The index does not know about updates: when a key is re-added with a new
+    expiry, the old heap entry stays until it surfaces. The owner decides if
+    a popped entry is still current (see `pop_expired`) and calls `compact`
+    when stale entries pile up.
+    """
+
+    def __init__(self):
+        self._heap: list[tuple[float, str]] = []
+
+    def add(self, key: str, expires_at: float) -> None:
+        heapq.heappush(self._heap, (expires_at, key))
+
+    def pop_expired(self, now: float):
+        """Yields (key, expires_at) for every heap entry that expired at `now`."""
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            expires_at, key = heapq.heappop(heap)
+            yield key, expires_at
+
+    def compact(self, live: Iterable[tuple[str, float]]) -> None:
+        """Rebuilds the heap from the current (key, expires_at) entries."""
+        self._heap = [(expires_at, key) for key, expires_at in live]
+        heapq.heapify(self._heap)
+
+    def approx_bytes(self) -> int:
+        """Approximate memory of the heap: list + one (float, key) tuple per entry (keys not counted)."""
+        return sys.getsizeof(self._heap) + len(self._heap) * (sys.getsizeof((0.0, "")) + sys.getsizeof(0.0))
+
+    def __len__(self) -> int:
+        return len(self._heap)
@@ -1,17 +1,18 @@
-import bcrypt
-
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
-
+# Seed users are stored with precomputed bcrypt hashes.
+# Hashing them here would cost ~250 ms of CPU per user in every worker at import time.
+# To add a seed user, generate the hash once:
+#   python -c "from password_hasher import hash_password; print(hash_password('...'))"
 fake_users_db = {
     "alejandro": {
         "username": "alejandro",
-        "hashed_password": hash_password("password123"),
+        # password123
+        "hashed_password": "$2b$12$QSDHRrIjg4eT4BR3uM/jSuGuOizvjG5F1Gf0ZcH4juqh8QOcbj18S",
         "scopes": ["user", "admin"]
     },
     "maria": {
         "username": "maria",
-        "hashed_password": hash_password("password456"),
+        # password456
+        "hashed_password": "$2b$12$K.rbtFDzMNDB5.5uRFLpv.o5wC4Op.GJNrmT82Y07aGZLMoJ6CDZm",
         "scopes": ["user"]
     }
 }
@@ -0,0 +1,248 @@
+import os
+from abc import ABC, abstractmethod
+from calendar import timegm
+from datetime import datetime
+
+from dotenv import load_dotenv
+from jose.exceptions import ExpiredSignatureError, JWTError
+
+from token_codec import BadSignatureError, TokenCodec
+
+load_dotenv()
+
+# codec (default, in-house TokenCodec)  |  jose  |  pyjwt  |  authlib  |  keyring
+JWT_BACKEND = os.getenv("JWT_BACKEND", "codec")
+# keyring backend: directory of key files and kid of the signing key (default: newest key)
+JWT_KEYS_DIR = os.getenv("JWT_KEYS_DIR", "keys")
+JWT_ACTIVE_KID = os.getenv("JWT_ACTIVE_KID") or None
+# keyring backend: seconds between checks of JWT_KEYS_DIR for new, changed or retired keys (0: load at startup only)
+JWT_KEYS_RELOAD_SECONDS = float(os.getenv("JWT_KEYS_RELOAD_SECONDS", "60"))
+# keyring backend: seconds other services may cache /.well-known/jwks.json (Cache-Control max-age).
+# A new key starts signing only after that too, once every cached JWKS lists it
+JWKS_MAX_AGE = int(os.getenv("JWKS_MAX_AGE", "300"))
+# keyring backend: days a replaced key keeps verifying before it is retired.
+# Defaults to REFRESH_TOKEN_EXPIRE_DAYS, the longest a token it signed can live; unset: keys never retire
+_retire_days = os.getenv("JWT_KEY_RETIRE_DAYS") or os.getenv("REFRESH_TOKEN_EXPIRE_DAYS")
+JWT_KEY_RETIRE_DAYS = float(_retire_days) if _retire_days else None
+
+
+class JWTBackend(ABC):
+    """
+    Library used to sign and verify tokens, bound to one secret and algorithm.
+
+    `headers` are extra JOSE header fields; a field set to None is left out
+    (`{"typ": None}` drops `typ`) where the library allows it.
+
+    The rest of the app only calls `encode` and `decode`, so switching
+    library is a matter of setting `JWT_BACKEND`.
+    Whatever the library, errors are raised as python-jose exceptions:
+    - ExpiredSignatureError if the token has expired
+    - BadSignatureError (token_codec.py, a JWTError) if its signature does not match
+    - JWTError for any other invalid token
+    """
+
+    name = ""
+
+    def __init__(self, secret: str, algorithm: str = "HS256", headers: dict | None = None):
+        self.secret = secret
+        self.algorithm = algorithm
+        self.headers = headers or {}
+
+    @abstractmethod
+    def encode(self, claims: dict) -> str:
+        """Returns a signed JWT. `exp`, `iat` and `nbf` may be datetimes."""
+
+    @abstractmethod
+    def decode(self, token: str) -> dict:
+        """Verifies signature and expiration, returns the claims."""
+
+    def close(self) -> None:
+        """Stops background work, if any (called at server shutdown)."""
+
+
+def _numeric_dates(claims: dict) -> dict:
+    # Not every library converts datetimes to NumericDate on its own
+    converted = dict(claims)
+    for time_claim in ("exp", "iat", "nbf"):
+        value = converted.get(time_claim)
+        if isinstance(value, datetime):
+            converted[time_claim] = timegm(value.utctimetuple())
+    return converted
+
+
+class CodecJWTBackend(JWTBackend):
+    """In-house pre-keyed HMAC codec (token_codec.py). HS256/HS384/HS512 only."""
+
+    name = "codec"
+
+    def __init__(self, secret: str, algorithm: str = "HS256", headers: dict | None = None):
+        super().__init__(secret, algorithm, headers)
+        self._codec = TokenCodec(secret, algorithm, self.headers)
+
+    def encode(self, claims: dict) -> str:
+        return self._codec.encode(claims)
+
+    def decode(self, token: str) -> dict:
+        return self._codec.decode(token)
+
+
+class JoseJWTBackend(JWTBackend):
+    """python-jose, the library used throughout the tutorial. Always writes `typ`."""
+
+    name = "jose"
+
+    def __init__(self, secret: str, algorithm: str = "HS256", headers: dict | None = None):
+        super().__init__(secret, algorithm, headers)
+        from jose import jwt
+        from jose.exceptions import JWSSignatureError
+
+        self._jwt = jwt
+        self._signature_error = JWSSignatureError
+        self._algorithms = [algorithm]
+        self._headers = {name: value for name, value in self.headers.items() if value is not None} or None
+
+    def encode(self, claims: dict) -> str:
+        return self._jwt.encode(claims, self.secret, algorithm=self.algorithm, headers=self._headers)
+
+    def decode(self, token: str) -> dict:
+        try:
+            return self._jwt.decode(token, self.secret, algorithms=self._algorithms)
+        except ExpiredSignatureError:
+            raise
+        except JWTError as e:
+            # python-jose raises a JWSSignatureError and re-raises it as JWSError, then JWTError:
+            # the original type is only left in the exception chain
+            cause = e.__cause__ or e.__context__
+            while cause is not None and not isinstance(cause, self._signature_error):
+                cause = cause.__cause__ or cause.__context__
+            if cause is not None:
+                raise BadSignatureError(str(e))
+            raise
+
+
+class PyJWTBackend(JWTBackend):
+    """PyJWT (`pip install pyjwt`)."""
+
+    name = "pyjwt"
+
+    def __init__(self, secret: str, algorithm: str = "HS256", headers: dict | None = None):
+        super().__init__(secret, algorithm, headers)
+        import jwt
+
+        self._jwt = jwt
+        self._algorithms = [algorithm]
+        self._headers = self.headers or None  # PyJWT drops headers set to None itself
+
+    def encode(self, claims: dict) -> str:
+        return self._jwt.encode(claims, self.secret, algorithm=self.algorithm, headers=self._headers)
+
+    def decode(self, token: str) -> dict:
+        try:
+            return self._jwt.decode(token, self.secret, algorithms=self._algorithms)
+        except self._jwt.ExpiredSignatureError as e:
+            raise ExpiredSignatureError(str(e))
+        except self._jwt.InvalidSignatureError as e:
+            raise BadSignatureError(str(e))
+        except self._jwt.InvalidTokenError as e:
+            raise JWTError(str(e))
+
+
+class AuthlibJWTBackend(JWTBackend):
+    """Authlib (`pip install authlib`). Always writes `typ`."""
+
+    name = "authlib"
+
+    def __init__(self, secret: str, algorithm: str = "HS256", headers: dict | None = None):
+        super().__init__(secret, algorithm, headers)
+        from authlib.jose import JsonWebToken, errors
+
+        self._jwt = JsonWebToken([algorithm])
+        self._errors = errors
+        header = {"alg": algorithm, "typ": "JWT", **self.headers}
+        self._header = {name: value for name, value in header.items() if value is not None}
+        self._key = secret.encode()
+
+    def encode(self, claims: dict) -> str:
+        return self._jwt.encode(self._header, _numeric_dates(claims), self._key).decode()
+
+    def decode(self, token: str) -> dict:
+        try:
+            claims = self._jwt.decode(token, self._key)
+            claims.validate()
+        except self._errors.ExpiredTokenError as e:
+            raise ExpiredSignatureError(str(e))
+        except self._errors.BadSignatureError as e:
+            raise BadSignatureError(str(e))
+        except (self._errors.JoseError, ValueError) as e:
+            raise JWTError(str(e))
+        return dict(claims)
+
+
+class KeyRingJWTBackend(JWTBackend):
+    """
+    In-house key ring (key_ring.py): RS256/ES256/EdDSA/HS* keys indexed by `kid`,
+    loaded from `JWT_KEYS_DIR`. Tokens carry the `kid` of the key that signed them.
+
+    SECRET_KEY joins the ring as key `default`: it verifies tokens issued
+    without `kid`, and signs when the directory has no signing key.
+
+    Keys rotate without a restart: every `JWT_KEYS_RELOAD_SECONDS` the directory
+    is checked and, if a key was added or is due to retire, a new ring replaces
+    `key_ring` in one assignment. A new key file starts signing two reload
+    intervals after it appears, when every worker verifies it already;
+    the key it replaces retires `JWT_KEY_RETIRE_DAYS` later.
+    """
+
+    name = "keyring"
+
+    def __init__(self, secret: str, algorithm: str = "HS256", headers: dict | None = None,
+                 keys_dir: str = JWT_KEYS_DIR, active_kid: str | None = JWT_ACTIVE_KID,
+                 reload_seconds: float = JWT_KEYS_RELOAD_SECONDS, retire_days: float | None = JWT_KEY_RETIRE_DAYS,
+                 jwks_max_age: int = JWKS_MAX_AGE):
+        super().__init__(secret, algorithm, headers)
+        from key_ring import HMAC_ALGORITHMS, HMACKey, KeyRingReloader, load_key_ring
+
+        fallback = HMACKey("default", secret.encode(), algorithm) if secret and algorithm in HMAC_ALGORITHMS else None
+        # Called with each new ring, after it is swapped in
+        self.reload_listeners = []
+        retire_after = retire_days * 86400 if retire_days is not None else None
+        self.jwks_max_age = jwks_max_age
+        activate_after = 2 * reload_seconds + jwks_max_age
+        self.reloader = KeyRingReloader(
+            keys_dir,
+            load=lambda: load_key_ring(keys_dir, active_kid, fallback, retire_after, activate_after),
+            on_reload=self._swap,
+            interval=reload_seconds,
+        )
+        self.key_ring = self.reloader.ring
+        self.reloader.start()
+
+    def _swap(self, ring) -> None:
+        self.key_ring = ring
+        for listener in self.reload_listeners:
+            listener(ring)
+
+    def encode(self, claims: dict) -> str:
+        return self.key_ring.encode(claims)
+
+    def decode(self, token: str) -> dict:
+        return self.key_ring.decode(token)
+
+    def close(self) -> None:
+        self.reloader.stop()
+
+
+JWT_BACKENDS = {
+    backend.name: backend
+    for backend in (CodecJWTBackend, JoseJWTBackend, PyJWTBackend, AuthlibJWTBackend, KeyRingJWTBackend)
+}
+
+
+def create_jwt_backend(secret: str, algorithm: str = "HS256", name: str = JWT_BACKEND,
+                       headers: dict | None = None) -> JWTBackend:
+    """Builds the backend selected by `JWT_BACKEND` (`codec`, `jose`, `pyjwt`, `authlib` or `keyring`)."""
+    try:
+        backend = JWT_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown JWT_BACKEND: {name}")
+    return backend(secret, algorithm, headers)
@@ -0,0 +1,438 @@
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Callable
+from pathlib import Path
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, padding, rsa
+from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature, encode_dss_signature
+from jose.exceptions import JWTError
+
+from token_codec import BadSignatureError, b64url_decode, b64url_encode, encode_claims, parse_claims, validate_claims
+
+logger = logging.getLogger(__name__)
+
+HMAC_ALGORITHMS = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+
+
+def _b64_int(value: int) -> str:
+    return b64url_encode(value.to_bytes((value.bit_length() + 7) // 8, "big")).decode()
+
+
+class SigningKey(ABC):
+    """
+    One key of the ring, identified by its `kid`.
+
+    The key material is parsed once, when the key is loaded, and the JOSE
+    header of the tokens it signs is encoded once as well.
+    Keys without private material (public keys of other issuers, or keys
+    published for verification only) can verify but not sign.
+    """
+
+    algorithm = ""
+
+    def __init__(self, kid: str):
+        self.kid = kid
+        header = {"alg": self.algorithm, "kid": kid, "typ": "JWT"}
+        self.header_segment = b64url_encode(json.dumps(header, separators=(",", ":"), sort_keys=True).encode())
+
+    @property
+    def can_sign(self) -> bool:
+        return True
+
+    @abstractmethod
+    def sign(self, signing_input: bytes) -> bytes:
+        """Signature of `signing_input` (the raw JWS signature, before base64url)."""
+
+    @abstractmethod
+    def verify(self, signature: bytes, signing_input: bytes) -> bool:
+        """Returns True if `signature` is a signature of `signing_input` by this key."""
+
+    def public_jwk(self) -> dict | None:
+        """Public key as a JWK, or None for secret (HMAC) keys."""
+        return None
+
+
+class HMACKey(SigningKey):
+    def __init__(self, kid: str, secret: bytes, algorithm: str = "HS256"):
+        self.algorithm = algorithm
+        super().__init__(kid)
+        self.secret = secret
+        self._mac = hmac.new(secret, digestmod=HMAC_ALGORITHMS[algorithm])
+
+    def sign(self, signing_input: bytes) -> bytes:
+        mac = self._mac.copy()
+        mac.update(signing_input)
+        return mac.digest()
+
+    def verify(self, signature: bytes, signing_input: bytes) -> bool:
+        return hmac.compare_digest(signature, self.sign(signing_input))
+
+
+class AsymmetricKey(SigningKey):
+    def __init__(self, kid: str, private_key=None, public_key=None):
+        super().__init__(kid)
+        self.private_key = private_key
+        self.public_key = public_key or private_key.public_key()
+
+    @property
+    def can_sign(self) -> bool:
+        return self.private_key is not None
+
+    def verify(self, signature: bytes, signing_input: bytes) -> bool:
+        try:
+            self._verify(signature, signing_input)
+            return True
+        except (InvalidSignature, ValueError):
+            return False
+
+    @abstractmethod
+    def _verify(self, signature: bytes, signing_input: bytes) -> None:
+        """Raises InvalidSignature (or ValueError) if `signature` does not match."""
+
+
+class RSAKey(AsymmetricKey):
+    algorithm = "RS256"
+
+    def sign(self, signing_input: bytes) -> bytes:
+        return self.private_key.sign(signing_input, padding.PKCS1v15(), hashes.SHA256())
+
+    def _verify(self, signature: bytes, signing_input: bytes) -> None:
+        self.public_key.verify(signature, signing_input, padding.PKCS1v15(), hashes.SHA256())
+
+    def public_jwk(self) -> dict:
+        numbers = self.public_key.public_numbers()
+        return {"kty": "RSA", "n": _b64_int(numbers.n), "e": _b64_int(numbers.e)}
+
+
+class ECKey(AsymmetricKey):
+    algorithm = "ES256"
+
+    def sign(self, signing_input: bytes) -> bytes:
+        # JWS wants the raw r || s signature, not DER
+        r, s = decode_dss_signature(self.private_key.sign(signing_input, ec.ECDSA(hashes.SHA256())))
+        return r.to_bytes(32, "big") + s.to_bytes(32, "big")
+
+    def _verify(self, signature: bytes, signing_input: bytes) -> None:
+        if len(signature) != 64:
+            raise InvalidSignature()
+        r, s = int.from_bytes(signature[:32], "big"), int.from_bytes(signature[32:], "big")
+        self.public_key.verify(encode_dss_signature(r, s), signing_input, ec.ECDSA(hashes.SHA256()))
+
+    def public_jwk(self) -> dict:
+        numbers = self.public_key.public_numbers()
+        return {
+            "kty": "EC", "crv": "P-256",
+            "x": b64url_encode(numbers.x.to_bytes(32, "big")).decode(),
+            "y": b64url_encode(numbers.y.to_bytes(32, "big")).decode(),
+        }
+
+
+class EdDSAKey(AsymmetricKey):
+    algorithm = "EdDSA"
+
+    def sign(self, signing_input: bytes) -> bytes:
+        return self.private_key.sign(signing_input)
+
+    def _verify(self, signature: bytes, signing_input: bytes) -> None:
+        self.public_key.verify(signature, signing_input)
+
+    def public_jwk(self) -> dict:
+        raw = self.public_key.public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+        return {"kty": "OKP", "crv": "Ed25519", "x": b64url_encode(raw).decode()}
+
+
+_KEY_CLASSES = {"RS256": RSAKey, "ES256": ECKey, "EdDSA": EdDSAKey}
+
+
+def load_key(kid: str, algorithm: str, data: bytes) -> SigningKey:
+    """Builds a key from a PEM file (private or public key) or, for HS*, a raw secret."""
+    if algorithm in HMAC_ALGORITHMS:
+        return HMACKey(kid, data.strip(), algorithm)
+    if algorithm not in _KEY_CLASSES:
+        raise ValueError(f"Unsupported algorithm: {algorithm}")
+    if b"PRIVATE KEY" in data:
+        return _KEY_CLASSES[algorithm](kid, private_key=serialization.load_pem_private_key(data, password=None))
+    return _KEY_CLASSES[algorithm](kid, public_key=serialization.load_pem_public_key(data))
+
+
+def generate_key(kid: str, algorithm: str) -> SigningKey:
+    if algorithm in HMAC_ALGORITHMS:
+        return HMACKey(kid, secrets.token_urlsafe(32).encode(), algorithm)
+    if algorithm == "RS256":
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    elif algorithm == "ES256":
+        private_key = ec.generate_private_key(ec.SECP256R1())
+    elif algorithm == "EdDSA":
+        private_key = ed25519.Ed25519PrivateKey.generate()
+    else:
+        raise ValueError(f"Unsupported algorithm: {algorithm}")
+    return _KEY_CLASSES[algorithm](kid, private_key=private_key)
+
+
+class KeyRing:
+    """
+    Signing and verification keys indexed by `kid`.
+
+    - Tokens are signed with the active key and carry its `kid` in the header
+    - A token is verified with the key named by its `kid`: one dict lookup,
+      whatever the number of keys in the ring
+    - Tokens without `kid` (issued before the ring existed) use `default_kid`
+    - `jwks()` publishes the public keys so other services can verify our
+      tokens offline, without the secret and without calling us
+    - `retires_at` maps the kid of each retiring key to the epoch time it
+      leaves the ring, `activates_at` is when a newer key takes over signing,
+      and `next_change` is the earliest of these times
+
+    The keys of a ring never change once built: rotation builds a new ring and
+    swaps it in (see `KeyRingReloader`), so requests never see a half-updated ring.
+
+    The only state a ring updates is a cache: header segments seen before are
+    mapped straight to their key, so the JOSE header of a token is parsed only
+    the first time it is seen. Only headers naming a key of the ring are added,
+    up to `MAX_KNOWN_HEADERS`.
+    """
+
+    MAX_KNOWN_HEADERS = 256
+
+    def __init__(self, keys: list[SigningKey], active_kid: str, default_kid: str | None = None,
+                 retires_at: dict[str, float] | None = None, activates_at: float | None = None):
+        self.keys = {key.kid: key for key in keys}
+        if active_kid not in self.keys or not self.keys[active_kid].can_sign:
+            raise ValueError(f"Active key {active_kid!r} is not a signing key of the ring")
+        self.active = self.keys[active_kid]
+        self.default_kid = default_kid
+        self._active_prefix = self.active.header_segment + b"."
+        self._headers = {key.header_segment: key for key in keys}
+        self._jwks, self.jwks_etag = self._build_jwks()
+        self.retires_at = retires_at or {}
+        self.activates_at = activates_at
+        changes = [*self.retires_at.values(), *([activates_at] if activates_at is not None else [])]
+        self.next_change = min(changes, default=None)
+
+    def encode(self, claims: dict) -> str:
+        signing_input = self._active_prefix + encode_claims(claims)
+        return (signing_input + b"." + b64url_encode(self.active.sign(signing_input))).decode()
+
+    def decode(self, token: str, leeway: int = 0) -> dict:
+        raw = token.encode() if isinstance(token, str) else token
+        try:
+            signing_input, signature_segment = raw.rsplit(b".", 1)
+            header_segment, claims_segment = signing_input.split(b".", 1)
+        except ValueError:
+            raise JWTError("Not enough segments")
+
+        key = self._headers.get(header_segment)
+        if key is None:
+            key = self._key_for_header(header_segment)
+        try:
+            signature = b64url_decode(signature_segment)
+        except ValueError:
+            raise JWTError("Invalid crypto padding")
+        if not key.verify(signature, signing_input):
+            raise BadSignatureError("Signature verification failed.")
+
+        claims = parse_claims(claims_segment)
+        validate_claims(claims, leeway)
+        return claims
+
+    def _key_for_header(self, header_segment: bytes) -> SigningKey:
+        try:
+            header = json.loads(b64url_decode(header_segment))
+        except ValueError:
+            raise JWTError("Invalid header string")
+        if not isinstance(header, dict):
+            raise JWTError("Invalid header string: must be a json object")
+        kid = header.get("kid", self.default_kid)
+        algorithm = header.get("alg")
+        if kid is None:
+            raise JWTError("Unknown key id (kid)")
+        # Forged headers can hold anything: a list `kid` would not even be hashable
+        if not isinstance(kid, str) or not isinstance(algorithm, str):
+            raise JWTError("Invalid header string: kid and alg must be strings")
+        key = self.keys.get(kid)
+        if key is None:
+            raise JWTError("Unknown key id (kid)")
+        if algorithm != key.algorithm:
+            raise JWTError("The specified alg value is not allowed")
+        # Remember valid headers only, so garbage cannot grow the map
+        if len(self._headers) < self.MAX_KNOWN_HEADERS:
+            self._headers[header_segment] = key
+        return key
+
+    def _build_jwks(self) -> tuple[dict, str]:
+        keys = []
+        for key in self.keys.values():
+            jwk = key.public_jwk()
+            if jwk is not None:
+                keys.append({**jwk, "kid": key.kid, "alg": key.algorithm, "use": "sig"})
+        document = {"keys": keys}
+        etag = '"' + hashlib.sha256(json.dumps(document, sort_keys=True).encode()).hexdigest()[:32] + '"'
+        return document, etag
+
+    def jwks(self) -> dict:
+        """JWK Set with the public keys of the ring (secret keys are never published)."""
+        return self._jwks
+
+
+def load_key_ring(directory: str | Path, active_kid: str | None = None, fallback: SigningKey | None = None,
+                  retire_after: float | None = None, activate_after: float = 0) -> KeyRing:
+    """
+    Loads every key file of a directory. File names are `<kid>.<alg>.pem`
+    (private or public key) or `<kid>.<alg>.key` (HMAC secret).
+
+    The active key is `active_kid`, or else the most recent signing key file
+    older than `activate_after` seconds: a new key is published (JWKS, verification)
+    first and signs only once every worker has had time to load it.
+    `fallback` (the SECRET_KEY key) is added to the ring and verifies tokens without `kid`;
+    it is also the active key when the directory has no signing key.
+
+    With `retire_after` (seconds), a signing key older than the active one is
+    retired that long after the next key took over: it verifies the tokens
+    it signed until they have all expired, then leaves the ring.
+    Public keys of other issuers and keys newer than the active one never retire.
+    """
+    directory = Path(directory)
+    files = [(path.stat().st_mtime, path) for path in directory.glob("*.*.*")] if directory.is_dir() else []
+    now = time.time()
+    keys, signing, signs_from = [], [], {}
+    if fallback is not None:
+        signing.append(fallback)
+        signs_from[fallback.kid] = float("-inf")
+    for mtime, path in sorted(files):
+        kid, algorithm, _ = path.name.rsplit(".", 2)
+        key = load_key(kid, algorithm, path.read_bytes())
+        keys.append(key)
+        if key.can_sign:
+            signing.append(key)
+            signs_from[kid] = mtime + activate_after
+    if fallback is not None:
+        keys.append(fallback)
+
+    activates_at = None
+    if active_kid is None and signing:
+        ready = [key.kid for key in signing if signs_from[key.kid] <= now]
+        # With nothing ready (first key of a new deployment), sign with it right away
+        active_kid = ready[-1] if ready else signing[0].kid
+        pending = [signs_from[key.kid] for key in signing if signs_from[key.kid] > now]
+        activates_at = min(pending, default=None)
+
+    retires_at = {}
+    kids = [key.kid for key in signing]
+    if retire_after is not None and active_kid in kids:
+        position = kids.index(active_kid)
+        for key, successor in zip(signing[:position], signing[1:position + 1]):
+            retires_at[key.kid] = signs_from[successor.kid] + retire_after
+            if retires_at[key.kid] <= now:
+                keys.remove(key)
+                del retires_at[key.kid]
+    default_kid = fallback.kid if fallback is not None and fallback in keys else None
+    return KeyRing(keys, active_kid, default_kid, retires_at, activates_at)
+
+
+def directory_snapshot(directory: str | Path) -> tuple:
+    """Names, sizes and modification times of the key files: changes when a key is added, edited or removed."""
+    directory = Path(directory)
+    if not directory.is_dir():
+        return ()
+    stats = ((path.name, path.stat()) for path in directory.glob("*.*.*"))
+    return tuple(sorted((name, stat.st_mtime_ns, stat.st_size) for name, stat in stats))
+
+
+class KeyRingReloader:
+    """
+    Keeps a key ring in sync with its key directory, without restarting workers.
+
+    A daemon thread calls `check()` every `interval` seconds. The ring is
+    rebuilt with `load()` when a key file was added, changed or removed, or
+    when a key is due to start signing or to retire (`KeyRing.next_change`),
+    and handed to `on_reload(ring)`, which swaps it in.
+    Verification keeps using the previous ring until the new one is complete.
+
+    A directory that cannot be loaded (half-written file, bad or mismatched
+    key, whatever the error) leaves the current ring in place and is logged;
+    the load is retried at the next check.
+    """
+
+    def __init__(self, directory: str | Path, load: Callable[[], KeyRing],
+                 on_reload: Callable[[KeyRing], None], interval: float = 60):
+        self.directory = Path(directory)
+        self.interval = interval
+        self._load = load
+        self._on_reload = on_reload
+        self._snapshot = directory_snapshot(self.directory)
+        self.ring = load()
+        self.reloads = 0
+        self.failures = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def check(self) -> bool:
+        """Reloads the ring if needed. Returns True if a new ring was swapped in."""
+        snapshot = directory_snapshot(self.directory)
+        change = self.ring.next_change
+        if snapshot == self._snapshot and (change is None or time.time() < change):
+            return False
+        try:
+            ring = self._load()
+        except Exception:
+            self.failures += 1
+            logger.exception("Loading keys from %s failed, keeping the current key ring", self.directory)
+            return False
+        self._snapshot = snapshot
+        self.ring = ring
+        self.reloads += 1
+        self._on_reload(ring)
+        return True
+
+    def start(self) -> None:
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name="key-ring-reloader", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            # The thread must outlive any error, a reload listener's included, or keys stop rotating
+            try:
+                self.check()
+            except Exception:
+                self.failures += 1
+                logger.exception("Key ring reload failed, retrying in %s s", self.interval)
+
+
+def write_key(directory: str | Path, key: SigningKey) -> Path:
+    """Saves a generated key in the format read by `load_key_ring`."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    if isinstance(key, HMACKey):
+        path = directory / f"{key.kid}.{key.algorithm}.key"
+        path.write_bytes(key.secret)
+    else:
+        path = directory / f"{key.kid}.{key.algorithm}.pem"
+        path.write_bytes(key.private_key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()))
+    os.chmod(path, 0o600)
+    return path
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (4, 5) or sys.argv[1] != "generate":
+        sys.exit("usage: python key_ring.py generate <directory> <RS256|ES256|EdDSA|HS256> [kid]")
+    _, _, target, alg = sys.argv[:4]
+    new_kid = sys.argv[4] if len(sys.argv) == 5 else f"{alg.lower()}-{time.strftime('%Y%m%d%H%M%S')}"
+    print(f"Wrote {write_key(target, generate_key(new_kid, alg))}")
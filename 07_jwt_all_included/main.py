@@ -1,10 +1,57 @@
-from fastapi import FastAPI, Depends, HTTPException, Body
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, HTTPException, Body, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fake_db import fake_users_db, hash_password
-from auth import create_access_token, create_refresh_token, verify_access_token
-from jose import jwt, JWTError
-import bcrypt
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from user_repository import AsyncUserRepository, create_user_repository
+from user_cache import USER_CACHE_SIZE, CachedUserRepository
+from auth import (create_access_token, create_refresh_token, verify_access_token, verify_access_token_async,
+                  introspect_tokens, compile_scopes, decode_claims, revoke_token, access_token_expiry,
+                  jwt_backend, token_cache, revocation_list, REFRESH_TOKEN_EXPIRE_DAYS)
+from password_hasher import password_hasher
+from rate_limiter import create_login_rate_limiter
+from refresh_rotation import RefreshRotations
+from refresh_store import AsyncRefreshTokenStore, create_refresh_token_store
+from token_guard import precheck
+from token_issuer import token_issuer
+from claims import TokenClaims
+from auth_middleware import AUTH_MIDDLEWARE, BearerAuthMiddleware
+from metrics import METRICS, metrics
+from jose import JWTError
+from dotenv import load_dotenv
+from datetime import timedelta
+import anyio.to_thread
+import functools
+import json
 import os
+import time
+
+load_dotenv()
+
+# 1 (default): routes that only verify a token run on the event loop; 0: in FastAPI's threadpool, as plain `def`
+ASYNC_ROUTES = os.getenv("ASYNC_ROUTES", "1") == "1"
+# Threads FastAPI runs plain `def` routes and dependencies in (Starlette's default is 40)
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "40"))
+# Most tokens accepted by one POST /introspect/batch
+INTROSPECT_BATCH_MAX = int(os.getenv("INTROSPECT_BATCH_MAX", "1000"))
+# Most tokens issued by one POST /admin/tokens
+TOKEN_ISSUE_BATCH_MAX = int(os.getenv("TOKEN_ISSUE_BATCH_MAX", "100000"))
+# Longest lifetime POST /admin/tokens may give, in minutes (default: that of a refresh token)
+TOKEN_ISSUE_MAX_MINUTES = int(os.getenv("TOKEN_ISSUE_MAX_MINUTES", str(REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60)))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    yield
+    # Stop the bcrypt worker processes with the server
+    password_hasher.shutdown()
+    token_issuer.shutdown()
+    login_rate_limiter.close()
+    async_refresh_store.close()
+    jwt_backend.close()
+    revocation_list.close()
+    async_users.close()
+
 
 #Review README.md and create .env 
 app = FastAPI(
@@ -50,13 +97,121 @@ For demo purposes, you can log in and test `/admin` with:
 ---
 
 ⚠️ **Important**  
-This project uses in-memory storage. For production, use persistent storage and extra security layers.
+By default this project uses in-memory storage. For production, use persistent storage (`USER_STORE`,
+`REFRESH_TOKEN_STORE`) and extra security layers.
 """,
     version="1.0.0",
+    lifespan=lifespan,
 )
 security = HTTPBearer()
 
-active_refresh_tokens = {}
+# Scopes required by each protected route.
+# With AUTH_MIDDLEWARE=1 they are enforced by BearerAuthMiddleware, before FastAPI
+# resolves any dependency; otherwise by the `require_scopes` dependency of each route.
+PROTECTED_ROUTES = {
+    "/protected": ["user"],
+    "/admin": ["admin"],
+    "/me": ["user"],
+    "/logout": [],
+    "/admin/scopes": ["admin"],
+    "/admin/tokens": ["admin"],
+    "/introspect/batch": ["introspect"],
+}
+if AUTH_MIDDLEWARE:
+    app.add_middleware(BearerAuthMiddleware, routes=PROTECTED_ROUTES)
+
+
+def cpu_route(func):
+    """
+    Runs a route that does no I/O on the event loop (with ASYNC_ROUTES=1).
+
+    A plain `def` route costs a hop to FastAPI's threadpool on every request,
+    and under load requests queue for its threads; these routes only read
+    the verified claims, so they are cheaper to run inline.
+    """
+    if not ASYNC_ROUTES:
+        return func
+
+    @functools.wraps(func)
+    async def route(*args, **kwargs):
+        return func(*args, **kwargs)
+    return route
+
+
+def require_scopes(*scopes: str):
+    """Dependency returning the verified access token claims of the request (a `TokenClaims`)."""
+    if AUTH_MIDDLEWARE:
+        @cpu_route
+        def claims_from_middleware(request: Request) -> TokenClaims:
+            # Set by BearerAuthMiddleware, which already checked the scopes
+            return request.state.claims
+        return claims_from_middleware
+
+    required = compile_scopes(scopes)
+
+    if ASYNC_ROUTES:
+        async def claims_from_header(credentials: HTTPAuthorizationCredentials = Depends(security)) -> TokenClaims:
+            return await verify_access_token_async(credentials.credentials, required)
+        return claims_from_header
+
+    def claims_from_header(credentials: HTTPAuthorizationCredentials = Depends(security)) -> TokenClaims:
+        return verify_access_token(credentials.credentials, required)
+    return claims_from_header
+
+# Active refresh token of each user (see refresh_store.py).
+# Use a sqlite:// or unix:// REFRESH_TOKEN_STORE when running several workers.
+refresh_store = create_refresh_token_store()
+# Same store for async endpoints: SQLite and socket calls run off the event loop
+async_refresh_store = AsyncRefreshTokenStore(refresh_store)
+# Parallel refreshes with the same token share one rotation (see refresh_rotation.py)
+refresh_rotations = RefreshRotations()
+
+# User accounts (see user_repository.py): fake_db.py seeds by default,
+# use a sqlite:// USER_STORE to keep them across restarts and share them between workers.
+users = create_user_repository()
+if users.blocking and USER_CACHE_SIZE > 0:
+    # login and refresh read the same users over and over: keep them in memory (see user_cache.py)
+    users = CachedUserRepository(users)
+# Same store for async endpoints: SQLite calls run off the event loop
+async_users = AsyncUserRepository(users)
+
+# Login/registration attempts per client IP and per username (see rate_limiter.py).
+# Use a sqlite:// LOGIN_RATE_LIMIT_STORE for limits shared by all workers.
+login_rate_limiter = create_login_rate_limiter()
+
+metrics.gauge("auth_token_cache_entries", "Verified access tokens in the cache", lambda: len(token_cache))
+metrics.gauge("auth_token_cache_hits", "Access token cache hits", lambda: token_cache.hits)
+metrics.gauge("auth_token_cache_misses", "Access token cache misses", lambda: token_cache.misses)
+metrics.gauge("auth_refresh_store_entries", "Active refresh tokens",
+              lambda: refresh_store.stats().get("entries", 0))
+metrics.gauge("auth_refresh_store_bytes", "Approximate memory held by the in-memory refresh token store",
+              lambda: refresh_store.stats().get("approx_bytes", 0))
+metrics.gauge("auth_refresh_rotations", "Refresh token rotations", lambda: refresh_rotations.rotations)
+metrics.gauge("auth_refresh_rotations_shared", "Refreshes answered with the result of a parallel rotation",
+              lambda: refresh_rotations.shared)
+metrics.gauge("auth_revoked_tokens", "Revoked tokens not expired yet", lambda: len(revocation_list))
+metrics.gauge("auth_revocation_list_bytes", "Approximate memory held by the revocation list and its Bloom filter",
+              lambda: revocation_list.stats()["approx_bytes"])
+metrics.gauge("auth_revocation_sync_failures", "Failed syncs with the shared revocation log",
+              lambda: revocation_list.sync_failures)
+if jwt_backend.name == "keyring":
+    metrics.gauge("auth_key_ring_reload_failures", "Failed reloads of JWT_KEYS_DIR (the previous ring stays in use)",
+                  lambda: jwt_backend.reloader.failures)
+if isinstance(users, CachedUserRepository):
+    metrics.gauge("auth_user_cache_hits", "User lookups answered from memory", lambda: users.hits)
+    metrics.gauge("auth_user_cache_misses", "User lookups not in memory", lambda: users.misses)
+    metrics.gauge("auth_user_cache_loads", "User lookups sent to the store (one per burst of misses)",
+                  lambda: users.loads)
+metrics.gauge("auth_password_hash_pending", "bcrypt calls running or queued", lambda: password_hasher.pending)
+
+
+def refresh_token_expires_at() -> float:
+    return time.time() + REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60
+
+
+def client_ip(request: Request) -> str | None:
+    # Behind a reverse proxy, run uvicorn with --proxy-headers so this is the real client
+    return request.client.host if request.client else None
 
 # User Registration
 @app.post("/register", tags=["Authentication"] ,
@@ -64,21 +219,25 @@ active_refresh_tokens = {}
     description="""
 Creates a new user account.
 
-- Passwords are hashed using **bcrypt**
+- Passwords are hashed using **bcrypt** (in a separate process pool)
 - Default role assigned: `user`
+- Attempts are rate limited per client IP (`429` when exceeded)
 
 ⚠️ This endpoint exists for educational purposes.
 """,)
-def register(username: str = Body(...,min_length=3), password: str = Body(...,min_length=4)):
-    if username in fake_users_db:
+async def register(request: Request, username: str = Body(...,min_length=3),
+                   password: str = Body(...,min_length=4)):
+    # Before any bcrypt work: a flood of registrations must not pin the hashing pool
+    await login_rate_limiter.check(client_ip(request), None)
+    # Cheap check first, so taken names do not cost a bcrypt hash
+    if await async_users.get(username) is not None:
         raise HTTPException(status_code=400, detail="Username already exists")
     
-    hashed_password = hash_password(password) 
-    fake_users_db[username] = {
-        "username": username,
-        "hashed_password": hashed_password,
-        "scopes": ["user"]
-    }
+    hashed_password = await password_hasher.hash(password)
+    # Another request may have registered the same name while we were hashing:
+    # the insert is atomic (unique username), so only one of them succeeds
+    if not await async_users.add(username, hashed_password, ["user"]):
+        raise HTTPException(status_code=400, detail="Username already exists")
     return {"message": f"User {username} registered successfully"}
 
 # Login
@@ -92,23 +251,34 @@ On success, returns:
 
 🕒 Access tokens are short-lived.
 🔁 Refresh tokens are rotated on each use.
+🚦 Attempts are rate limited per client IP and per username (`429` with `Retry-After`).
 """)
-def login(username: str, password: str):
-    user = fake_users_db.get(username)
+async def login(request: Request, username: str, password: str):
+    # Checked before the user lookup and the bcrypt check, so refused attempts cost no hashing
+    try:
+        await login_rate_limiter.check(client_ip(request), username)
+    except HTTPException:
+        metrics.count("auth_logins_total", status="429")
+        raise
+    user = await async_users.get(username)
     if not user:
+        metrics.count("auth_logins_total", status="400")
         raise HTTPException(status_code=400, detail="Invalid credentials")
     
-    if not bcrypt.checkpw(password.encode(), user["hashed_password"].encode()):
-        """We store only the bcrypt hash in the database,
-        never the plain password, and because the hash is saved as a string,
-        we need to call .encode() again when verifying so that bcrypt.checkpw receives bytes."""
+    # We store only the bcrypt hash in the database, never the plain password.
+    # The check runs in the password hashing process pool, so it does not
+    # hold a request thread for the ~250 ms bcrypt takes.
+    if not await password_hasher.check(password, user["hashed_password"]):
+        metrics.count("auth_logins_total", status="400")
         raise HTTPException(status_code=400, detail="Invalid credentials")
     
     access_token = create_access_token({"sub": username, "scopes": user["scopes"]})
     refresh_token = create_refresh_token({"sub": username})
     
-    active_refresh_tokens[username] = refresh_token
+    with metrics.time("store_write"):
+        await async_refresh_store.set(username, refresh_token, refresh_token_expires_at())
     
+    metrics.count("auth_logins_total", status="200")
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
 # ---------------------------
@@ -126,36 +296,68 @@ Issues a new access token and a new refresh token.
    - A new refresh token
 
 This mechanism protects against refresh token replay attacks.
+
+Parallel calls with the same refresh token (e.g. a mobile app waking up)
+share one rotation and all receive the same new pair. Once that rotation
+has finished the token is consumed: any later call with it gets a 400
+(unless `REFRESH_REUSE_SECONDS` is set, see the README).
 """, )
-def refresh(refresh_token: str):
+async def refresh(refresh_token: str):
     try:
-        payload = jwt.decode(
-            refresh_token, 
-            os.getenv("SECRET_KEY"), 
-            algorithms=[os.getenv("ALGORITHM")]
-        )
+        # Garbage is refused before any decoding work
+        if precheck(refresh_token) is not None:
+            raise HTTPException(status_code=400, detail="Invalid refresh token")
+        payload = decode_claims(refresh_token)
         if payload.get("type") != "refresh":
             raise HTTPException(status_code=400, detail="Invalid refresh token")
         
         username = payload.get("sub")
-        user = fake_users_db.get(username)
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        # We check that the refresh token is active
-        if active_refresh_tokens.get(username) != refresh_token:
-            raise HTTPException(status_code=400, detail="Refresh token invalidated")
-        
-        # We generate new tokens
-        new_access = create_access_token({"sub": username, "scopes": user["scopes"]})
-        new_refresh = create_refresh_token({"sub": username})
-        
-        # We rotate the refresh token
-        active_refresh_tokens[username] = new_refresh
-        
-        return {"access_token": new_access, "refresh_token": new_refresh, "token_type": "bearer"}
+
+        async def rotate() -> dict:
+            user = await async_users.get(username)
+            if not user:
+                raise HTTPException(status_code=404, detail="User not found")
+
+            # We generate new tokens
+            new_access = create_access_token({"sub": username, "scopes": user["scopes"]})
+            new_refresh = create_refresh_token({"sub": username})
+
+            # We rotate the refresh token.
+            # The swap only happens if the presented token is still the active one,
+            # so the same refresh token can never be used twice (even across workers).
+            with metrics.time("store_lookup"):
+                rotated = await async_refresh_store.rotate(username, refresh_token, new_refresh,
+                                                           refresh_token_expires_at())
+            if not rotated:
+                raise HTTPException(status_code=400, detail="Refresh token invalidated")
+            return {"access_token": new_access, "refresh_token": new_refresh, "token_type": "bearer"}
+
+        # Calls with this token while its rotation runs wait for it and get the same new pair
+        tokens = await refresh_rotations.rotate(username, refresh_token, rotate)
+        metrics.count("auth_refreshes_total", status="200")
+        return tokens
     except JWTError:
+        metrics.count("auth_refreshes_total", status="400")
         raise HTTPException(status_code=400, detail="Invalid refresh token")
+    except HTTPException as e:
+        metrics.count("auth_refreshes_total", status=str(e.status_code))
+        raise
+
+# ---------------------------
+# Logout
+@app.post("/logout", tags=["Authentication"],
+    summary="Revoke the current tokens",
+    description="""
+Ends the session of the access token sent in the `Authorization` header:
+
+- The access token is revoked (by its `jti`) until it expires
+- The user's refresh token is removed, so it can no longer be rotated
+""")
+async def logout(claims: TokenClaims = Depends(require_scopes())):
+    revoke_token(claims)
+    await async_refresh_store.delete(claims.sub)
+    refresh_rotations.forget(claims.sub)
+    return {"message": "Logged out"}
 
 # ---------------------------
 # Protected endpoints 
@@ -167,9 +369,9 @@ with the `user` scope.
 
 Used to demonstrate basic JWT authorization.
 """)
-def protected(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    payload = verify_access_token(credentials.credentials, ["user"])
-    return {"message": f"Hello {payload['sub']}, you have user access!"}
+@cpu_route
+def protected(claims: TokenClaims = Depends(require_scopes("user"))):
+    return {"message": f"Hello {claims.sub}, you have user access!"}
 
 @app.get("/admin" , tags=["Protected"] , 
     summary="Admin-only endpoint",
@@ -180,11 +382,104 @@ Protected endpoint that requires:
 
 Demonstrates role-based access control using JWT scopes.
 """,)
-def admin(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    payload = verify_access_token(credentials.credentials, ["admin"])
-    if "admin" not in payload.get("scopes", []):
-        raise HTTPException(status_code=403, detail="Not enough permissions")
-    return {"message": f"Welcome admin {payload['sub']}"}
+@cpu_route
+def admin(claims: TokenClaims = Depends(require_scopes("admin"))):
+    return {"message": f"Welcome admin {claims.sub}"}
+
+@app.put("/admin/scopes", tags=["Protected"],
+    summary="Change the scopes of a user",
+    description="""
+Replaces the scopes (roles) of a user. Requires the `admin` scope.
+
+The user's record is dropped from the user cache, so their next login or
+refresh issues tokens with the new scopes. Access tokens already issued
+keep their scopes until they expire.
+""")
+async def set_user_scopes(username: str = Body(...), scopes: list[str] = Body(...),
+                          claims: TokenClaims = Depends(require_scopes("admin"))):
+    try:
+        compile_scopes(scopes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not await async_users.set_scopes(username, scopes):
+        raise HTTPException(status_code=404, detail="User not found")
+    return {"username": username, "scopes": scopes}
+
+# ---------------------------
+# Batch introspection (API gateways)
+@app.post("/introspect/batch", tags=["Tokens"],
+    summary="Verify many access tokens at once",
+    description=f"""
+Verifies up to {INTROSPECT_BATCH_MAX} access tokens in one call, for API gateways.
+Requires the `introspect` scope (grant it with `PUT /admin/scopes`).
+
+Returns `{{"results": [...]}}` with one entry per token, in order:
+- `{{"active": true, "claims": {{...}}, "scopes": [...]}}`
+- `{{"active": false, "error": "expired"}}` (`invalid`, `malformed`, `too_large`, `expired`,
+  `revoked`, `wrong_type`, or `forbidden` when `scopes` is given and not granted)
+
+Repeated tokens are verified once. The response is streamed as results are ready.
+""")
+@cpu_route
+def introspect_batch(tokens: list[str] = Body(..., max_length=INTROSPECT_BATCH_MAX),
+                     scopes: list[str] = Body([]),
+                     claims: TokenClaims = Depends(require_scopes("introspect"))):
+    try:
+        required = compile_scopes(scopes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    def results():
+        # Verified in chunks: each chunk is one step of the threadpool iteration
+        yield '{"results":['
+        chunk = []
+        encoded: dict[int, str] = {}  # repeated tokens share their result object: serialize it once
+        for index, result in enumerate(introspect_tokens(tokens, required)):
+            text = encoded.get(id(result))
+            if text is None:
+                text = encoded[id(result)] = json.dumps(result, separators=(",", ":"))
+            chunk.append("," + text if index else text)
+            if len(chunk) == 100:
+                yield "".join(chunk)
+                chunk = []
+        yield "".join(chunk) + "]}"
+    return StreamingResponse(results(), media_type="application/json")
+
+@app.post("/admin/tokens", tags=["Protected"],
+    summary="Issue access tokens in bulk",
+    description=f"""
+Issues one access token per username, up to {TOKEN_ISSUE_BATCH_MAX} per call, for service accounts
+or to seed a load test. Requires the `admin` scope.
+
+- Every token gets the same `scopes` and one shared expiry (`expires_minutes`, at most {TOKEN_ISSUE_MAX_MINUTES})
+- Usernames are not looked up: tokens are issued for them as given
+- Large batches are signed by a pool of processes (`TOKEN_ISSUE_WORKERS`)
+
+The response is streamed as JSON lines: `{{"username": ..., "access_token": ..., "expires_at": ...}}`.
+""")
+@cpu_route
+def issue_tokens(usernames: list[str] = Body(..., max_length=TOKEN_ISSUE_BATCH_MAX),
+                 scopes: list[str] = Body(["user"]),
+                 expires_minutes: int | None = Body(None, gt=0, le=TOKEN_ISSUE_MAX_MINUTES),
+                 claims: TokenClaims = Depends(require_scopes("admin"))):
+    try:
+        compile_scopes(scopes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    expires_at = access_token_expiry(timedelta(minutes=expires_minutes) if expires_minutes else None)
+
+    def lines():
+        tokens = token_issuer.issue([{"sub": username, "scopes": scopes} for username in usernames], expires_at)
+        # The expiry is the same for the whole batch: serialize it once
+        suffix = f',"expires_at":{expires_at}}}\n'
+        chunk = []
+        for username, token in zip(usernames, tokens):
+            chunk.append(f'{{"username":{json.dumps(username)},"access_token":"{token}"{suffix}')
+            if len(chunk) == 1000:
+                yield "".join(chunk)
+                chunk = []
+        yield "".join(chunk)
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
 # User information (/me)
 @app.get("/me" , tags=["User"] , 
@@ -198,17 +493,48 @@ Returns information extracted from the access token:
 
 Useful for debugging and learning JWT payloads.
 """,)
-def me(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    payload = verify_access_token(credentials.credentials, ["user"])
+@cpu_route
+def me(claims: TokenClaims = Depends(require_scopes("user"))):
     return {
-        "username": payload.get("sub"),
-        "scopes": payload.get("scopes", []),
-        "token_type": payload.get("type"),
-        "expires": payload.get("exp")
+        "username": claims.sub,
+        "scopes": claims.scopes,
+        "token_type": claims.type,
+        "expires": claims.exp
     }
 
+# ---------------------------
+# Public keys (only with JWT_BACKEND=keyring)
+if jwt_backend.name == "keyring":
+    @app.get("/.well-known/jwks.json", tags=["Keys"],
+        summary="Public keys used to sign tokens (JWKS)",
+        description="""
+Returns the public keys of the key ring as a JWK Set.
+
+Other services can verify our tokens offline: they pick the key with the
+token's `kid` and never need our secret. The response carries an `ETag`,
+so clients can poll with `If-None-Match` and get a `304` until keys change.
+It may be cached for `JWKS_MAX_AGE` seconds: a new key is listed here at
+least that long before it signs its first token.
+""")
+    @cpu_route
+    def jwks(request: Request):
+        # Read on every request: the ring is replaced when keys rotate
+        key_ring = jwt_backend.key_ring
+        headers = {"ETag": key_ring.jwks_etag, "Cache-Control": f"public, max-age={jwt_backend.jwks_max_age}"}
+        if request.headers.get("if-none-match") == key_ring.jwks_etag:
+            return Response(status_code=304, headers=headers)
+        return JSONResponse(key_ring.jwks(), headers=headers)
+
+# ---------------------------
+# Prometheus metrics (only with METRICS=1)
+if METRICS:
+    @app.get("/metrics", include_in_schema=False, response_class=PlainTextResponse)
+    def prometheus_metrics():
+        return metrics.render()
+
 # ---------------------------
 # root route (/)
 @app.get("/")
+@cpu_route
 def root():
     return {"message": "Welcome to the JWT demo API. Go to /docs for API documentation."}
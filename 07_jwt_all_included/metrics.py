@@ -0,0 +1,163 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 1: record auth timings/outcomes and serve them on /metrics
+METRICS = os.getenv("METRICS", "0") == "1"
+
+# Seconds. Auth stages range from microseconds (cache hits) to ~300 ms (bcrypt)
+DEFAULT_BUCKETS = (
+    0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+
+
+class Histogram:
+    """Cumulative histogram in the Prometheus format (fixed buckets, sum and count)."""
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def samples(self) -> tuple[list[tuple[str, int]], float, int]:
+        """Returns ([(le, cumulative count)], sum, count)."""
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        cumulative, buckets = 0, []
+        for le, count in zip([*map(repr, self.buckets), "+Inf"], counts):
+            cumulative += count
+            buckets.append((le, cumulative))
+        return buckets, total, cumulative
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NO_TIMER = _NoTimer()
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+class Metrics:
+    """
+    In-process registry of auth metrics, rendered in the Prometheus text format.
+
+    - `time(stage)`: context manager adding the duration of a block to
+      the `auth_stage_seconds{stage=...}` histogram
+    - `count(name, **labels)`: increments a counter
+    - `gauge(name, help, func)`: value read from `func()` at scrape time
+
+    When disabled, `time` returns a shared no-op context manager and `count`
+    returns immediately, so instrumented code pays a few hundred nanoseconds.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._stages: dict[str, Histogram] = {}
+        self._counters: dict[str, defaultdict] = {}
+        self._help: dict[str, str] = {}
+        self._gauges: dict[str, tuple[str, object]] = {}
+        self._lock = threading.Lock()
+
+    def time(self, stage: str):
+        if not self.enabled:
+            return _NO_TIMER
+        histogram = self._stages.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._stages.setdefault(stage, Histogram())
+        return _Timer(histogram)
+
+    def count(self, name: str, **labels) -> None:
+        if not self.enabled:
+            return
+        key = tuple(labels.items())
+        with self._lock:
+            counter = self._counters.get(name)
+            if counter is None:
+                counter = self._counters[name] = defaultdict(int)
+            counter[key] += 1
+
+    def describe(self, name: str, help: str) -> None:
+        """Sets the HELP text of a counter."""
+        self._help[name] = help
+
+    def gauge(self, name: str, help: str, func) -> None:
+        self._gauges[name] = (help, func)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+
+    def render(self) -> str:
+        lines = [
+            "# HELP auth_stage_seconds Time spent in each authentication stage",
+            "# TYPE auth_stage_seconds histogram",
+        ]
+        for stage, histogram in sorted(self._stages.items()):
+            buckets, total, count = histogram.samples()
+            for le, cumulative in buckets:
+                lines.append(f'auth_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'auth_stage_seconds_sum{{stage="{stage}"}} {total}')
+            lines.append(f'auth_stage_seconds_count{{stage="{stage}"}} {count}')
+
+        with self._lock:
+            counters = {name: dict(values) for name, values in self._counters.items()}
+        for name, values in sorted(counters.items()):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} counter")
+            for key, value in sorted(values.items()):
+                lines.append(f"{name}{_labels(dict(key))} {value}")
+
+        for name, (help, func) in sorted(self._gauges.items()):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {func()}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics(enabled=METRICS)
+metrics.describe("auth_token_checks_total", "Access token checks by HTTP status and reason")
+metrics.describe("auth_logins_total", "Login attempts by HTTP status")
+metrics.describe("auth_refreshes_total", "Refresh attempts by HTTP status")
+metrics.describe("auth_password_hash_rejected_total", "bcrypt calls refused with a 503 (queue full)")
@@ -0,0 +1,110 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from starlette.concurrency import run_in_threadpool
+
+from metrics import metrics
+
+load_dotenv()
+
+PASSWORD_HASH_POOL = os.getenv("PASSWORD_HASH_POOL", "1") != "0"
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+PASSWORD_HASH_QUEUE_DEPTH = int(os.getenv("PASSWORD_HASH_QUEUE_DEPTH", "64"))
+
+
+def hash_password(password: str) -> str:
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+
+
+def check_password(password: str, hashed_password: str) -> bool:
+    # The hash is stored as a string, bcrypt.checkpw needs bytes
+    return bcrypt.checkpw(password.encode(), hashed_password.encode())
+
+
+class PasswordHasher:
+    """
+    Async password hashing service.
+
+    bcrypt is deliberately slow (~200-300 ms of CPU per call).
+    Running it inline in an endpoint blocks one of the threads that
+    FastAPI uses for every other request, so a burst of logins
+    slows down all authenticated traffic.
+
+    This service:
+    - Runs bcrypt in a separate process pool (`workers` processes)
+    - Allows at most `queue_depth` calls waiting for a free worker
+    - Answers 503 when the queue is full (backpressure) instead of
+      letting requests pile up
+
+    With `use_pool=False` it falls back to the threadpool (previous behavior).
+    """
+
+    def __init__(self, workers: int = 1, queue_depth: int = 64, use_pool: bool = True):
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.use_pool = use_pool
+        self._executor: ProcessPoolExecutor | None = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Created on first use so importing the app never forks processes
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def _acquire(self) -> None:
+        with self._lock:
+            if self._pending >= self.workers + self.queue_depth:
+                metrics.count("auth_password_hash_rejected_total")
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Server busy, try again later",
+                    headers={"Retry-After": "1"},
+                )
+            self._pending += 1
+
+    def _release(self) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    async def _run(self, func, *args):
+        self._acquire()
+        try:
+            if not self.use_pool:
+                return await run_in_threadpool(func, *args)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self._release()
+
+    async def hash(self, password: str) -> str:
+        with metrics.time("password_hash"):
+            return await self._run(hash_password, password)
+
+    async def check(self, password: str, hashed_password: str) -> bool:
+        with metrics.time("password_check"):
+            return await self._run(check_password, password, hashed_password)
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+password_hasher = PasswordHasher(
+    workers=PASSWORD_HASH_WORKERS,
+    queue_depth=PASSWORD_HASH_QUEUE_DEPTH,
+    use_pool=PASSWORD_HASH_POOL,
+)
@@ -0,0 +1,243 @@
+import asyncio
+import math
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+
+from metrics import metrics
+
+load_dotenv()
+
+# Attempts allowed per client IP and per username, as "<attempts>/<seconds>" ("0" disables the limit)
+LOGIN_RATE_PER_IP = os.getenv("LOGIN_RATE_PER_IP", "30/60")
+LOGIN_RATE_PER_USER = os.getenv("LOGIN_RATE_PER_USER", "10/60")
+# Keys (IPs + usernames) tracked in memory; the least recently seen are forgotten beyond this
+LOGIN_RATE_LIMIT_KEYS = int(os.getenv("LOGIN_RATE_LIMIT_KEYS", "100000"))
+# memory:// (default, per worker)  |  sqlite:///path/to/ratelimit.db (shared by the workers of the host)
+LOGIN_RATE_LIMIT_STORE = os.getenv("LOGIN_RATE_LIMIT_STORE", "memory://")
+
+
+def parse_rate(text: str) -> tuple[int, float] | None:
+    """Parses "<attempts>/<seconds>" (e.g. "10/60"). Returns None for "0" (no limit)."""
+    if text.strip() == "0":
+        return None
+    attempts, _, seconds = text.partition("/")
+    attempts, seconds = int(attempts), float(seconds or 1)
+    if attempts <= 0 or seconds <= 0:
+        raise ValueError(f"Invalid rate: {text}")
+    return attempts, seconds
+
+
+class RateLimiter(ABC):
+    """
+    Token buckets, one per key: `capacity` attempts at once, refilled at
+    `capacity` per `period` seconds.
+
+    A bucket is two numbers (tokens left, time of the last attempt), so a
+    key costs O(1) memory whatever the number of attempts. A full bucket
+    carries no information, so keys idle for `period` seconds can be dropped.
+    """
+
+    # True if calls do I/O and should not run on the event loop (see LoginRateLimiter)
+    blocking = False
+
+    def __init__(self, capacity: int, period: float, clock=time.time):
+        self.capacity = capacity
+        self.period = period
+        self.refill = capacity / period  # tokens per second
+        self._clock = clock
+
+    @abstractmethod
+    def acquire(self, key: str) -> float:
+        """Takes one token. Returns 0 if allowed, else the seconds until the next token."""
+
+    def close(self) -> None:
+        pass
+
+
+class InMemoryRateLimiter(RateLimiter):
+    """
+    Buckets in an LRU dict, private to one worker.
+
+    At most `max_keys` buckets are kept: past that, the least recently seen
+    key is forgotten (and gets a full bucket if it comes back), so a flood of
+    random usernames or spoofed IPs cannot grow memory without bound.
+    """
+
+    def __init__(self, capacity: int, period: float, max_keys: int = LOGIN_RATE_LIMIT_KEYS, clock=time.time):
+        super().__init__(capacity, period, clock)
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key):
+        now = self._clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = self.capacity
+                if len(self._buckets) >= self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                tokens = min(self.capacity, bucket[0] + (now - bucket[1]) * self.refill)
+                self._buckets.move_to_end(key)
+            if tokens < 1:
+                # Nothing taken: the stored bucket still gives the same refill later
+                return (1 - tokens) / self.refill
+            self._buckets[key] = (tokens - 1, now)
+            return 0.0
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class SQLiteRateLimiter(RateLimiter):
+    """
+    Buckets in a SQLite table shared by every worker on the host, so the
+    limit holds for the whole server instead of per process.
+
+    - Each attempt is one UPSERT computing the refill and the decrement in
+      SQL, so concurrent workers cannot both take the last token
+    - Buckets idle for `period` seconds (full again) are deleted at most
+      once every `purge_interval` seconds, which bounds the table by the
+      keys seen in the last period
+    - Several limiters can share a database: keys are prefixed by `scope`
+    """
+
+    blocking = True
+
+    def __init__(self, path: str, capacity: int, period: float, scope: str = "",
+                 purge_interval: float = 60.0, clock=time.time):
+        super().__init__(capacity, period, clock)
+        self.path = path
+        self.scope = scope
+        self.purge_interval = purge_interval
+        self._next_purge = 0.0
+        self._conn = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits ("
+            " key TEXT PRIMARY KEY,"
+            " tokens REAL NOT NULL,"
+            " updated REAL NOT NULL) WITHOUT ROWID"
+        )
+        self._lock = threading.Lock()
+
+    def acquire(self, key):
+        key = f"{self.scope}:{key}"
+        now = self._clock()
+        with self._lock:
+            if now >= self._next_purge:
+                self._next_purge = now + self.purge_interval
+                self._conn.execute("DELETE FROM rate_limits WHERE updated < ?", (now - self.period,))
+            row = self._conn.execute(
+                "INSERT INTO rate_limits (key, tokens, updated) VALUES (:key, :capacity - 1, :now)"
+                " ON CONFLICT (key) DO UPDATE"
+                " SET tokens = MIN(:capacity, tokens + (:now - updated) * :refill) - 1, updated = :now"
+                " WHERE MIN(:capacity, tokens + (:now - updated) * :refill) >= 1"
+                " RETURNING tokens",
+                {"key": key, "capacity": self.capacity, "now": now, "refill": self.refill},
+            ).fetchone()
+            if row is not None:
+                return 0.0
+            (tokens,) = self._conn.execute(
+                "SELECT MIN(?, tokens + (? - updated) * ?) FROM rate_limits WHERE key = ?",
+                (self.capacity, now, self.refill, key),
+            ).fetchone()
+        return (1 - tokens) / self.refill
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class LoginRateLimiter:
+    """
+    Limits login and registration attempts per client IP and per username.
+
+    Called before the user lookup and before any bcrypt work: an attempt
+    over the limit gets a `429` with `Retry-After` for the cost of a dict
+    lookup, so a flood of bad credentials cannot take the CPU budget of
+    bcrypt away from real users.
+
+    - Per IP: one client trying many accounts (credential stuffing)
+    - Per username: many clients guessing one account's password. This also
+      means a flood can lock a user out of login for a while (not out of
+      their current session: refresh is not limited)
+
+    Every attempt counts, successful or not. With a blocking (SQLite)
+    limiter, checks run in a small dedicated thread pool.
+    """
+
+    def __init__(self, by_ip: RateLimiter | None, by_user: RateLimiter | None, max_workers: int = 4):
+        self.by_ip = by_ip
+        self.by_user = by_user
+        self.limited = 0
+        self._executor = None
+        if any(limiter is not None and limiter.blocking for limiter in (by_ip, by_user)):
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rate-limit")
+
+    def retry_after(self, ip: str | None, username: str | None) -> tuple[float, str | None]:
+        """Takes a token from the IP and user buckets. Returns (seconds to wait, scope that refused)."""
+        if self.by_ip is not None and ip is not None:
+            wait = self.by_ip.acquire(ip)
+            if wait:
+                return wait, "ip"
+        if self.by_user is not None and username is not None:
+            wait = self.by_user.acquire(username)
+            if wait:
+                return wait, "user"
+        return 0.0, None
+
+    async def check(self, ip: str | None, username: str | None) -> None:
+        """Raises 429 if the client or the username is over its limit."""
+        if self._executor is None:
+            wait, scope = self.retry_after(ip, username)
+        else:
+            wait, scope = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self.retry_after, ip, username)
+        if wait:
+            self.limited += 1
+            metrics.count("auth_rate_limited_total", scope=scope)
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many attempts, try again later",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        for limiter in (self.by_ip, self.by_user):
+            if limiter is not None:
+                limiter.close()
+
+
+def create_login_rate_limiter(url: str = LOGIN_RATE_LIMIT_STORE, per_ip: str = LOGIN_RATE_PER_IP,
+                              per_user: str = LOGIN_RATE_PER_USER) -> LoginRateLimiter:
+    """
+    Builds the login limiter from a URL:
+    - `memory://` (default, limits apply per worker)
+    - `sqlite:///path/to/ratelimit.db` (limits apply to all workers of the host)
+    """
+    scheme, _, path = url.partition("://")
+    if scheme not in ("memory", "sqlite"):
+        raise ValueError(f"Unknown LOGIN_RATE_LIMIT_STORE: {url}")
+
+    def limiter(rate: str, scope: str) -> RateLimiter | None:
+        parsed = parse_rate(rate)
+        if parsed is None:
+            return None
+        if scheme == "sqlite":
+            return SQLiteRateLimiter(path, *parsed, scope=scope)
+        return InMemoryRateLimiter(*parsed)
+
+    return LoginRateLimiter(limiter(per_ip, "ip"), limiter(per_user, "user"))
@@ -0,0 +1,102 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections.abc import Awaitable, Callable
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Locks shared by all users; users on different stripes never wait for each other
+REFRESH_LOCK_STRIPES = int(os.getenv("REFRESH_LOCK_STRIPES", "256"))
+# Seconds a finished rotation is still handed out to calls with the token it consumed (default 0: never).
+# Opt-in: during that window, anyone replaying the old token gets the new pair (see README)
+REFRESH_REUSE_SECONDS = float(os.getenv("REFRESH_REUSE_SECONDS", "0"))
+
+
+class RefreshRotations:
+    """
+    Single-flight refresh token rotation, per user.
+
+    A mobile client often fires several refreshes with the same token at
+    once. The store's compare-and-swap lets only one of them rotate, so the
+    others got a 400 and the client was logged out. Here:
+
+    - The first call with a token starts its rotation as a task, registered
+      under the hash of the token until it finishes. Calls with the same
+      token while it runs await that task and get its result (the new pair,
+      or the same error): one rotation per token, shared by every parallel caller
+    - Once the rotation has finished the token is consumed: a later call
+      rotates again and gets the store's 400 (replay). With `reuse_seconds`
+      the result is handed out for that long after the rotation too, which
+      also lets a replay of the old token get the new pair: opt-in only
+    - Rotations of a user run one at a time, under one of `stripes` asyncio
+      locks picked by username: memory stays bounded whatever the number of
+      users, and users on other stripes are never blocked
+    - A caller that disconnects does not cancel the rotation the others wait for
+
+    The store's compare-and-swap still guarantees that a token is rotated
+    only once across workers; single-flight itself is per worker.
+    """
+
+    def __init__(self, stripes: int = REFRESH_LOCK_STRIPES, reuse_seconds: float = REFRESH_REUSE_SECONDS,
+                 clock=time.monotonic):
+        self.reuse_seconds = reuse_seconds
+        self._clock = clock
+        self._locks = [asyncio.Lock() for _ in range(stripes)]
+        self._in_flight: dict[bytes, asyncio.Task] = {}
+        # Per stripe, with reuse_seconds only: token hash -> (expires_at, username, result)
+        self._recent: list[dict[bytes, tuple[float, str, dict]]] = [{} for _ in range(stripes)]
+        self.rotations = 0
+        self.shared = 0
+
+    async def rotate(self, username: str, token: str, rotate: Callable[[], Awaitable[dict]]) -> dict:
+        """Runs `rotate()` for `token`, or returns the result of the rotation already in flight for it."""
+        key = hashlib.sha256(token.encode()).digest()
+        stripe = self._stripe(username)
+        recent = self._recent[stripe].get(key)
+        if recent is not None and recent[0] > self._clock():
+            self.shared += 1
+            return recent[2]
+
+        task = self._in_flight.get(key)
+        if task is None or task.done():
+            task = asyncio.ensure_future(self._run(stripe, username, key, rotate))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    async def _run(self, stripe: int, username: str, key: bytes, rotate: Callable[[], Awaitable[dict]]) -> dict:
+        async with self._locks[stripe]:
+            result = await rotate()
+        self.rotations += 1
+        if self.reuse_seconds > 0:
+            recent = self._recent[stripe]
+            now = self._clock()
+            # Stripes hold the rotations of the last few seconds only: drop the stale ones here
+            for stale in [k for k, (expires_at, _, _) in recent.items() if expires_at <= now]:
+                del recent[stale]
+            recent[key] = (now + self.reuse_seconds, username, result)
+        return result
+
+    def _finished(self, key: bytes, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            # Retrieved here so that an error nobody awaited any more is not reported as lost
+            task.exception()
+
+    def forget(self, username: str) -> None:
+        """Drops the finished rotations kept for `username` (logout), with `reuse_seconds` only."""
+        recent = self._recent[self._stripe(username)]
+        for key in [k for k, (_, owner, _) in recent.items() if owner == username]:
+            del recent[key]
+
+    def _stripe(self, username: str) -> int:
+        return hash(username) % len(self._locks)
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
@@ -0,0 +1,406 @@
+import asyncio
+import json
+import os
+import queue
+import socket
+import socketserver
+import sqlite3
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+from expiry import ExpiryIndex
+
+load_dotenv()
+
+# memory://  |  sqlite:///path/to/tokens.db  |  unix:///path/to/store.sock
+REFRESH_TOKEN_STORE = os.getenv("REFRESH_TOKEN_STORE", "memory://")
+# SQLite connections of the store, and threads that run store calls for async endpoints
+REFRESH_TOKEN_STORE_POOL_SIZE = int(os.getenv("REFRESH_TOKEN_STORE_POOL_SIZE", "8"))
+
+
+class RefreshTokenStore(ABC):
+    """
+    Server-side record of the active refresh token of each user.
+
+    Only one refresh token per user is active at a time.
+    `rotate` is an atomic compare-and-swap: it replaces the token only if
+    the caller presents the one currently stored, so a refresh token can
+    be used exactly once even when several workers share the store.
+    """
+
+    # True if calls do I/O and should not run on the event loop (see AsyncRefreshTokenStore)
+    blocking = False
+
+    @abstractmethod
+    def get(self, username: str) -> str | None:
+        """Returns the active refresh token of the user, if any."""
+
+    @abstractmethod
+    def set(self, username: str, token: str, expires_at: float) -> None:
+        """Stores `token` as the active refresh token (login)."""
+
+    @abstractmethod
+    def rotate(self, username: str, old_token: str, new_token: str, expires_at: float) -> bool:
+        """Replaces `old_token` with `new_token`. Returns False if `old_token` is not the active one."""
+
+    @abstractmethod
+    def delete(self, username: str) -> None:
+        """Removes the active refresh token of the user (logout)."""
+
+    def stats(self) -> dict:
+        """Size gauges of the store (entries, approximate memory)."""
+        return {}
+
+    def close(self) -> None:
+        pass
+
+
+# Approximate memory of one entry besides its strings: dict slot + (token, expires_at) tuple + float
+_ENTRY_OVERHEAD = 100 + sys.getsizeof((None, None)) + sys.getsizeof(0.0)
+
+
+class InMemoryRefreshTokenStore(RefreshTokenStore):
+    """
+    Plain dict protected by a lock.
+    Fast, but private to one process: use it only with a single worker.
+
+    Entries are dropped when their refresh token expires, using a heap
+    ordered by expiry (no scan of the whole dict). Eviction runs on every
+    write, so memory tracks the number of *live* sessions only.
+    """
+
+    def __init__(self, clock=time.time):
+        self._tokens: dict[str, tuple[str, float]] = {}
+        self._expiry = ExpiryIndex()
+        self._clock = clock
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _entry_size(username: str, token: str) -> int:
+        return sys.getsizeof(username) + sys.getsizeof(token) + _ENTRY_OVERHEAD
+
+    def _put(self, username: str, token: str, expires_at: float) -> None:
+        old = self._tokens.get(username)
+        if old is not None:
+            self._bytes -= self._entry_size(username, old[0])
+        self._tokens[username] = (token, expires_at)
+        self._bytes += self._entry_size(username, token)
+        self._expiry.add(username, expires_at)
+
+    def _remove(self, username: str) -> None:
+        entry = self._tokens.pop(username, None)
+        if entry is not None:
+            self._bytes -= self._entry_size(username, entry[0])
+
+    def _evict_expired(self) -> None:
+        for username, expires_at in self._expiry.pop_expired(self._clock()):
+            entry = self._tokens.get(username)
+            # Skip heap entries left behind by a rotation (the user has a newer token)
+            if entry is not None and entry[1] <= expires_at:
+                self._remove(username)
+        # Rotations leave one stale heap entry each: rebuild when they dominate
+        if len(self._expiry) > 2 * len(self._tokens) + 1024:
+            self._expiry.compact((username, entry[1]) for username, entry in self._tokens.items())
+
+    def get(self, username):
+        entry = self._tokens.get(username)
+        if entry is None or entry[1] <= self._clock():
+            return None
+        return entry[0]
+
+    def set(self, username, token, expires_at):
+        with self._lock:
+            self._evict_expired()
+            self._put(username, token, expires_at)
+
+    def rotate(self, username, old_token, new_token, expires_at):
+        with self._lock:
+            self._evict_expired()
+            entry = self._tokens.get(username)
+            if entry is None or entry[0] != old_token:
+                return False
+            self._put(username, new_token, expires_at)
+            return True
+
+    def delete(self, username):
+        with self._lock:
+            self._remove(username)
+
+    def stats(self):
+        with self._lock:
+            self._evict_expired()
+            return {
+                "entries": len(self._tokens),
+                "expiry_index": len(self._expiry),
+                "approx_bytes": self._bytes + sys.getsizeof(self._tokens) + self._expiry.approx_bytes(),
+            }
+
+    def __len__(self):
+        return len(self._tokens)
+
+
+class SQLiteRefreshTokenStore(RefreshTokenStore):
+    """
+    SQLite database shared by every worker on the host.
+
+    - WAL mode: readers never block the writer
+    - A small pool of connections reused across requests
+    - Unique index on `username`
+    - Rotation is a single conditional UPDATE, so it is atomic across processes
+    - Expired rows are deleted through an index on `expires_at`,
+      at most once every `purge_interval` seconds
+    """
+
+    blocking = True
+
+    def __init__(self, path: str, pool_size: int = REFRESH_TOKEN_STORE_POOL_SIZE, timeout: float = 5.0,
+                 purge_interval: float = 60.0, clock=time.time):
+        self.path = path
+        self.purge_interval = purge_interval
+        self._clock = clock
+        self._next_purge = 0.0
+        self._pool: queue.Queue[sqlite3.Connection] = queue.Queue()
+        for _ in range(pool_size):
+            self._pool.put(self._connect(timeout))
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS refresh_tokens ("
+                " username TEXT NOT NULL,"
+                " token TEXT NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS idx_refresh_tokens_username"
+                " ON refresh_tokens (username)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_refresh_tokens_expires_at"
+                " ON refresh_tokens (expires_at)"
+            )
+
+    def _connect(self, timeout: float) -> sqlite3.Connection:
+        # isolation_level=None: autocommit, every statement is its own transaction
+        conn = sqlite3.connect(self.path, timeout=timeout, isolation_level=None,
+                               check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def purge_expired(self) -> int:
+        """Deletes every expired row. Returns how many were removed."""
+        with self._connection() as conn:
+            cursor = conn.execute(
+                "DELETE FROM refresh_tokens WHERE expires_at <= ?", (self._clock(),)
+            )
+        return cursor.rowcount
+
+    def _maybe_purge(self) -> None:
+        now = self._clock()
+        if now >= self._next_purge:
+            self._next_purge = now + self.purge_interval
+            self.purge_expired()
+
+    def get(self, username):
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT token FROM refresh_tokens WHERE username = ? AND expires_at > ?",
+                (username, self._clock()),
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, username, token, expires_at):
+        self._maybe_purge()
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT INTO refresh_tokens (username, token, expires_at) VALUES (?, ?, ?)"
+                " ON CONFLICT (username) DO UPDATE SET token = excluded.token,"
+                " expires_at = excluded.expires_at",
+                (username, token, expires_at),
+            )
+
+    def rotate(self, username, old_token, new_token, expires_at):
+        self._maybe_purge()
+        with self._connection() as conn:
+            cursor = conn.execute(
+                "UPDATE refresh_tokens SET token = ?, expires_at = ?"
+                " WHERE username = ? AND token = ?",
+                (new_token, expires_at, username, old_token),
+            )
+        return cursor.rowcount == 1
+
+    def delete(self, username):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM refresh_tokens WHERE username = ?", (username,))
+
+    def stats(self):
+        with self._connection() as conn:
+            (entries,) = conn.execute("SELECT COUNT(*) FROM refresh_tokens").fetchone()
+            (page_count,) = conn.execute("PRAGMA page_count").fetchone()
+            (page_size,) = conn.execute("PRAGMA page_size").fetchone()
+        return {"entries": entries, "db_bytes": page_count * page_size}
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+
+class UnixSocketRefreshTokenStore(RefreshTokenStore):
+    """
+    Client for a store server listening on a Unix socket (see `serve`).
+
+    All workers on the same host talk to one server process that keeps
+    the tokens in memory, so rotation stays atomic without a database.
+    Each thread keeps its own connection.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str, timeout: float = 5.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _file(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            conn = self._local.conn = sock.makefile("rwb")
+        return conn
+
+    def _call(self, op: str, *args):
+        request = json.dumps({"op": op, "args": args}).encode() + b"\n"
+        try:
+            conn = self._file()
+            conn.write(request)
+            conn.flush()
+            line = conn.readline()
+            if not line:
+                raise ConnectionError("refresh token store closed the connection")
+        except OSError:
+            self._local.conn = None
+            raise
+        return json.loads(line)["result"]
+
+    def get(self, username):
+        return self._call("get", username)
+
+    def set(self, username, token, expires_at):
+        self._call("set", username, token, expires_at)
+
+    def rotate(self, username, old_token, new_token, expires_at):
+        return self._call("rotate", username, old_token, new_token, expires_at)
+
+    def delete(self, username):
+        self._call("delete", username)
+
+    def stats(self):
+        return self._call("stats")
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class _StoreRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        store = self.server.store
+        for line in self.rfile:
+            request = json.loads(line)
+            if request["op"] not in ("get", "set", "rotate", "delete", "stats"):
+                result = None
+            else:
+                result = getattr(store, request["op"])(*request["args"])
+            self.wfile.write(json.dumps({"result": result}).encode() + b"\n")
+            self.wfile.flush()
+
+
+def make_server(path: str, store: RefreshTokenStore | None = None) -> socketserver.ThreadingUnixStreamServer:
+    """Creates (but does not start) a Unix socket server for `UnixSocketRefreshTokenStore`."""
+    if os.path.exists(path):
+        os.unlink(path)
+    server = socketserver.ThreadingUnixStreamServer(path, _StoreRequestHandler)
+    server.daemon_threads = True
+    server.store = store or InMemoryRefreshTokenStore()
+    return server
+
+
+class AsyncRefreshTokenStore:
+    """
+    Awaitable front of a RefreshTokenStore, for `async def` endpoints.
+
+    Calls of a blocking store (SQLite, Unix socket) run in a dedicated pool of
+    `max_workers` threads, which also bounds the connections they open.
+    Calls of the in-memory store run inline. `close` closes the store too.
+    """
+
+    def __init__(self, store: RefreshTokenStore, max_workers: int = REFRESH_TOKEN_STORE_POOL_SIZE):
+        self.store = store
+        self._executor = None
+        if store.blocking:
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="refresh-store")
+
+    async def _call(self, func, *args):
+        if self._executor is None:
+            return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def get(self, username: str) -> str | None:
+        return await self._call(self.store.get, username)
+
+    async def set(self, username: str, token: str, expires_at: float) -> None:
+        await self._call(self.store.set, username, token, expires_at)
+
+    async def rotate(self, username: str, old_token: str, new_token: str, expires_at: float) -> bool:
+        return await self._call(self.store.rotate, username, old_token, new_token, expires_at)
+
+    async def delete(self, username: str) -> None:
+        await self._call(self.store.delete, username)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        self.store.close()
+
+
+def create_refresh_token_store(url: str = REFRESH_TOKEN_STORE) -> RefreshTokenStore:
+    """
+    Builds a store from a URL:
+    - `memory://` (default, single worker only)
+    - `sqlite:///path/to/tokens.db`
+    - `unix:///path/to/store.sock` (start the server with `python refresh_store.py serve <path>`)
+    """
+    scheme, _, path = url.partition("://")
+    if scheme == "memory":
+        return InMemoryRefreshTokenStore()
+    if scheme == "sqlite":
+        return SQLiteRefreshTokenStore(path)
+    if scheme == "unix":
+        return UnixSocketRefreshTokenStore(path)
+    raise ValueError(f"Unknown REFRESH_TOKEN_STORE: {url}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] != "serve":
+        sys.exit("usage: python refresh_store.py serve /path/to/store.sock")
+    with make_server(sys.argv[2]) as server:
+        print(f"Refresh token store listening on {sys.argv[2]}")
+        server.serve_forever()
@@ -0,0 +1,379 @@
+import json
+import logging
+import math
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from expiry import ExpiryIndex
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# memory:// (default, this worker only)  |  sqlite:///path/to/revoked.db (shared by every worker on the host)
+REVOCATION_STORE = os.getenv("REVOCATION_STORE", "memory://")
+# File the revocation list is saved to, so a new worker starts from it instead of
+# replaying the whole store (empty: no snapshot)
+REVOCATION_SNAPSHOT = os.getenv("REVOCATION_SNAPSHOT") or None
+# Seconds between reads of new revocations from a shared store
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", "1"))
+# Revoked tokens the Bloom filter is sized for; it doubles when they are exceeded
+REVOCATION_BLOOM_CAPACITY = int(os.getenv("REVOCATION_BLOOM_CAPACITY", "100000"))
+
+SNAPSHOT_VERSION = 1  # bump when the filter hashing or the file layout changes
+
+
+class BloomFilter:
+    """
+    Set of strings that may answer "maybe" but never wrongly answers "no".
+
+    `capacity` items fit with a false positive rate of about `error_rate`.
+    The `hashes` bit positions of an item are derived from two checksums
+    (double hashing with CRC-32 and Adler-32, both in zlib, deterministic
+    across processes so the bits can be saved). Items are token ids we
+    generated at random and signed, so they spread well without a
+    cryptographic hash. A missing item usually stops at the first unset bit.
+    Items cannot be removed: the owner rebuilds the filter.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01, bits: int | None = None, hashes: int | None = None):
+        self.capacity = max(capacity, 1)
+        self.error_rate = error_rate
+        self.bits = bits or max(64, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = hashes or max(1, round(self.bits / self.capacity * math.log(2)))
+        self._array = bytearray((self.bits + 7) // 8)
+
+    def add(self, item: str) -> None:
+        data = item.encode()
+        h1, h2 = zlib.crc32(data), zlib.adler32(data) | 1
+        array, bits = self._array, self.bits
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % bits
+            array[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        data = item.encode()
+        h1 = zlib.crc32(data)
+        array, bits = self._array, self.bits
+        position = h1 % bits
+        if not array[position >> 3] & (1 << (position & 7)):
+            return False
+        h2 = zlib.adler32(data) | 1
+        for i in range(1, self.hashes):
+            position = (h1 + i * h2) % bits
+            if not array[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def to_bytes(self) -> bytes:
+        return bytes(self._array)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, capacity: int, error_rate: float, bits: int, hashes: int) -> "BloomFilter":
+        bloom = cls(capacity, error_rate, bits, hashes)
+        if len(data) != len(bloom._array):
+            raise ValueError("Bloom filter size does not match its header")
+        bloom._array[:] = data
+        return bloom
+
+    def __len__(self) -> int:
+        return len(self._array)
+
+
+class SQLiteRevocationLog:
+    """
+    Append-only table of revocations shared by every worker on the host.
+
+    Rows have increasing ids (AUTOINCREMENT, never reused), so a worker reads
+    only what was added since its last read: `since(position)`.
+    Expired rows are deleted through an index on `expires_at`, at most once
+    every `purge_interval` seconds; workers drop them from memory on their own.
+    """
+
+    def __init__(self, path: str, timeout: float = 5.0, purge_interval: float = 60.0, clock=time.time):
+        self.path = path
+        self.purge_interval = purge_interval
+        self._clock = clock
+        self._next_purge = 0.0
+        self._lock = threading.Lock()
+        # isolation_level=None: autocommit, every statement is its own transaction
+        self._conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS revoked_tokens ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " jti TEXT NOT NULL UNIQUE,"
+            " expires_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_revoked_tokens_expires_at ON revoked_tokens (expires_at)"
+        )
+
+    def append(self, revocations: list[tuple[str, float]]) -> None:
+        """Adds (jti, expires_at) rows, in one transaction."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO revoked_tokens (jti, expires_at) VALUES (?, ?)", revocations
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def since(self, position: int) -> list[tuple[int, str, float]]:
+        """Revocations added after `position`, as (id, jti, expires_at) in id order."""
+        with self._lock:
+            self._maybe_purge()
+            return self._conn.execute(
+                "SELECT id, jti, expires_at FROM revoked_tokens WHERE id > ? ORDER BY id", (position,)
+            ).fetchall()
+
+    def _maybe_purge(self) -> None:
+        now = self._clock()
+        if now >= self._next_purge:
+            self._next_purge = now + self.purge_interval
+            self._conn.execute("DELETE FROM revoked_tokens WHERE expires_at <= ?", (now,))
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class RevocationList:
+    """
+    Revoked tokens of this worker, by `jti`, checked on every request.
+
+    - A Bloom filter answers first: tokens that were never revoked (nearly
+      all of them) pay a checksum and a bit probe or two, no lock and no I/O
+    - Tokens the filter flags are looked up in an exact dict (jti -> exp),
+      so a false positive never rejects a valid token
+    - Entries are dropped when their token expires, through a heap ordered
+      by expiry (expiry.py): a revoked token only needs to stay listed until
+      it would be refused anyway. The filter is rebuilt when dropped entries
+      pile up, and doubles in size when it holds more than its capacity
+    - With a `log` (SQLiteRevocationLog), revocations are shared: each
+      worker appends its own and reads the others' incrementally (`sync`).
+      Once `start` was called, `revoke` only queues the write for the
+      background thread, so it never waits on the database
+    - With a `snapshot_path`, the filter bits and live entries are saved on
+      `close` (and every `snapshot_interval` seconds), so a new worker loads
+      them in one read and only syncs what was revoked since
+    """
+
+    def __init__(self, log: SQLiteRevocationLog | None = None, snapshot_path: str | None = None,
+                 capacity: int = REVOCATION_BLOOM_CAPACITY, error_rate: float = 0.01,
+                 sync_interval: float = REVOCATION_SYNC_SECONDS, snapshot_interval: float = 300.0,
+                 clock=time.time):
+        self.log = log
+        self.snapshot_path = snapshot_path
+        self.sync_interval = sync_interval
+        self.snapshot_interval = snapshot_interval
+        self._clock = clock
+        self._revoked: dict[str, float] = {}
+        self._expiry = ExpiryIndex()
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._dropped = 0  # entries removed since the filter was built (their bits are still set)
+        self.position = 0  # id of the last log row applied
+        self._pending: list[tuple[str, float]] = []  # revocations not written to the log yet
+        self.checks = 0
+        self.filter_hits = 0
+        self.sync_failures = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        if snapshot_path and os.path.exists(snapshot_path):
+            self.load_snapshot(snapshot_path)
+        if log is not None:
+            self.sync()
+
+    def is_revoked(self, jti: str) -> bool:
+        self.checks += 1
+        if jti not in self._bloom:
+            return False
+        self.filter_hits += 1
+        expires_at = self._revoked.get(jti)
+        return expires_at is not None and expires_at > self._clock()
+
+    def revoke(self, jti: str, expires_at: float) -> None:
+        """Revokes a token until `expires_at` (its `exp`), in every worker sharing the log."""
+        if expires_at <= self._clock():
+            return
+        self.purge_expired()
+        with self._lock:
+            self._add(jti, expires_at)
+            if self.log is not None and self._thread is not None:
+                self._pending.append((jti, expires_at))
+                return
+        if self.log is not None:
+            self.log.append([(jti, expires_at)])
+
+    def _add(self, jti: str, expires_at: float) -> None:
+        if jti in self._revoked:
+            return
+        self._revoked[jti] = expires_at
+        self._expiry.add(jti, expires_at)
+        self._bloom.add(jti)
+        if len(self._revoked) > self._bloom.capacity:
+            self._rebuild(self._bloom.capacity * 2)
+
+    def _rebuild(self, capacity: int) -> None:
+        bloom = BloomFilter(capacity, self._bloom.error_rate)
+        for jti in self._revoked:
+            bloom.add(jti)
+        # One assignment: readers see the old filter or the new one, never a partial one
+        self._bloom = bloom
+        self._dropped = 0
+
+    def purge_expired(self) -> int:
+        """Drops entries whose token has expired. Returns how many were removed."""
+        removed = 0
+        with self._lock:
+            for jti, expires_at in self._expiry.pop_expired(self._clock()):
+                if self._revoked.get(jti) == expires_at:
+                    del self._revoked[jti]
+                    removed += 1
+            self._dropped += removed
+            if self._dropped > max(len(self._revoked), 1024):
+                self._rebuild(self._bloom.capacity)
+        return removed
+
+    def sync(self) -> int:
+        """
+        Writes the revocations queued by this worker to the log, then applies
+        those added by any worker since the last sync. Returns how many rows were read.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if pending:
+            try:
+                self.log.append(pending)
+            except sqlite3.Error:
+                # e.g. "database is locked": keep them, in order, for the next sync
+                with self._lock:
+                    self._pending[:0] = pending
+                raise
+        rows = self.log.since(self.position) if self.log is not None else []
+        now = self._clock()
+        with self._lock:
+            for row_id, jti, expires_at in rows:
+                if expires_at > now:
+                    self._add(jti, expires_at)
+                self.position = row_id
+        self.purge_expired()
+        return len(rows)
+
+    def save_snapshot(self, path: str | Path | None = None) -> None:
+        """
+        Writes the filter and live entries to `path`: a JSON header line,
+        the raw filter bits, then the entries as one JSON object (jti -> exp).
+        The file is replaced atomically, so workers never read half of it.
+        """
+        path = Path(path or self.snapshot_path)
+        with self._lock:
+            bloom = self._bloom
+            header = {
+                "version": SNAPSHOT_VERSION, "position": self.position, "capacity": bloom.capacity,
+                "error_rate": bloom.error_rate, "bits": bloom.bits, "hashes": bloom.hashes,
+            }
+            data = bloom.to_bytes()
+            entries = dict(self._revoked)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(json.dumps(header).encode() + b"\n")
+            f.write(data)
+            f.write(json.dumps(entries, separators=(",", ":")).encode())
+        os.replace(tmp, path)
+
+    def load_snapshot(self, path: str | Path) -> None:
+        """Replaces the list with a snapshot written by `save_snapshot`. Expired entries are skipped."""
+        with open(path, "rb") as f:
+            header = json.loads(f.readline())
+            if header.get("version") != SNAPSHOT_VERSION:
+                raise ValueError(f"Unsupported revocation snapshot version: {header.get('version')}")
+            bloom = BloomFilter.from_bytes(
+                f.read((header["bits"] + 7) // 8), header["capacity"], header["error_rate"],
+                header["bits"], header["hashes"],
+            )
+            now = self._clock()
+            entries = [(jti, expires_at) for jti, expires_at in json.loads(f.read()).items() if expires_at > now]
+        with self._lock:
+            self._revoked = dict(entries)
+            self._expiry.compact(entries)
+            self._bloom = bloom
+            self._dropped = 0
+            self.position = header["position"]
+
+    def start(self) -> None:
+        """Starts the background sync (shared log) and periodic snapshots, if any."""
+        if self._thread is None and (self.log is not None or self.snapshot_path):
+            self._thread = threading.Thread(target=self._run, name="revocation-sync", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        interval = self.sync_interval if self.log is not None else self.snapshot_interval
+        next_snapshot = time.monotonic() + self.snapshot_interval
+        while not self._stop.wait(interval):
+            # A failed round is retried at the next interval: the thread must outlive database errors
+            try:
+                self.sync()
+                if self.snapshot_path and time.monotonic() >= next_snapshot:
+                    next_snapshot = time.monotonic() + self.snapshot_interval
+                    self.save_snapshot()
+            except (sqlite3.Error, OSError):
+                self.sync_failures += 1
+                logger.exception("Revocation sync failed, retrying in %s s", interval)
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.log is not None:
+            self.sync()
+        if self.snapshot_path:
+            self.save_snapshot()
+        if self.log is not None:
+            self.log.close()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._revoked),
+            "checks": self.checks,
+            "filter_hits": self.filter_hits,
+            "sync_failures": self.sync_failures,
+            "pending": len(self._pending),
+            "bloom_bytes": len(self._bloom),
+            "approx_bytes": sys.getsizeof(self._revoked) + len(self._bloom) + self._expiry.approx_bytes(),
+        }
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+
+def create_revocation_list(url: str = REVOCATION_STORE,
+                           snapshot_path: str | None = REVOCATION_SNAPSHOT) -> RevocationList:
+    """
+    Builds the revocation list from a URL:
+    - `memory://` (default, revocations stay in this worker)
+    - `sqlite:///path/to/revoked.db` (shared by every worker on the host)
+
+    The background sync is started; call `close()` at shutdown.
+    """
+    scheme, _, path = url.partition("://")
+    if scheme == "memory":
+        revocation_list = RevocationList(snapshot_path=snapshot_path)
+    elif scheme == "sqlite":
+        revocation_list = RevocationList(SQLiteRevocationLog(path), snapshot_path=snapshot_path)
+    else:
+        raise ValueError(f"Unknown REVOCATION_STORE: {url}")
+    revocation_list.start()
+    return revocation_list
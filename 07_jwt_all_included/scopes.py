@@ -0,0 +1,66 @@
+from collections.abc import Iterable
+
+# Every scope the app knows about. The position is the bit of the scope in a
+# scope mask and may end up inside tokens: only append, never reorder or remove.
+SCOPES = ("user", "admin", "introspect")
+
+
+class ScopeRegistry:
+    """
+    Maps scope names to bits so that authorization is a single AND.
+
+    - Route requirements are compiled once into a mask (`mask`)
+    - A token's scopes become a mask when the token is verified (`token_mask`),
+      either from the `scopes` list or from a compact `scope_mask` integer claim
+    - A request is allowed if `granted & required == required`
+
+    Unknown scopes in a requirement are a programming error and raise ValueError.
+    Unknown scopes in a token grant nothing.
+    """
+
+    def __init__(self, names: Iterable[str] = SCOPES):
+        self._bits: dict[str, int] = {}
+        self._names: list[str] = []
+        for name in names:
+            self.register(name)
+
+    def register(self, name: str) -> int:
+        if name not in self._bits:
+            self._bits[name] = 1 << len(self._names)
+            self._names.append(name)
+        return self._bits[name]
+
+    def mask(self, scopes: Iterable[str]) -> int:
+        """Compiles required scopes into a mask."""
+        mask = 0
+        for name in scopes:
+            try:
+                mask |= self._bits[name]
+            except KeyError:
+                raise ValueError(f"Unknown scope: {name}")
+        return mask
+
+    def token_mask(self, payload: dict) -> int:
+        """Scopes granted by a token, as a mask."""
+        mask = payload.get("scope_mask")
+        if isinstance(mask, int):
+            return mask
+        bits = self._bits
+        mask = 0
+        for name in payload.get("scopes", ()):
+            mask |= bits.get(name, 0)
+        return mask
+
+    def names(self, mask: int) -> list[str]:
+        """Scope names of a mask, in registration order."""
+        return [name for name in self._names if mask & self._bits[name]]
+
+    @staticmethod
+    def allows(granted: int, required: int) -> bool:
+        return granted & required == required
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+scope_registry = ScopeRegistry()
@@ -0,0 +1,171 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import time
+from calendar import timegm
+from datetime import datetime
+
+from jose.exceptions import ExpiredSignatureError, JWTClaimsError, JWTError
+
+try:
+    # Optional: faster JSON parsing of the claims
+    import orjson
+
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+
+
+class BadSignatureError(JWTError):
+    """A well-formed token whose signature does not match: forged, or signed with another key."""
+
+
+_HMAC_DIGESTS = {
+    "HS256": hashlib.sha256,
+    "HS384": hashlib.sha384,
+    "HS512": hashlib.sha512,
+}
+
+
+def b64url_encode(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+def b64url_decode(data: bytes) -> bytes:
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+
+def encode_claims(claims: dict) -> bytes:
+    """Claims segment of a token. `exp`, `iat` and `nbf` may be datetimes."""
+    for time_claim in ("exp", "iat", "nbf"):
+        value = claims.get(time_claim)
+        if isinstance(value, datetime):
+            claims = {**claims, time_claim: timegm(value.utctimetuple())}
+    return b64url_encode(json.dumps(claims, separators=(",", ":")).encode())
+
+
+def parse_claims(claims_segment: bytes) -> dict:
+    """Decodes the claims segment of a token whose signature has been verified."""
+    try:
+        claims = _json_loads(b64url_decode(claims_segment))
+    except (TypeError, ValueError, binascii.Error) as e:
+        raise JWTError(f"Invalid payload string: {e}")
+    if not isinstance(claims, dict):
+        raise JWTError("Invalid payload string: must be a json object")
+    return claims
+
+
+class TokenCodec:
+    """
+    HS256/HS384/HS512 JWT encoder and decoder bound to one secret.
+
+    `jwt.encode`/`jwt.decode` from python-jose parse the key, look up the
+    algorithm and compute a fresh HMAC key schedule on every call.
+    This codec does that work once, when it is created:
+    - The keyed HMAC state is computed once and copied for each token
+    - The header segment (`{"alg":...,"typ":"JWT"}`) is encoded once
+
+    Tokens are byte-for-byte identical to python-jose output, and decode
+    raises the same exceptions (`JWTError`, `ExpiredSignatureError`,
+    `JWTClaimsError`) for the claims this project uses.
+    """
+
+    def __init__(self, secret: str | bytes, algorithm: str = "HS256", headers: dict | None = None):
+        if algorithm not in _HMAC_DIGESTS:
+            raise JWTError(f"Algorithm {algorithm} is not supported by TokenCodec")
+        if isinstance(secret, str):
+            secret = secret.encode()
+        self.algorithm = algorithm
+        self._mac = hmac.new(secret, digestmod=_HMAC_DIGESTS[algorithm])
+        # Same serialization as python-jose: sorted keys, no spaces.
+        # A header set to None is left out (e.g. `{"typ": None}` for compact tokens).
+        header = {"typ": "JWT", "alg": algorithm, **(headers or {})}
+        header = {name: value for name, value in header.items() if value is not None}
+        self.header_segment = b64url_encode(
+            json.dumps(header, separators=(",", ":"), sort_keys=True).encode()
+        )
+        self._header_prefix = self.header_segment + b"."
+
+    def _sign(self, signing_input: bytes) -> bytes:
+        mac = self._mac.copy()
+        mac.update(signing_input)
+        return mac.digest()
+
+    def encode(self, claims: dict) -> str:
+        """Returns a signed JWT. `exp`, `iat` and `nbf` may be datetimes."""
+        signing_input = self._header_prefix + encode_claims(claims)
+        return (signing_input + b"." + b64url_encode(self._sign(signing_input))).decode()
+
+    def decode(self, token: str, leeway: int = 0) -> dict:
+        """
+        Verifies the signature and the registered claims, returns the claims.
+
+        Raises:
+        - ExpiredSignatureError if `exp` has passed
+        - JWTClaimsError if a registered claim is invalid
+        - BadSignatureError (a JWTError) if the signature does not match
+        - JWTError for any other problem (format, algorithm)
+        """
+        raw = token.encode() if isinstance(token, str) else token
+        try:
+            signing_input, signature_segment = raw.rsplit(b".", 1)
+            header_segment, claims_segment = signing_input.split(b".", 1)
+        except ValueError:
+            raise JWTError("Not enough segments")
+
+        # Tokens we issued carry exactly our header: skip parsing it
+        if header_segment != self.header_segment:
+            self._check_header(header_segment)
+
+        try:
+            signature = b64url_decode(signature_segment)
+        except (TypeError, binascii.Error):
+            raise JWTError("Invalid crypto padding")
+        if not hmac.compare_digest(signature, self._sign(signing_input)):
+            raise BadSignatureError("Signature verification failed.")
+
+        claims = parse_claims(claims_segment)
+        validate_claims(claims, leeway)
+        return claims
+
+    def _check_header(self, header_segment: bytes) -> None:
+        try:
+            header = json.loads(b64url_decode(header_segment))
+        except (TypeError, ValueError, binascii.Error):
+            raise JWTError("Invalid header string")
+        if not isinstance(header, dict):
+            raise JWTError("Invalid header string: must be a json object")
+        if header.get("alg") != self.algorithm:
+            raise JWTError("The specified alg value is not allowed")
+
+
+def validate_claims(claims: dict, leeway: int = 0) -> None:
+    """Checks the registered claims with python-jose's default rules (no audience/issuer/subject expected)."""
+    now = timegm(time.gmtime())
+    if "iat" in claims and not isinstance(claims["iat"], (int, float)):
+        raise JWTClaimsError("Issued At claim (iat) must be an integer.")
+    if "nbf" in claims:
+        try:
+            nbf = int(claims["nbf"])
+        except (TypeError, ValueError):
+            raise JWTClaimsError("Not Before claim (nbf) must be an integer.")
+        if nbf > now + leeway:
+            raise JWTClaimsError("The token is not yet valid (nbf)")
+    if "exp" in claims:
+        try:
+            exp = int(claims["exp"])
+        except (TypeError, ValueError):
+            raise JWTClaimsError("Expiration Time claim (exp) must be an integer.")
+        if exp < now - leeway:
+            raise ExpiredSignatureError("Signature has expired.")
+    if "aud" in claims:
+        raise JWTClaimsError("Invalid audience")
+    if "sub" in claims and not isinstance(claims["sub"], str):
+        raise JWTClaimsError("Subject must be a string.")
+    if "jti" in claims and not isinstance(claims["jti"], str):
+        raise JWTClaimsError("JWT ID must be a string.")
+    if "at_hash" in claims:
+        raise JWTClaimsError("No access_token provided to compare against at_hash claim.")
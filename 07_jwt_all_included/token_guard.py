@@ -0,0 +1,101 @@
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from token_cache import TokenCache
+
+# Our tokens are ~200 bytes with a 36-byte header; anything far bigger is not ours
+TOKEN_MAX_LENGTH = 4096
+HEADER_MAX_LENGTH = 256
+
+# Three base64url segments separated by dots, nothing else
+_TOKEN_SHAPE = re.compile(r"[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+")
+
+
+def precheck(token: str) -> str | None:
+    """
+    Cheap structural check run before any base64, JSON or HMAC work.
+
+    Returns the rejection reason (`too_large` or `malformed`),
+    or None if the token has the shape of a JWT.
+    """
+    if len(token) > TOKEN_MAX_LENGTH:
+        return "too_large"
+    if not _TOKEN_SHAPE.fullmatch(token):
+        return "malformed"
+    if token.index(".") > HEADER_MAX_LENGTH:
+        return "too_large"
+    return None
+
+
+class RejectedTokenCache:
+    """
+    Short-lived memory of tokens that failed verification (negative cache).
+
+    A client retrying an expired or forged token, or a scanner replaying
+    garbage, is rejected from here without decoding the token again.
+
+    How it works:
+    - Keys are the SHA-256 digest of the token, like TokenCache
+    - Each entry lives `ttl` seconds, the LRU entry is evicted past `max_size`
+    - `rejections` counts every rejection by reason, cached or not
+    """
+
+    def __init__(self, ttl: float = 30.0, max_size: int = 10_000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.rejections: Counter[str] = Counter()
+        self._entries: OrderedDict[bytes, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> str | None:
+        """Returns the reason the token was rejected recently, if any."""
+        key = TokenCache.key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, reason = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self.hits += 1
+            self.rejections[reason] += 1
+            return reason
+
+    def put(self, token: str, reason: str) -> None:
+        """Counts a rejection and remembers the token for `ttl` seconds."""
+        with self._lock:
+            self.rejections[reason] += 1
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        key = TokenCache.key(token)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, reason)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def count(self, reason: str) -> None:
+        """Counts a rejection without caching the token (e.g. failed precheck)."""
+        with self._lock:
+            self.rejections[reason] += 1
+
+    def clear(self) -> None:
+        """Drops every entry. Hit and rejection counters are kept: /metrics exports them as running totals."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "rejections": dict(self.rejections),
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,93 @@
+import os
+import threading
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+
+from dotenv import load_dotenv
+
+from auth import access_token_expiry, create_access_tokens, jwt_backend
+
+load_dotenv()
+
+# Processes that sign large batches of tokens (default: CPU count)
+TOKEN_ISSUE_WORKERS = int(os.getenv("TOKEN_ISSUE_WORKERS", str(os.cpu_count() or 1)))
+# Batches smaller than this are signed in the calling thread: shipping them to a process costs more
+TOKEN_ISSUE_PARALLEL_MIN = int(os.getenv("TOKEN_ISSUE_PARALLEL_MIN", "5000"))
+# Tokens signed per task sent to a worker process
+TOKEN_ISSUE_CHUNK_SIZE = int(os.getenv("TOKEN_ISSUE_CHUNK_SIZE", "2000"))
+
+
+def _issue_chunk(items: list[dict], expires_at: int) -> list[str]:
+    # Runs in a worker process, which has its own copy of the app's JWT backend
+    return list(create_access_tokens(items, expires_at))
+
+
+class BulkTokenIssuer:
+    """
+    Issues large batches of access tokens (service accounts, load test seeds).
+
+    - Small batches go through `create_access_tokens` in the calling thread
+    - Batches of `parallel_min` tokens or more are split in chunks of
+      `chunk_size` and signed by a pool of `workers` processes, so a big
+      batch uses every core instead of one
+    - Every token of a batch shares one `exp`, computed once by the caller's
+      process, whichever worker signs it
+    - `issue` yields tokens in input order as chunks complete, with at most
+      two chunks per worker in flight, so memory does not grow with the batch
+
+    The pool is created on first use, so importing the app never forks processes.
+    Its workers sign with the key ring they were forked with and do not reload
+    it: with JWT_BACKEND=keyring, `reset` drops the pool on every key ring
+    reload, and the next chunk forks workers that sign with the new active key.
+    """
+
+    def __init__(self, workers: int = TOKEN_ISSUE_WORKERS, parallel_min: int = TOKEN_ISSUE_PARALLEL_MIN,
+                 chunk_size: int = TOKEN_ISSUE_CHUNK_SIZE):
+        self.workers = workers
+        self.parallel_min = parallel_min
+        self.chunk_size = chunk_size
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def issue(self, items: list[dict], expires_at: int | None = None) -> Iterator[str]:
+        """Yields one access token per claims dict of `items` (e.g. `{"sub": ..., "scopes": [...]}`)."""
+        if expires_at is None:
+            expires_at = access_token_expiry()
+        if len(items) < self.parallel_min or self.workers <= 1:
+            yield from create_access_tokens(items, expires_at)
+            return
+
+        in_flight = deque()
+        for offset in range(0, len(items), self.chunk_size):
+            if len(in_flight) >= 2 * self.workers:
+                yield from in_flight.popleft().result()
+            # Fetched per chunk: after a key ring reload, the rest of the batch goes to the new pool
+            in_flight.append(self._get_executor().submit(_issue_chunk, items[offset:offset + self.chunk_size], expires_at))
+        while in_flight:
+            yield from in_flight.popleft().result()
+
+    def reset(self, ring=None) -> None:
+        """Drops the pool without waiting: chunks already sent finish on the old workers."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+token_issuer = BulkTokenIssuer()
+
+if jwt_backend.name == "keyring":
+    jwt_backend.reload_listeners.append(token_issuer.reset)
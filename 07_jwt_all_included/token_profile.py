@@ -0,0 +1,56 @@
+import os
+
+from dotenv import load_dotenv
+
+from scopes import ScopeRegistry, scope_registry
+
+load_dotenv()
+
+# standard (default)  |  compact
+TOKEN_PROFILE = os.getenv("TOKEN_PROFILE", "standard")
+
+# Compact profile: numeric token types and one-letter claim names
+TYPE_CODES = {"access": 1, "refresh": 2}
+TYPE_NAMES = {code: name for name, code in TYPE_CODES.items()}
+TYPE_CLAIM = "t"
+SCOPES_CLAIM = "s"
+
+# JOSE header of compact tokens: `typ` is optional (RFC 7519) and always "JWT" here
+COMPACT_HEADERS = {"typ": None}
+
+
+def compact_claims(claims: dict, registry: ScopeRegistry = scope_registry) -> dict:
+    """
+    Rewrites claims in the compact profile, to make tokens shorter:
+    - `type` becomes `t` with a numeric code (`1` access, `2` refresh)
+    - `scopes` (or `scope_mask`) becomes `s`, the scope mask of scopes.py.
+      Scopes the registry does not know grant nothing and are dropped, as with SCOPE_MASK_CLAIM
+
+    Registered claims (`sub`, `exp`, ...) are already short and kept as is.
+    """
+    compact = {}
+    for name, value in claims.items():
+        if name == "type":
+            compact[TYPE_CLAIM] = TYPE_CODES[value]
+        elif name == "scopes":
+            compact[SCOPES_CLAIM] = registry.token_mask({"scopes": value})
+        elif name == "scope_mask":
+            compact[SCOPES_CLAIM] = value
+        else:
+            compact[name] = value
+    return compact
+
+
+def expand_claims(payload: dict) -> dict:
+    """
+    Returns the payload with standard claim names, whatever profile the token used:
+    `t` becomes `type` and `s` becomes `scope_mask`. Standard payloads are returned unchanged.
+    """
+    if TYPE_CLAIM not in payload and SCOPES_CLAIM not in payload:
+        return payload
+    expanded = dict(payload)
+    if TYPE_CLAIM in expanded:
+        expanded["type"] = TYPE_NAMES.get(expanded.pop(TYPE_CLAIM))
+    if SCOPES_CLAIM in expanded:
+        expanded["scope_mask"] = expanded.pop(SCOPES_CLAIM)
+    return expanded
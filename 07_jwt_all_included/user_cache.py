@@ -0,0 +1,153 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+from user_repository import UserRepository
+
+load_dotenv()
+
+# Users kept in memory by CachedUserRepository (0 disables the cache)
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+# Seconds a cached user is trusted. Changes made by other workers show up within this delay
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+
+
+class _Load:
+    """One in-flight fetch of a user, shared by every thread asking for it meanwhile."""
+
+    __slots__ = ("done", "user", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.user = None
+        self.error = None
+
+
+class CachedUserRepository(UserRepository):
+    """
+    Read-through cache in front of a UserRepository (user record and scopes).
+
+    - `get` answers from memory for `ttl` seconds after a user was loaded;
+      the least recently used users are evicted beyond `max_size`
+    - Single-flight: concurrent misses for the same user (a burst of
+      refreshes) wait for one fetch instead of each querying the store
+    - Writes go to the store, then drop the user from the cache
+      (`invalidate`); a fetch that was running during the write is not cached
+    - Unknown users are not cached, so a registration made by another
+      worker is seen at once; only changes to existing users wait for `ttl`
+    - `hits`, `misses` and `loads` (fetches actually sent to the store) feed
+      the hit ratio reported by `stats()`
+
+    Cached dicts are shared between requests and must not be mutated.
+    """
+
+    def __init__(self, repository: UserRepository, ttl: float = USER_CACHE_TTL,
+                 max_size: int = USER_CACHE_SIZE, clock=time.monotonic):
+        self.repository = repository
+        self.blocking = repository.blocking
+        self.ttl = ttl
+        self.max_size = max_size
+        self._clock = clock
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._loads: dict[str, _Load] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    def peek(self, username: str) -> dict | None:
+        """Returns the user if it is cached and fresh, without ever querying the store."""
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None or entry[0] <= now:
+                return None
+            self._entries.move_to_end(username)
+            self.hits += 1
+            return entry[1]
+
+    def get(self, username):
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(username)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            load = self._loads.get(username)
+            leader = load is None
+            if leader:
+                load = self._loads[username] = _Load()
+                self.loads += 1
+
+        if not leader:
+            load.done.wait()
+            if load.error is not None:
+                raise load.error
+            return load.user
+
+        try:
+            load.user = self.repository.get(username)
+        except BaseException as e:
+            load.error = e
+            raise
+        finally:
+            with self._lock:
+                # `invalidate` removes the load when the user changed meanwhile: do not cache what it read
+                if self._loads.get(username) is load:
+                    del self._loads[username]
+                    if load.user is not None and self.max_size > 0:
+                        self._entries[username] = (self._clock() + self.ttl, load.user)
+                        self._entries.move_to_end(username)
+                        while len(self._entries) > self.max_size:
+                            self._entries.popitem(last=False)
+            load.done.set()
+        return load.user
+
+    def invalidate(self, username: str) -> None:
+        """Drops a user from the cache (after a registration or a role change)."""
+        with self._lock:
+            self._entries.pop(username, None)
+            self._loads.pop(username, None)
+
+    def add(self, username, hashed_password, scopes):
+        try:
+            return self.repository.add(username, hashed_password, scopes)
+        finally:
+            self.invalidate(username)
+
+    def set_scopes(self, username, scopes):
+        try:
+            return self.repository.set_scopes(username, scopes)
+        finally:
+            self.invalidate(username)
+
+    def count(self):
+        return self.repository.count()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.loads = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "loads": self.loads,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+    def close(self):
+        self.repository.close()
+
+    def __len__(self) -> int:
+        return len(self._entries)
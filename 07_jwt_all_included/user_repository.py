@@ -0,0 +1,256 @@
+import asyncio
+import copy
+import os
+import queue
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+from fake_db import fake_users_db
+
+load_dotenv()
+
+# memory:// (default, seeded from fake_db.py, lost on restart)  |  sqlite:///path/to/users.db
+USER_STORE = os.getenv("USER_STORE", "memory://")
+# Connections of the SQLite user store (and threads of its async wrapper)
+USER_STORE_POOL_SIZE = int(os.getenv("USER_STORE_POOL_SIZE", "8"))
+
+
+class UserRepository(ABC):
+    """
+    Where user accounts live: username, bcrypt hash and scopes.
+
+    Users are returned as dicts with the shape of `fake_users_db` entries
+    (`username`, `hashed_password`, `scopes`).
+    `add` is atomic: of two registrations of the same name, exactly one
+    succeeds, even across workers sharing the store.
+    """
+
+    # True if calls do I/O and should not run on the event loop (see AsyncUserRepository)
+    blocking = False
+
+    @abstractmethod
+    def get(self, username: str) -> dict | None:
+        """Returns the user, or None."""
+
+    @abstractmethod
+    def add(self, username: str, hashed_password: str, scopes: list[str]) -> bool:
+        """Creates a user. Returns False if the username is taken."""
+
+    @abstractmethod
+    def set_scopes(self, username: str, scopes: list[str]) -> bool:
+        """Replaces the scopes of a user (role change). Returns False if there is no such user."""
+
+    @abstractmethod
+    def count(self) -> int:
+        """Number of users."""
+
+    def close(self) -> None:
+        pass
+
+
+class InMemoryUserRepository(UserRepository):
+    """
+    Dict protected by a lock, seeded with a copy of `fake_users_db`.
+    Private to one process and lost on restart: the tutorial default.
+    """
+
+    def __init__(self, users: dict | None = None):
+        self._users = copy.deepcopy(fake_users_db if users is None else users)
+        self._lock = threading.Lock()
+
+    def get(self, username):
+        return self._users.get(username)
+
+    def add(self, username, hashed_password, scopes):
+        with self._lock:
+            if username in self._users:
+                return False
+            self._users[username] = {"username": username, "hashed_password": hashed_password, "scopes": list(scopes)}
+            return True
+
+    def set_scopes(self, username, scopes):
+        with self._lock:
+            user = self._users.get(username)
+            if user is None:
+                return False
+            # Replace the record instead of mutating it: readers may hold the old one
+            self._users[username] = {**user, "scopes": list(scopes)}
+            return True
+
+    def count(self):
+        return len(self._users)
+
+
+def _scopes_column(scopes: Iterable[str]) -> str:
+    # Space-delimited, as in the OAuth2 `scope` parameter
+    return " ".join(scopes)
+
+
+class SQLiteUserRepository(UserRepository):
+    """
+    SQLite database shared by every worker on the host, kept across restarts.
+
+    - WAL mode: lookups never block a registration
+    - A pool of `pool_size` connections reused across requests; each keeps
+      its compiled statements (`cached_statements`), so the fixed queries
+      below are prepared once per connection
+    - Unique index on `username`: registration is a single INSERT, and the
+      database refuses a duplicate instead of a check-then-insert in Python
+    - The seed users of fake_db.py are inserted when missing
+    """
+
+    blocking = True
+
+    def __init__(self, path: str, pool_size: int = USER_STORE_POOL_SIZE, timeout: float = 5.0,
+                 seed: dict | None = None):
+        self.path = path
+        self.pool_size = pool_size
+        self._pool: queue.Queue[sqlite3.Connection] = queue.Queue()
+        for _ in range(pool_size):
+            self._pool.put(self._connect(timeout))
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS users ("
+                " username TEXT NOT NULL,"
+                " hashed_password TEXT NOT NULL,"
+                " scopes TEXT NOT NULL)"
+            )
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username ON users (username)")
+            conn.executemany(
+                "INSERT OR IGNORE INTO users (username, hashed_password, scopes) VALUES (?, ?, ?)",
+                [(user["username"], user["hashed_password"], _scopes_column(user["scopes"]))
+                 for user in (fake_users_db if seed is None else seed).values()],
+            )
+
+    def _connect(self, timeout: float) -> sqlite3.Connection:
+        # isolation_level=None: autocommit, every statement is its own transaction
+        conn = sqlite3.connect(self.path, timeout=timeout, isolation_level=None,
+                               check_same_thread=False, cached_statements=64)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def get(self, username):
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT hashed_password, scopes FROM users WHERE username = ?", (username,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"username": username, "hashed_password": row[0], "scopes": row[1].split()}
+
+    def add(self, username, hashed_password, scopes):
+        try:
+            with self._connection() as conn:
+                conn.execute(
+                    "INSERT INTO users (username, hashed_password, scopes) VALUES (?, ?, ?)",
+                    (username, hashed_password, _scopes_column(scopes)),
+                )
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def add_many(self, users: Iterable[tuple[str, str, list[str]]]) -> None:
+        """Bulk import of (username, hashed_password, scopes) in one transaction. Existing names are skipped."""
+        with self._connection() as conn:
+            conn.execute("BEGIN")
+            try:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO users (username, hashed_password, scopes) VALUES (?, ?, ?)",
+                    ((username, hashed, _scopes_column(scopes)) for username, hashed, scopes in users),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def set_scopes(self, username, scopes):
+        with self._connection() as conn:
+            cursor = conn.execute(
+                "UPDATE users SET scopes = ? WHERE username = ?", (_scopes_column(scopes), username)
+            )
+        return cursor.rowcount == 1
+
+    def count(self):
+        with self._connection() as conn:
+            (users,) = conn.execute("SELECT COUNT(*) FROM users").fetchone()
+        return users
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+
+class AsyncUserRepository:
+    """
+    Awaitable front of a UserRepository, for `async def` endpoints.
+
+    Calls of a blocking repository (SQLite) run in a dedicated thread pool
+    sized like its connection pool, so they neither stall the event loop nor
+    take threads from FastAPI's pool. Calls of the in-memory repository run
+    inline: they never wait on I/O, and neither do hits of a repository that
+    has a `peek` method (CachedUserRepository).
+    """
+
+    def __init__(self, repository: UserRepository, max_workers: int | None = None):
+        self.repository = repository
+        self._peek = getattr(repository, "peek", None)
+        self._executor = None
+        if repository.blocking:
+            workers = max_workers or getattr(repository, "pool_size", None) or USER_STORE_POOL_SIZE
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="user-store")
+
+    async def _call(self, func, *args):
+        if self._executor is None:
+            return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def get(self, username: str) -> dict | None:
+        if self._peek is not None:
+            user = self._peek(username)
+            if user is not None:
+                return user
+        return await self._call(self.repository.get, username)
+
+    async def add(self, username: str, hashed_password: str, scopes: list[str]) -> bool:
+        return await self._call(self.repository.add, username, hashed_password, scopes)
+
+    async def set_scopes(self, username: str, scopes: list[str]) -> bool:
+        return await self._call(self.repository.set_scopes, username, scopes)
+
+    async def count(self) -> int:
+        return await self._call(self.repository.count)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        self.repository.close()
+
+
+def create_user_repository(url: str = USER_STORE) -> UserRepository:
+    """
+    Builds a repository from a URL:
+    - `memory://` (default, seeded from fake_db.py, single worker only)
+    - `sqlite:///path/to/users.db`
+    """
+    scheme, _, path = url.partition("://")
+    if scheme == "memory":
+        return InMemoryUserRepository()
+    if scheme == "sqlite":
+        return SQLiteUserRepository(path)
+    raise ValueError(f"Unknown USER_STORE: {url}")
+
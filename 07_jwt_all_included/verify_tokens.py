@@ -0,0 +1,159 @@
+"""
+Offline verification of the access tokens found in files (access logs, exports).
+
+Every JWT-shaped string of every input line is verified with the app's
+settings (.env: SECRET_KEY/ALGORITHM or JWT_BACKEND=keyring, TOKEN_PROFILE,
+REVOCATION_STORE) and reported as one JSON line:
+
+    {"source": "access.log", "line": 12, "token": "<sha256 prefix>", "status": "expired"}
+
+Statuses: valid, expired, bad_signature, invalid (undecodable), malformed,
+too_large, revoked, wrong_type, missing_scopes (see --scopes). Decoded
+tokens also report `sub`, `exp`, `type` and `scopes`; the token itself is
+never written out.
+
+Lines are read lazily and verified in chunks by a process pool, with a
+bounded number of chunks in flight, so memory stays flat whatever the
+input size. Results keep the input order. A throughput report is printed
+to stderr at the end.
+
+Usage (from 07_jwt_all_included):
+    python verify_tokens.py access.log.1 access.log.2 > report.jsonl
+    zcat access.log.gz | python verify_tokens.py - --scopes admin --workers 8
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter, deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+
+from jose import ExpiredSignatureError, JWTError
+
+from auth import compile_scopes, decode_claims, revocation_list, token_scopes
+from jwt_backend import BadSignatureError
+from scopes import scope_registry
+from token_guard import precheck
+
+# A JWT header is a JSON object, so its base64url encoding starts with "eyJ" ('{"')
+_JWT = re.compile(r"eyJ[A-Za-z0-9_-]*\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+")
+
+
+def token_status(token: str, required_scopes: int = 0, token_type: str = "access") -> dict:
+    """Verifies one token. Returns its status and, if it could be decoded, its main claims."""
+    reason = precheck(token)
+    if reason is not None:
+        return {"status": reason}
+    try:
+        payload = decode_claims(token)
+    except ExpiredSignatureError:
+        return {"status": "expired"}
+    except BadSignatureError:
+        # Raised by every JWT_BACKEND (see jwt_backend.py)
+        return {"status": "bad_signature"}
+    except JWTError as e:
+        return {"status": "invalid", "error": str(e)}
+
+    result = {"status": "valid", "sub": payload.get("sub"), "exp": payload.get("exp"),
+              "type": payload.get("type"), "scopes": token_scopes(payload)}
+    jti = payload.get("jti")
+    if jti is not None and revocation_list.is_revoked(jti):
+        result["status"] = "revoked"
+    elif payload.get("type") != token_type:
+        result["status"] = "wrong_type"
+    elif not scope_registry.allows(scope_registry.token_mask(payload), required_scopes):
+        result["status"] = "missing_scopes"
+    return result
+
+
+def verify_chunk(chunk: list[tuple[str, int, str]], required_scopes: int,
+                 token_type: str) -> tuple[list[str], Counter]:
+    """Runs in a worker process: verifies (source, line, token) items. Returns their JSON lines and status counts."""
+    lines = []
+    statuses: Counter = Counter()
+    for source, number, token in chunk:
+        result = {"source": source, "line": number, "token": hashlib.sha256(token.encode()).hexdigest()[:16]}
+        result.update(token_status(token, required_scopes, token_type))
+        statuses[result["status"]] += 1
+        lines.append(json.dumps(result, separators=(",", ":")))
+    return lines, statuses
+
+
+def find_tokens(paths: list[str]) -> Iterator[tuple[str, int, str]]:
+    """Yields (source, line number, token) for every JWT-shaped string, one line in memory at a time."""
+    for path in paths:
+        file = sys.stdin if path == "-" else open(path, encoding="utf-8", errors="replace")
+        try:
+            for number, line in enumerate(file, 1):
+                for token in _JWT.findall(line):
+                    yield path, number, token
+        finally:
+            if file is not sys.stdin:
+                file.close()
+
+
+def chunked(items: Iterable, size: int) -> Iterator[list]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def verify_files(paths: list[str], output, required_scopes: int = 0, token_type: str = "access",
+                 workers: int | None = None, chunk_size: int = 2000) -> Counter:
+    """
+    Verifies every token of `paths` and writes one JSON line per token to `output`.
+    Returns the number of tokens per status.
+
+    At most two chunks per worker are queued or running at any time; the
+    oldest is written out before the next one is read.
+    """
+    workers = workers or os.cpu_count() or 1
+    statuses: Counter = Counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+
+        def drain_oldest():
+            lines, counts = in_flight.popleft().result()
+            output.write("\n".join(lines) + "\n")
+            statuses.update(counts)
+
+        for chunk in chunked(find_tokens(paths), chunk_size):
+            if len(in_flight) >= 2 * workers:
+                drain_oldest()
+            in_flight.append(pool.submit(verify_chunk, chunk, required_scopes, token_type))
+        while in_flight:
+            drain_oldest()
+    return statuses
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="*", default=["-"], help="files to scan, - for stdin (default)")
+    parser.add_argument("--scopes", nargs="*", default=[], help="scopes every token must grant")
+    parser.add_argument("--type", default="access", choices=["access", "refresh"], help="expected token type")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    statuses = verify_files(args.paths, sys.stdout, compile_scopes(args.scopes), args.type,
+                            args.workers, args.chunk_size)
+    elapsed = time.perf_counter() - start
+    total = sum(statuses.values())
+    print(f"{total:,} tokens in {elapsed:.1f} s ({total / elapsed if elapsed else 0:,.0f} tokens/s, "
+          f"{args.workers} workers)", file=sys.stderr)
+    for status, count in statuses.most_common():
+        print(f"    {status:>14}: {count:12,}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()